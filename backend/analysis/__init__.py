@@ -0,0 +1 @@
+"""Sleep analytics computed from stored records."""
@@ -0,0 +1,339 @@
+"""
+Sleep regularity and circadian timing on a minute-resolution sleep raster.
+
+Hypnogram segments (sleep records with overlapping sources resolved) are
+rasterized into one row of 1440 minutes per calendar day, True where
+asleep. The Sleep Regularity Index compares each minute with the same
+minute a day earlier; midpoints, social jetlag and chronotype come from
+noon-to-noon windows of the same raster, labelled with the date they end
+on. Clock times are local, each night shifted by the UTC offset it
+started at, as for sleep_metrics and sleep_trends.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import polars as pl
+
+from backend.cache import TTLCache
+from backend.database.sleep_db import SleepDatabase
+
+MINUTES_PER_DAY = 1440
+NOON = MINUTES_PER_DAY // 2
+
+# Chronotype bounds on the corrected free-day midpoint, in clock hours
+# (sleep_midpoint in sleep_science_config.toml)
+EARLY_CHRONOTYPE_HOUR = 2.0
+LATE_CHRONOTYPE_HOUR = 4.0
+
+# Days are cached packed: 180 bytes of sleep state and an observed flag,
+# so the default holds over ten years in under a megabyte
+RASTER_CACHE_SIZE = 4096
+RASTER_CACHE_TTL = 3600.0
+
+_raster_cache = TTLCache(maxsize=RASTER_CACHE_SIZE, ttl=RASTER_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class SleepRaster:
+    """
+    Minute-by-minute sleep state of consecutive calendar days.
+
+    Attributes:
+        first_day: Date of the first row
+        asleep: Bool array of shape (days, 1440), True where asleep
+        observed: Bool array of shape (days,), True for days that any
+                  hypnogram segment touches; other days are missing data
+    """
+
+    first_day: date
+    asleep: np.ndarray
+    observed: np.ndarray
+
+
+def _cover(starts: np.ndarray, ends: np.ndarray, span: int) -> np.ndarray:
+    """Mark the minutes in [0, span) covered by any [start, end) interval."""
+    keep = ends > starts
+    # +1 at every start and -1 at every end; a positive running sum means
+    # at least one interval is open
+    opened = np.bincount(starts[keep], minlength=span + 1)
+    closed = np.bincount(ends[keep], minlength=span + 1)
+    return np.cumsum(opened[:span] - closed[:span]) > 0
+
+
+def rasterize(intervals: pl.DataFrame, first_day: date, days: int) -> SleepRaster:
+    """
+    Rasterize sleep intervals onto consecutive days.
+
+    Args:
+        intervals: Frame with start_date, end_date and asleep columns, as
+                   from SleepDatabase.get_sleep_intervals
+        first_day: First day of the raster
+        days: Number of days
+
+    Returns:
+        SleepRaster of the days
+    """
+    span = days * MINUTES_PER_DAY
+    origin = np.datetime64(first_day, "m")
+
+    def minutes(column: str) -> np.ndarray:
+        wall_clock = intervals[column].dt.replace_time_zone(None).to_numpy()
+        offsets = (wall_clock.astype("datetime64[m]") - origin).astype(np.int64)
+        return np.clip(offsets, 0, span)
+
+    starts = minutes("start_date")
+    ends = minutes("end_date")
+    asleep = intervals["asleep"].to_numpy().astype(bool)
+
+    return SleepRaster(
+        first_day=first_day,
+        asleep=_cover(starts[asleep], ends[asleep], span).reshape(
+            days, MINUTES_PER_DAY
+        ),
+        observed=_cover(starts, ends, span).reshape(days, MINUTES_PER_DAY).any(axis=1),
+    )
+
+
+def load_raster(
+    db: SleepDatabase, first_day: date, last_day: date, use_cache: bool = True
+) -> SleepRaster:
+    """
+    Load the sleep raster of a date range, reusing cached days.
+
+    Cached days are keyed by the data version, so an ingest makes them
+    unreachable rather than stale. Only the span of days missing from the
+    cache is queried.
+
+    Args:
+        db: Active SleepDatabase connection
+        first_day: First day, inclusive
+        last_day: Last day, inclusive
+        use_cache: Read and fill the per-day cache
+
+    Returns:
+        SleepRaster of the days
+    """
+    days = (last_day - first_day).days + 1
+    if not use_cache:
+        return _query_raster(db, first_day, days)
+
+    version = db.get_data_version()
+    keys = [
+        (str(db.db_path.resolve()), version, first_day + timedelta(days=i))
+        for i in range(days)
+    ]
+    rows = [_raster_cache.get(key) for key in keys]
+
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        start, stop = missing[0], missing[-1] + 1
+        fetched = _query_raster(db, first_day + timedelta(days=start), stop - start)
+        for i in range(start, stop):
+            if rows[i] is None:
+                rows[i] = (
+                    np.packbits(fetched.asleep[i - start]).tobytes(),
+                    bool(fetched.observed[i - start]),
+                )
+                _raster_cache.set(keys[i], rows[i])
+
+    packed = np.frombuffer(b"".join(row[0] for row in rows), dtype=np.uint8)
+    return SleepRaster(
+        first_day=first_day,
+        asleep=np.unpackbits(packed).reshape(days, MINUTES_PER_DAY).astype(bool),
+        observed=np.array([row[1] for row in rows], dtype=bool),
+    )
+
+
+def _query_raster(db: SleepDatabase, first_day: date, days: int) -> SleepRaster:
+    """Rasterize the stored hypnogram segments of a date range."""
+    start = datetime.combine(first_day, time())
+    intervals = db.get_sleep_intervals(start, start + timedelta(days=days))
+    return rasterize(intervals, first_day, days)
+
+
+def nightly_circadian(raster: SleepRaster) -> pl.DataFrame:
+    """
+    Compute per-night timing and regularity from a raster.
+
+    Night ``d`` is the window from noon of day ``d - 1`` to noon of day
+    ``d``, so the raster's first day only provides context and gets no
+    row.
+
+    Args:
+        raster: SleepRaster of at least two days
+
+    Returns:
+        DataFrame with date, asleep_minutes, sleep_midpoint_hour (clock
+        hour, null without sleep) and sleep_regularity (SRI of the day
+        against the day before, -100 to 100, null unless both days are
+        observed)
+    """
+    days = len(raster.observed)
+    flat = raster.asleep.reshape(-1)
+    windows = flat[NOON : NOON + (days - 1) * MINUTES_PER_DAY].reshape(
+        days - 1, MINUTES_PER_DAY
+    )
+
+    asleep_minutes = windows.sum(axis=1)
+    minute_sums = windows @ np.arange(MINUTES_PER_DAY)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Minutes since noon; sleep rarely straddles noon, so no wrapping
+        midpoint = minute_sums / asleep_minutes
+    midpoint_hour = ((NOON + midpoint) / 60) % 24
+
+    same = (raster.asleep[1:] == raster.asleep[:-1]).mean(axis=1)
+    regularity = 200 * same - 100
+    compared = raster.observed[1:] & raster.observed[:-1]
+
+    return pl.DataFrame(
+        {
+            "date": pl.date_range(
+                raster.first_day + timedelta(days=1),
+                raster.first_day + timedelta(days=days - 1),
+                eager=True,
+            ),
+            "asleep_minutes": asleep_minutes.astype(np.int32),
+            "sleep_midpoint_hour": np.where(asleep_minutes > 0, midpoint_hour, np.nan),
+            "sleep_regularity": np.where(compared, regularity, np.nan),
+        }
+    ).with_columns(pl.col("sleep_midpoint_hour", "sleep_regularity").fill_nan(None))
+
+
+def _clock_hour(hours_since_noon: float | None) -> float | None:
+    """Convert hours since noon to a clock hour."""
+    if hours_since_noon is None:
+        return None
+    return (hours_since_noon + 12) % 24
+
+
+def circadian_summary(db: SleepDatabase, first_day: date, last_day: date) -> dict:
+    """
+    Compute regularity and circadian timing over a date range.
+
+    Free days are nights ending on a Saturday or Sunday. Social jetlag is
+    the gap between the average free-day and workday midpoints; chronotype
+    is the free-day midpoint corrected for catch-up sleep (MSFsc).
+
+    Args:
+        db: Active SleepDatabase connection
+        first_day: First night, inclusive
+        last_day: Last night, inclusive
+
+    Returns:
+        Dict with the range, sleep_regularity_index, the midpoints as
+        clock hours, social_jetlag_hours, chronotype_midpoint_hour,
+        chronotype ("early", "intermediate" or "late") and the per-night
+        rows; values are None where the range lacks the nights to
+        compute them
+    """
+    nights = nightly_circadian(
+        load_raster(db, first_day - timedelta(days=1), last_day)
+    ).with_columns(
+        ((pl.col("sleep_midpoint_hour") + 12) % 24).alias("midpoint_since_noon"),
+        (pl.col("asleep_minutes") / 60).alias("asleep_hours"),
+        pl.col("date").dt.weekday().is_in([6, 7]).alias("free_day"),
+    )
+    slept = nights.filter(pl.col("asleep_minutes") > 0)
+    workdays = slept.filter(~pl.col("free_day"))
+    free_days = slept.filter(pl.col("free_day"))
+
+    workday_midpoint = workdays["midpoint_since_noon"].mean()
+    free_day_midpoint = free_days["midpoint_since_noon"].mean()
+
+    social_jetlag = None
+    chronotype_midpoint = None
+    chronotype = None
+    if workday_midpoint is not None and free_day_midpoint is not None:
+        social_jetlag = abs(free_day_midpoint - workday_midpoint)
+
+        workday_sleep = workdays["asleep_hours"].mean()
+        free_day_sleep = free_days["asleep_hours"].mean()
+        chronotype_midpoint = free_day_midpoint
+        if free_day_sleep > workday_sleep:
+            # Half of the free-day oversleep is catch-up, not preference
+            weekly_sleep = (5 * workday_sleep + 2 * free_day_sleep) / 7
+            chronotype_midpoint -= (free_day_sleep - weekly_sleep) / 2
+
+        if chronotype_midpoint < EARLY_CHRONOTYPE_HOUR + 12:
+            chronotype = "early"
+        elif chronotype_midpoint > LATE_CHRONOTYPE_HOUR + 12:
+            chronotype = "late"
+        else:
+            chronotype = "intermediate"
+
+    return {
+        "start_date": str(first_day),
+        "end_date": str(last_day),
+        "nights_with_sleep": len(slept),
+        "sleep_regularity_index": nights["sleep_regularity"].mean(),
+        "sleep_midpoint_hour": _clock_hour(slept["midpoint_since_noon"].mean()),
+        "workday_midpoint_hour": _clock_hour(workday_midpoint),
+        "free_day_midpoint_hour": _clock_hour(free_day_midpoint),
+        "social_jetlag_hours": social_jetlag,
+        "chronotype_midpoint_hour": _clock_hour(chronotype_midpoint),
+        "chronotype": chronotype,
+        "nights": nights.select(
+            pl.col("date").cast(pl.Utf8),
+            "asleep_minutes",
+            "sleep_midpoint_hour",
+            "sleep_regularity",
+        ).to_dicts(),
+    }
+
+
+def _recompute_ranges(nights: list[date]) -> list[tuple[date, date]]:
+    """
+    Merge the days affected by each changed night into contiguous ranges.
+
+    Args:
+        nights: Nights whose records changed
+
+    Returns:
+        Sorted, disjoint (first, last) day ranges, inclusive
+    """
+    ranges: list[tuple[date, date]] = []
+    for night in sorted(set(nights)):
+        first, last = night - timedelta(days=1), night + timedelta(days=2)
+        if ranges and first <= ranges[-1][1] + timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], last))
+        else:
+            ranges.append((first, last))
+    return ranges
+
+
+def update_circadian_metrics(db: SleepDatabase, dates: list[date] | None = None) -> int:
+    """
+    Store per-night circadian metrics for nights whose records changed.
+
+    Nights are dated by when they start in UTC, while the raster has
+    local calendar days. A night's records can therefore reach into the
+    local day before or after its date, and a day's regularity also
+    depends on the next day. So for each changed night the days from one
+    before to two past it are recomputed, with overlapping ranges merged,
+    and the days between scattered nights are left alone. The raster is
+    read from the database, bypassing the cache.
+
+    Args:
+        db: Active SleepDatabase connection
+        dates: Nights that changed; all nights if omitted
+
+    Returns:
+        Number of nights stored
+    """
+    if dates is None:
+        first_day, last_day = db.get_night_range()
+        if first_day is None:
+            return 0
+        ranges = [(first_day - timedelta(days=1), last_day + timedelta(days=2))]
+    else:
+        ranges = _recompute_ranges(dates)
+
+    stored = 0
+    for first_day, last_day in ranges:
+        nights = nightly_circadian(
+            load_raster(db, first_day - timedelta(days=1), last_day, use_cache=False)
+        ).filter(pl.col("asleep_minutes") > 0)
+        stored += db.replace_circadian_metrics(first_day, last_day, nights)
+    return stored
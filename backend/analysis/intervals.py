@@ -0,0 +1,179 @@
+"""
+Deduplicated sleep timelines from overlapping multi-source records.
+
+The Watch, the iPhone and third-party apps record the same sleep, so
+their intervals overlap and summing durations counts it more than once.
+A timeline keeps every covered instant once, with the stage and source
+of the best record covering it; worse records only fill the gaps.
+
+Every consumer of overlapping records (nightly totals and stage minutes,
+hypnograms, stage rasters) goes through this one policy.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import polars as pl
+
+# Overlaps resolve to the most specific stage: measured stages beat
+# unspecified sleep from a phone or app, which beats plain in-bed time.
+# Source priority only decides within a tier, then the order listed here.
+# Records of other stages are ignored.
+STAGE_TIERS = {
+    "asleep_deep": 0,
+    "asleep_rem": 0,
+    "asleep_core": 0,
+    "awake": 0,
+    "asleep_unspecified": 1,
+    "in_bed": 2,
+}
+
+TIMELINE_SCHEMA = {
+    "date": pl.Date,
+    "sourceName": pl.Utf8,
+    "sleep_stage": pl.Utf8,
+    "startDate": pl.Datetime("us", "UTC"),
+    "endDate": pl.Datetime("us", "UTC"),
+}
+
+
+def rank_sources(sources: Sequence[str], priority: Sequence[str]) -> list[str]:
+    """
+    Order sources from highest to lowest priority.
+
+    Args:
+        sources: Distinct source names
+        priority: Case-insensitive name fragments, highest priority first,
+                  e.g. ["Watch", "iPhone"]; a source takes the position of
+                  the first fragment it contains
+
+    Returns:
+        Sources by priority position, unmatched ones last, ties by name
+    """
+    fragments = [fragment.lower() for fragment in priority]
+
+    def position(source: str) -> int:
+        name = source.lower()
+        return next(
+            (i for i, fragment in enumerate(fragments) if fragment in name),
+            len(fragments),
+        )
+
+    return sorted(sources, key=lambda source: (position(source), source))
+
+
+def merge_intervals(
+    intervals: pl.DataFrame, priority: Sequence[str] = ()
+) -> pl.DataFrame:
+    """
+    Merge overlapping records into one non-overlapping timeline per night.
+
+    Every start and end becomes a boundary; boundaries are sorted once per
+    night, splitting the night into elementary segments. A coverage sweep
+    per (stage, source) class, worst first, then credits each segment to
+    the best class covering it (see STAGE_TIERS), and equal neighbours are
+    joined. O(n log n) for the sort plus O(n) per distinct class.
+
+    Args:
+        intervals: Frame with date, sourceName, sleep_stage, startDate and
+                   endDate
+        priority: Source name fragments, highest priority first, as for
+                  rank_sources
+
+    Returns:
+        Frame with date, sourceName, sleep_stage, startDate and endDate of
+        the timeline pieces, ordered by date and start, in UTC
+    """
+    intervals = intervals.filter(
+        (pl.col("endDate") > pl.col("startDate"))
+        & pl.col("sleep_stage").is_in(list(STAGE_TIERS))
+    )
+    if intervals.is_empty():
+        return pl.DataFrame(schema=TIMELINE_SCHEMA)
+
+    # Rank 0 is the best class
+    sources = rank_sources(intervals["sourceName"].unique().to_list(), priority)
+    stage_order = list(STAGE_TIERS)
+    classes = (
+        intervals.select("sourceName", "sleep_stage")
+        .unique()
+        .with_columns(
+            pl.col("sleep_stage").replace_strict(STAGE_TIERS).alias("tier"),
+            pl.col("sourceName")
+            .replace_strict(sources, list(range(len(sources))))
+            .alias("source_rank"),
+            pl.col("sleep_stage")
+            .replace_strict(stage_order, list(range(len(stage_order))))
+            .alias("stage_rank"),
+        )
+        .sort("tier", "source_rank", "stage_rank")
+        .with_row_index("rank")
+    )
+    ranks = (
+        intervals.join(
+            classes, on=["sourceName", "sleep_stage"], how="left", maintain_order="left"
+        )["rank"]
+        .cast(pl.Int32)
+        .to_numpy()
+    )
+
+    def microseconds(column: str) -> np.ndarray:
+        return (
+            intervals[column].dt.cast_time_unit("us").to_physical().to_numpy()
+        )
+
+    n = len(intervals)
+    nights = intervals["date"].to_physical().to_numpy().astype(np.int64)
+    event_nights = np.concatenate([nights, nights])
+    event_times = np.concatenate([microseconds("startDate"), microseconds("endDate")])
+
+    # Sort every start and end by (night, time) and number the distinct
+    # boundaries; each event learns the index of its boundary
+    order = np.lexsort((event_times, event_nights))
+    sorted_nights = event_nights[order]
+    sorted_times = event_times[order]
+    is_new = np.ones(2 * n, dtype=bool)
+    is_new[1:] = (sorted_nights[1:] != sorted_nights[:-1]) | (
+        sorted_times[1:] != sorted_times[:-1]
+    )
+    boundary = np.empty(2 * n, dtype=np.int64)
+    boundary[order] = np.cumsum(is_new) - 1
+    boundary_nights = sorted_nights[is_new]
+    boundary_times = sorted_times[is_new]
+    starts, ends = boundary[:n], boundary[n:]
+
+    # Segment i runs from boundary i to i + 1. All of a night's intervals
+    # close before the next night's boundaries, so no coverage crosses it.
+    segments = len(boundary_times) - 1
+    uncovered = len(classes)
+    winner = np.full(segments, uncovered, dtype=np.int32)
+    for rank in range(len(classes) - 1, -1, -1):
+        keep = ranks == rank
+        opened = np.bincount(starts[keep], minlength=segments + 1)
+        closed = np.bincount(ends[keep], minlength=segments + 1)
+        winner[np.cumsum(opened[:segments] - closed[:segments]) > 0] = rank
+
+    covered = winner < uncovered
+    first = covered.copy()
+    first[1:] &= (winner[1:] != winner[:-1]) | ~covered[:-1]
+    piece_starts = np.flatnonzero(first)
+    # A piece ends where the next one starts or coverage stops
+    last = covered.copy()
+    last[:-1] &= (winner[:-1] != winner[1:]) | ~covered[1:]
+    piece_ends = np.flatnonzero(last) + 1
+
+    return pl.DataFrame(
+        {
+            "date": pl.Series(boundary_nights[piece_starts], dtype=pl.Int32).cast(
+                pl.Date
+            ),
+            "sourceName": classes["sourceName"].gather(winner[piece_starts]),
+            "sleep_stage": classes["sleep_stage"].gather(winner[piece_starts]),
+            "startDate": boundary_times[piece_starts],
+            "endDate": boundary_times[piece_ends],
+        }
+    ).with_columns(
+        pl.col("startDate", "endDate")
+        .cast(pl.Datetime("us"))
+        .dt.replace_time_zone("UTC")
+    )
@@ -0,0 +1,222 @@
+"""
+Compact per-night sleep stage rasters.
+
+A night is a vector of 30-second epochs, one uint8 stage code each, from
+the first to the last record of the night, painted from the timeline of
+intervals.merge_intervals so overlaps resolve as in nightly totals and
+hypnograms. Vectors are stored run-length encoded as (stage, epochs) pairs of three
+bytes, so a night takes a few hundred bytes instead of dozens of rows.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import polars as pl
+
+from backend.analysis.intervals import merge_intervals
+
+EPOCH_SECONDS = 30
+
+# 0 is an epoch no record covers
+NO_DATA = 0
+STAGE_CODES = {
+    "in_bed": 1,
+    "asleep_unspecified": 2,
+    "awake": 3,
+    "asleep_core": 4,
+    "asleep_rem": 5,
+    "asleep_deep": 6,
+}
+ASLEEP_CODES = [
+    code for stage, code in STAGE_CODES.items() if stage.startswith("asleep")
+]
+
+# One run: stage code and number of epochs, packed without padding
+RUN_DTYPE = np.dtype([("stage", "u1"), ("epochs", "<u2")])
+MAX_RUN_EPOCHS = np.iinfo(np.uint16).max
+
+RASTER_SCHEMA = {
+    "date": pl.Date,
+    "start_time": pl.Datetime("us", "UTC"),
+    "epoch_seconds": pl.Int32,
+    "epochs": pl.Int32,
+    "stages": pl.Binary,
+}
+
+
+def encode_stages(stages: np.ndarray) -> bytes:
+    """
+    Run-length encode a vector of stage codes.
+
+    Args:
+        stages: uint8 stage code per epoch
+
+    Returns:
+        Packed RUN_DTYPE runs; runs too long for a uint16 are split
+    """
+    if len(stages) == 0:
+        return b""
+    starts = np.flatnonzero(np.diff(stages, prepend=stages[0] ^ 1))
+    lengths = np.diff(starts, append=len(stages))
+
+    # Split runs past MAX_RUN_EPOCHS into full pieces and a remainder
+    pieces = -(-lengths // MAX_RUN_EPOCHS)
+    first_piece = np.repeat(np.cumsum(pieces) - pieces, pieces)
+    piece_index = np.arange(pieces.sum()) - first_piece
+    run_lengths = np.repeat(lengths, pieces) - piece_index * MAX_RUN_EPOCHS
+
+    runs = np.empty(len(run_lengths), dtype=RUN_DTYPE)
+    runs["stage"] = np.repeat(stages[starts], pieces)
+    runs["epochs"] = np.minimum(run_lengths, MAX_RUN_EPOCHS)
+    return runs.tobytes()
+
+
+def decode_stages(blob: bytes) -> np.ndarray:
+    """
+    Decode run-length encoded stages back to one code per epoch.
+
+    Args:
+        blob: Bytes from encode_stages
+
+    Returns:
+        uint8 stage code per epoch
+    """
+    runs = np.frombuffer(blob, dtype=RUN_DTYPE)
+    return np.repeat(runs["stage"], runs["epochs"])
+
+
+def build_stage_rasters(
+    records: pl.DataFrame, source_priority: Sequence[str] = ()
+) -> pl.DataFrame:
+    """
+    Build the stage raster of every night in a set of sleep records.
+
+    Timeline bounds are rounded to the nearest epoch. All nights are
+    painted into one flat vector at once, a stage code at a time, so the
+    cost does not grow with the number of records per night.
+
+    Args:
+        records: Sleep records as from SleepExtractor.extract_sleep_data
+                 (sourceName, startDate, endDate, sleep_stage and date
+                 columns), holding every record of each night present
+        source_priority: Source name fragments, highest priority first,
+                         as for intervals.merge_intervals
+
+    Returns:
+        DataFrame with date, start_time (start of the first epoch),
+        epoch_seconds, epochs and stages (encoded with encode_stages), one
+        row per night
+    """
+    staged = merge_intervals(
+        records.filter(pl.col("sleep_stage").is_in(list(STAGE_CODES))),
+        source_priority,
+    )
+    if staged.is_empty():
+        return pl.DataFrame(schema=RASTER_SCHEMA)
+
+    epoch = f"{EPOCH_SECONDS}s"
+    nights = (
+        staged.group_by("date")
+        .agg(
+            pl.col("startDate").min().dt.truncate(epoch).alias("start_time"),
+            pl.col("endDate").max().alias("end_time"),
+        )
+        .sort("date")
+        .with_columns(
+            (
+                (pl.col("end_time") - pl.col("start_time")).dt.total_seconds()
+                / EPOCH_SECONDS
+            )
+            .ceil()
+            .cast(pl.Int32)
+            .alias("epochs")
+        )
+        .with_columns(
+            (pl.col("epochs").cum_sum() - pl.col("epochs")).alias("offset")
+        )
+    )
+
+    def epoch_index(column: str) -> pl.Expr:
+        seconds = (pl.col(column) - pl.col("start_time")).dt.total_seconds(
+            fractional=True
+        )
+        return (pl.col("offset") + (seconds / EPOCH_SECONDS).round()).cast(
+            pl.Int64
+        )
+
+    bounds = staged.join(nights, on="date").select(
+        pl.col("sleep_stage").replace_strict(STAGE_CODES, return_dtype=pl.UInt8),
+        epoch_index("startDate").alias("start"),
+        epoch_index("endDate").alias("end"),
+    )
+
+    total = int(nights["epochs"].sum())
+    flat = np.zeros(total, dtype=np.uint8)
+    codes = bounds["sleep_stage"].to_numpy()
+    starts = bounds["start"].to_numpy()
+    ends = bounds["end"].to_numpy()
+    for code in STAGE_CODES.values():
+        keep = (codes == code) & (ends > starts)
+        # +1 where a piece starts, -1 where it ends; covered where positive
+        opened = np.bincount(starts[keep], minlength=total + 1)
+        closed = np.bincount(ends[keep], minlength=total + 1)
+        flat[np.cumsum(opened[:total] - closed[:total]) > 0] = code
+
+    night_stages = np.split(flat, nights["offset"].to_numpy()[1:])
+    return nights.select(
+        "date",
+        pl.col("start_time").dt.convert_time_zone("UTC"),
+        pl.lit(EPOCH_SECONDS, pl.Int32).alias("epoch_seconds"),
+        "epochs",
+        pl.Series("stages", [encode_stages(s) for s in night_stages], pl.Binary),
+    )
+
+
+def stage_transitions(rasters: pl.DataFrame) -> pl.DataFrame:
+    """
+    Measure sleep fragmentation from stored stage rasters.
+
+    Only the sleep period counts, from the first to the last asleep epoch
+    of the night, so falling asleep and getting up are not awakenings.
+    Epochs without a stage (gaps and plain in-bed time) are skipped.
+
+    Args:
+        rasters: Rows with date and stages, as from
+                 SleepDatabase.get_stage_rasters
+
+    Returns:
+        DataFrame with date, stage_transitions (changes between stages),
+        awakenings (awake bouts) and wake_after_sleep_onset_minutes, one
+        row per night with sleep
+    """
+    awake = STAGE_CODES["awake"]
+    rows = []
+    for night, blob in rasters.select("date", "stages").iter_rows():
+        stages = decode_stages(blob)
+        asleep = np.flatnonzero(np.isin(stages, ASLEEP_CODES))
+        if len(asleep) == 0:
+            continue
+        period = stages[asleep[0] : asleep[-1] + 1]
+        period = period[period > STAGE_CODES["in_bed"]]
+        changes = period[1:] != period[:-1]
+        is_awake = period == awake
+        rows.append(
+            {
+                "date": night,
+                "stage_transitions": int(changes.sum()),
+                "awakenings": int((is_awake[1:] & ~is_awake[:-1]).sum()),
+                "wake_after_sleep_onset_minutes": (
+                    int(is_awake.sum()) * EPOCH_SECONDS / 60
+                ),
+            }
+        )
+
+    return pl.DataFrame(
+        rows,
+        schema={
+            "date": pl.Date,
+            "stage_transitions": pl.Int32,
+            "awakenings": pl.Int32,
+            "wake_after_sleep_onset_minutes": pl.Float64,
+        },
+    )
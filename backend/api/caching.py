@@ -0,0 +1,168 @@
+"""
+Conditional GET and response caching for endpoints derived from sleep data.
+"""
+
+import hashlib
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from fastapi import Request, status
+from fastapi.responses import Response
+
+from backend.cache import TTLCache
+from backend.database.async_db import async_db
+from backend.database.sleep_db import SleepDatabase
+
+# Responses are keyed by data version, so entries never go stale; the TTL
+# only bounds how long memory is held by entries nobody asks for
+RESPONSE_CACHE_SIZE = 32
+RESPONSE_CACHE_TTL = 3600.0
+
+# Larger bodies (e.g. every sleep record at once) are not worth the memory;
+# clients still get 304s for them. Five years of nightly summaries as JSON
+# is about 1 MB.
+MAX_CACHED_BODY_BYTES = 4 * 1024 * 1024
+
+# Clients may reuse a response but must revalidate it with its ETag
+CACHE_CONTROL = "private, no-cache"
+
+# Headers rebuilt by Response when a cached body is sent again
+_REBUILT_HEADERS = {"content-length", "content-type"}
+
+
+@dataclass(frozen=True)
+class _CachedResponse:
+    """A rendered response body and the headers to send with it."""
+
+    body: bytes
+    media_type: str | None
+    headers: dict[str, str]
+
+
+_response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+_latest_version = -1
+
+# Identity (path, inode, mtime, size) of the version file when it was last
+# read, and the version it held
+_published: tuple[tuple, int] | None = None
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+
+    Args:
+        if_none_match: If-None-Match request header
+        etag: Quoted entity tag of the current representation
+
+    Returns:
+        True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        # GET uses weak comparison, so W/"x" matches "x"
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def data_version() -> int:
+    """
+    Get the current sleep data version without querying the database.
+
+    Every commit that bumps the version replaces the version file beside
+    the database (SleepDatabase.publish_data_version), whichever process
+    made it. A stat of that file on each request notices the bump; the
+    file is only read again when it was replaced. The database is queried
+    only if the file does not exist yet.
+
+    Returns:
+        Data version from SleepDatabase
+    """
+    global _published
+
+    path = SleepDatabase.data_version_file(async_db.db_path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return await async_db.run(SleepDatabase.publish_data_version)
+
+    identity = (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _published is None or _published[0] != identity:
+        _published = (identity, int(path.read_text()))
+    return _published[1]
+
+
+async def versioned_response(
+    request: Request,
+    build: Callable[[], Awaitable[Response]],
+    variant: str = "",
+) -> Response:
+    """
+    Serve a response derived from sleep data with an ETag and caching.
+
+    The ETag is derived from the data version, the path, the query
+    parameters and ``variant``, so it changes exactly when the data or
+    the request does. A matching If-None-Match gets a 304 and a repeated
+    request gets the cached body, neither touching the database.
+
+    Args:
+        request: Incoming request
+        build: Produces the full response on a cache miss
+        variant: Anything else the body depends on, e.g. the format
+                 negotiated from the Accept header
+
+    Returns:
+        304 Not Modified, the cached response or a freshly built one
+    """
+    global _latest_version
+
+    version = await data_version()
+    if version > _latest_version:
+        # Entries of older versions can never be requested again
+        _latest_version = version
+        _response_cache.discard_if(lambda key: key[0] < version)
+
+    key = (
+        version,
+        request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+        variant,
+    )
+    digest = hashlib.sha256(repr(key[1:]).encode()).hexdigest()[:16]
+    etag = f'"{version}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cached = _response_cache.get(key)
+    if cached is not None:
+        return Response(
+            cached.body, media_type=cached.media_type, headers=cached.headers
+        )
+
+    response = await build()
+    response.headers.update(headers)
+
+    if (
+        response.status_code == status.HTTP_200_OK
+        and len(response.body) <= MAX_CACHED_BODY_BYTES
+    ):
+        _response_cache.set(
+            key,
+            _CachedResponse(
+                body=response.body,
+                media_type=response.media_type,
+                headers={
+                    name: value
+                    for name, value in response.headers.items()
+                    if name not in _REBUILT_HEADERS
+                },
+            ),
+        )
+
+    return response
@@ -4,6 +4,7 @@ FastAPI application for Apple Health analysis engine.
 
 import sys
 import traceback
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
@@ -17,11 +18,31 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from backend.api.routes import auth, ingest, insights, onboarding, sleep
+from backend.auth.security import password_pool
+from backend.config.settings import settings
+from backend.database.async_db import async_db
+from backend.database.sleep_db import db_pool
+from backend.ingest.jobs import ingest_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks."""
+    # Attach the database once; requests borrow cursors from the pool
+    db_pool.open(settings.db_path)
+    # Jobs left running by a previous process can never finish
+    ingest_queue.fail_interrupted()
+    yield
+    ingest_queue.shutdown()
+    async_db.shutdown()
+    db_pool.close()
+
 
 app = FastAPI(
     title="Apple Health Analysis Engine",
     description="Advanced analysis and visualization tool for Apple HealthKit data",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 
@@ -89,6 +110,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -116,6 +138,7 @@ async def health_check():
         "status": "healthy",
         "database": "not_initialized",
         "parser": "ready",
+        "password_pool": password_pool.stats(),
     }
 
 
@@ -2,26 +2,57 @@
 Authentication endpoints.
 """
 
-import base64
+import re
+import time
 from datetime import timedelta
+from urllib.parse import urlencode
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    UploadFile,
+    status,
+)
 from fastapi.responses import Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
+from backend.api.caching import etag_matches
 from backend.auth.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
+    PasswordPoolFull,
     create_access_token,
+    sign_picture,
+    verify_picture_signature,
     verify_token,
 )
-from backend.auth.users import authenticate_user, get_user, update_user_profile
+from backend.auth.profile_pictures import (
+    delete_profile_picture as delete_stored_profile_picture,
+    load_profile_picture,
+    store_profile_picture,
+)
+from backend.auth.users import (
+    Principal,
+    authenticate_user,
+    cached_principal,
+    get_principal,
+    update_user_profile,
+)
+from backend.database.async_db import async_db
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+_SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# Picture URLs embed the content hash, so a cached copy is never stale; it
+# may be reused until the URL's signature expires
+PICTURE_CACHE_CONTROL = "private, max-age={max_age}"
+
 
 class Token(BaseModel):
     """Token response model."""
@@ -37,6 +68,7 @@ class UserResponse(BaseModel):
     first_name: str | None = None
     last_name: str | None = None
     profile_picture_url: str | None = None
+    profile_picture_thumbnail_url: str | None = None
 
 
 class UpdateProfileRequest(BaseModel):
@@ -46,8 +78,10 @@ class UpdateProfileRequest(BaseModel):
     last_name: str | None = None
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> str:
-    """Get the current authenticated user from token."""
+async def get_current_principal(
+    token: Annotated[str, Depends(oauth2_scheme)]
+) -> Principal:
+    """Get the current authenticated user's identity from token."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -62,11 +96,22 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> str
     if username is None:
         raise credentials_exception
 
-    user = get_user(username)
-    if user is None:
+    # Cache hits are answered here on the event loop; only misses wait for
+    # a database thread, behind whatever queries are running
+    principal = cached_principal(username, payload.get("jti"))
+    if principal is None:
+        principal = await async_db.call(get_principal, username, payload.get("jti"))
+    if principal is None:
         raise credentials_exception
 
-    return username
+    return principal
+
+
+async def get_current_user(
+    principal: Annotated[Principal, Depends(get_current_principal)]
+) -> str:
+    """Get the current authenticated user from token."""
+    return principal.username
 
 
 @router.post("/login", response_model=Token)
@@ -77,7 +122,14 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     Returns:
         JWT access token
     """
-    user = authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(form_data.username, form_data.password)
+    except PasswordPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -93,30 +145,75 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@router.get("/me", response_model=UserResponse)
-async def get_me(current_user: Annotated[str, Depends(get_current_user)]):
+def _user_response(
+    username: str,
+    first_name: str | None,
+    last_name: str | None,
+    profile_picture_sha256: str | None,
+) -> dict:
+    """Build a UserResponse body with signed, content-addressed picture URLs."""
+    profile_picture_url = None
+    profile_picture_thumbnail_url = None
+    if profile_picture_sha256:
+        expires, signature = sign_picture(profile_picture_sha256)
+        query = {"expires": expires, "signature": signature}
+        profile_picture_url = (
+            f"/api/auth/profile-pictures/{profile_picture_sha256}?{urlencode(query)}"
+        )
+        profile_picture_thumbnail_url = (
+            f"{profile_picture_url}&{urlencode({'size': 'thumbnail'})}"
+        )
+
+    return {
+        "username": username,
+        "first_name": first_name,
+        "last_name": last_name,
+        "profile_picture_url": profile_picture_url,
+        "profile_picture_thumbnail_url": profile_picture_thumbnail_url,
+    }
+
+
+async def _picture_response(
+    sha256: str, thumbnail: bool, if_none_match: str | None, cache_control: str
+) -> Response:
     """
-    Get current user information.
+    Serve a stored picture with a strong ETag, or 304 if the client has it.
 
-    Returns:
-        Current user details
+    The ETag is derived from the content hash, so revalidation needs no
+    database access.
     """
-    user = get_user(current_user)
-    if not user:
+    etag = f'"{sha256}.thumbnail"' if thumbnail else f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    picture = await async_db.call(load_profile_picture, sha256, thumbnail=thumbnail)
+    if picture is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile picture not found"
         )
 
-    profile_picture_url = None
-    if user.profile_picture:
-        profile_picture_url = "/api/auth/profile-picture"
+    content, media_type = picture
+    return Response(content=content, media_type=media_type, headers=headers)
 
-    return {
-        "username": user.username,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "profile_picture_url": profile_picture_url,
-    }
+
+@router.get("/me", response_model=UserResponse)
+async def get_me(
+    principal: Annotated[Principal, Depends(get_current_principal)]
+):
+    """
+    Get current user information.
+
+    Returns:
+        Current user details
+    """
+    return _user_response(
+        principal.username,
+        principal.first_name,
+        principal.last_name,
+        principal.profile_picture_sha256,
+    )
 
 
 @router.put("/me", response_model=UserResponse)
@@ -130,24 +227,20 @@ async def update_me(
     Returns:
         Updated user details
     """
-    user = update_user_profile(
-        current_user, first_name=profile.first_name, last_name=profile.last_name
+    user = await async_db.call(
+        update_user_profile,
+        current_user,
+        first_name=profile.first_name,
+        last_name=profile.last_name,
     )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    profile_picture_url = None
-    if user.profile_picture:
-        profile_picture_url = "/api/auth/profile-picture"
-
-    return {
-        "username": user.username,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "profile_picture_url": profile_picture_url,
-    }
+    return _user_response(
+        user.username, user.first_name, user.last_name, user.profile_picture_sha256
+    )
 
 
 @router.post("/profile-picture")
@@ -177,14 +270,10 @@ async def upload_profile_picture(
             detail="File size exceeds 5MB limit",
         )
 
-    # Update user profile with picture
-    user = update_user_profile(
-        current_user,
-        profile_picture=contents,
-        profile_picture_mime_type=file.content_type,
+    sha256 = await async_db.call(
+        store_profile_picture, current_user, contents, file.content_type
     )
-
-    if not user:
+    if sha256 is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
@@ -194,23 +283,75 @@ async def upload_profile_picture(
 
 @router.get("/profile-picture")
 async def get_profile_picture(
-    current_user: Annotated[str, Depends(get_current_user)],
+    principal: Annotated[Principal, Depends(get_current_principal)],
+    size: str = "full",
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """
     Get the current user's profile picture.
 
+    Args:
+        size: "full" or "thumbnail"
+
     Returns:
-        Profile picture image
+        Profile picture image, or 304 Not Modified if the client's copy
+        is current
     """
-    user = get_user(current_user)
-    if not user or not user.profile_picture:
+    if not principal.profile_picture_sha256:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Profile picture not found"
         )
 
-    return Response(
-        content=bytes(user.profile_picture),
-        media_type=user.profile_picture_mime_type or "image/jpeg",
+    # The URL stays the same when the picture changes, so always revalidate
+    return await _picture_response(
+        principal.profile_picture_sha256,
+        thumbnail=size == "thumbnail",
+        if_none_match=if_none_match,
+        cache_control="private, no-cache",
+    )
+
+
+@router.get("/profile-pictures/{sha256}")
+async def get_profile_picture_by_hash(
+    sha256: str,
+    expires: int = 0,
+    signature: str = "",
+    size: str = "full",
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    Get a profile picture by the SHA-256 of its content.
+
+    ``<img>`` tags cannot send a bearer token, so instead the URLs returned
+    by /api/auth/me carry an expiring signature of the hash. Responses may
+    be cached until the signature expires.
+
+    Args:
+        sha256: Hex SHA-256 of the image
+        expires: Expiry of the signature, as Unix time
+        signature: Signature from the URL given by /api/auth/me
+        size: "full" or "thumbnail"
+
+    Returns:
+        Profile picture image, or 304 Not Modified if the client's copy
+        is current
+    """
+    now = time.time()
+    if not verify_picture_signature(sha256, expires, signature, now=now):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired profile picture URL",
+        )
+    if not _SHA256_PATTERN.fullmatch(sha256):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile picture not found"
+        )
+
+    return await _picture_response(
+        sha256,
+        thumbnail=size == "thumbnail",
+        if_none_match=if_none_match,
+        cache_control=PICTURE_CACHE_CONTROL.format(max_age=int(expires - now)),
     )
 
 
@@ -224,11 +365,7 @@ async def delete_profile_picture(
     Returns:
         Success message
     """
-    user = update_user_profile(
-        current_user, profile_picture=b"", profile_picture_mime_type=None
-    )
-
-    if not user:
+    if not await async_db.call(delete_stored_profile_picture, current_user):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
@@ -7,72 +7,167 @@ from pathlib import Path
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
 
 from backend.api.routes.auth import get_current_user
-from backend.database.sleep_db import SleepDatabase
-from backend.parsers.sleep_extractor import SleepExtractor
+from backend.config.settings import settings
+from backend.database.async_db import async_db
+from backend.ingest.jobs import ingest_queue
+from backend.ingest.pipeline import run_ingest
 
 router = APIRouter(prefix="/api", tags=["ingest"])
 
+# Bytes copied from the upload to disk per read, bounding request memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# export.xml as-is, or the export.zip the Health app shares
+ALLOWED_SUFFIXES = (".xml", ".zip")
+
+
+async def _save_upload(file: UploadFile) -> Path:
+    """
+    Stream an uploaded export into the staging directory.
+
+    Args:
+        file: Uploaded export.xml or export.zip
+
+    Returns:
+        Path of the staged file; the caller is responsible for deleting it
+    """
+    suffix = Path(file.filename).suffix.lower()
+    if suffix not in ALLOWED_SUFFIXES:
+        raise HTTPException(
+            status_code=400,
+            detail="File must be an XML file or a ZIP archive"
+        )
+
+    staging_dir = Path(settings.staging_dir)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(
+        delete=False, suffix=suffix, dir=staging_dir
+    ) as tmp:
+        tmp_path = Path(tmp.name)
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                # A disk write can block for a while; keep it off the loop
+                await run_in_threadpool(tmp.write, chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    return tmp_path
+
 
 @router.post("/ingest")
 async def ingest_healthkit_xml(
     current_user: Annotated[str, Depends(get_current_user)],
     file: UploadFile = File(...),
+    incremental: bool = True,
 ):
     """
-    Upload and process a HealthKit export.xml file.
+    Upload and process a HealthKit export.xml or export.zip file.
 
-    Extracts sleep data and stores it in the database.
+    Extracts sleep data and stores it in the database. Archives are kept
+    compressed on disk and export.xml is decompressed as it is parsed.
+    The request waits for the whole ingest; use ``/api/ingest/jobs`` to
+    process large exports in the background.
 
     Args:
-        file: HealthKit export.xml file
+        file: HealthKit export.xml file or export.zip archive
+        incremental: Only store records newer than earlier uploads;
+                     pass false to re-process the whole export
 
     Returns:
         Summary of ingested data including record counts
     """
-    if not file.filename.endswith('.xml'):
-        raise HTTPException(
-            status_code=400,
-            detail="File must be an XML file"
-        )
+    tmp_path = await _save_upload(file)
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xml') as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-
-        extractor = SleepExtractor(tmp_path)
-        sleep_df = extractor.extract_sleep_data()
-
-        if sleep_df.is_empty():
-            raise HTTPException(
-                status_code=400,
-                detail="No sleep data found in the uploaded file"
-            )
-
-        nightly_df = extractor.get_nightly_totals(sleep_df)
-
-        with SleepDatabase() as db:
-            records_inserted = db.insert_sleep_records(sleep_df)
-            summaries_inserted = db.insert_nightly_summary(nightly_df)
-            db.update_sleep_stage_percentages()
-
-        Path(tmp_path).unlink()
-
-        return {
-            "message": "Data ingested successfully",
-            "records": records_inserted,
-            "summaries": summaries_inserted,
-            "nights": len(nightly_df),
-            "date_range": {
-                "start": str(nightly_df["date"].min()),
-                "end": str(nightly_df["date"].max())
-            }
-        }
-
+        # Minutes of parsing would tie up a database thread, so the
+        # synchronous ingest runs on the general threadpool instead
+        return await run_in_threadpool(
+            run_ingest, tmp_path, incremental=incremental
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        if 'tmp_path' in locals():
-            Path(tmp_path).unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+@router.post("/ingest/jobs", status_code=202)
+async def create_ingest_job(
+    current_user: Annotated[str, Depends(get_current_user)],
+    file: UploadFile = File(...),
+    incremental: bool = True,
+):
+    """
+    Upload a HealthKit export and ingest it in the background.
+
+    Returns as soon as the upload is on disk. Poll
+    ``/api/ingest/jobs/{job_id}`` for progress and the final summary.
+
+    Args:
+        file: HealthKit export.xml file or export.zip archive
+        incremental: Only store records newer than earlier uploads;
+                     pass false to re-process the whole export
+
+    Returns:
+        Queued job including its id
+    """
+    tmp_path = await _save_upload(file)
+
+    try:
+        return await async_db.call(
+            ingest_queue.submit,
+            current_user,
+            file.filename,
+            tmp_path,
+            incremental,
+        )
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@router.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(
+    job_id: str,
+    current_user: Annotated[str, Depends(get_current_user)],
+):
+    """
+    Get status and progress of an ingest job.
+
+    Args:
+        job_id: Job identifier returned when the job was created
+
+    Returns:
+        Job status, byte and record counters, and the ingest summary once
+        the job has completed
+    """
+    job = await async_db.call(ingest_queue.get, job_id, current_user)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
+
+
+@router.delete("/ingest/jobs/{job_id}")
+async def cancel_ingest_job(
+    job_id: str,
+    current_user: Annotated[str, Depends(get_current_user)],
+):
+    """
+    Cancel a queued or running ingest job.
+
+    Args:
+        job_id: Job identifier returned when the job was created
+
+    Returns:
+        Job status after the cancellation request
+    """
+    job = await async_db.call(ingest_queue.cancel, job_id, current_user)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
@@ -2,14 +2,16 @@
 Health insights generation using Ollama LLM.
 """
 
+import json
 import os
 from datetime import datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Optional
 
 import ollama
 from fastapi import APIRouter, Depends, HTTPException
 
 from backend.api.routes.auth import get_current_user
+from backend.database.async_db import async_db
 from backend.database.sleep_db import SleepDatabase
 
 router = APIRouter(prefix="/api/insights", tags=["insights"])
@@ -48,31 +50,105 @@ def _format_sleep_data_for_prompt(summary_df) -> str:
     return "\n".join(lines)
 
 
-def _get_benchmarks_text(db: SleepDatabase) -> str:
+def _get_benchmarks_text(
+    db: SleepDatabase, start_date: str | None = None, end_date: str | None = None
+) -> str:
     """
-    Get sleep benchmarks for context.
+    Get sleep benchmarks for context, with how often the user met them.
 
     Args:
         db: Active SleepDatabase connection
+        start_date: Optional start of the period scored (ISO format)
+        end_date: Optional end of the period scored (ISO format)
 
     Returns:
         Formatted string with benchmark data
     """
-    result = db.conn.execute(
-        "SELECT metric_name, optimal_min, optimal_max, description FROM sleep_benchmarks"
-    ).fetchall()
+    attainment = db.get_benchmark_attainment(start_date, end_date)
 
-    if not result:
+    if attainment.is_empty():
         return "No benchmark data available."
 
     lines = []
-    for row in result:
-        metric, min_val, max_val, desc = row
-        lines.append(f"- {metric}: {min_val}-{max_val} ({desc})")
+    for row in attainment.iter_rows(named=True):
+        min_val, max_val = row["optimal_min"], row["optimal_max"]
+        if min_val is not None and max_val is not None:
+            target = f"{min_val}-{max_val}"
+        elif min_val is not None:
+            target = f"at least {min_val}"
+        elif max_val is not None:
+            target = f"at most {max_val}"
+        else:
+            target = "no fixed target"
+
+        line = f"- {row['metric_name']}: {target} ({row['description']})"
+        if row["nights"]:
+            line += (
+                f"; met on {row['nights_met']} of {row['nights']} nights, "
+                f"average {row['mean_value']:.1f} {row['unit']}"
+            )
+        lines.append(line)
 
     return "\n".join(lines)
 
 
+def _get_cached_insights(db: SleepDatabase, days: int) -> Optional[dict]:
+    """
+    Get insights generated for the same period within the last week.
+
+    Args:
+        db: Active SleepDatabase connection
+        days: Number of days analyzed
+
+    Returns:
+        Insights response body, or None if nothing recent is cached
+    """
+    cached = db.conn.execute(
+        """
+        SELECT insights_text, stats, generated_at
+        FROM insights_cache
+        WHERE days_analyzed = ?
+        AND generated_at > now() - INTERVAL '7 days'
+        ORDER BY generated_at DESC
+        LIMIT 1
+        """,
+        [days]
+    ).fetchone()
+
+    if not cached:
+        return None
+
+    # Parse cached JSON
+    insights_data = json.loads(cached[0]) if isinstance(cached[0], str) else cached[0]
+    stats_data = json.loads(cached[1]) if isinstance(cached[1], str) else cached[1]
+
+    return {
+        "insights": insights_data,
+        "stats": stats_data,
+        "generated_at": cached[2].isoformat(),
+        "from_cache": True
+    }
+
+
+def _cache_insights(db: SleepDatabase, days: int, insights: dict, stats: dict):
+    """
+    Store generated insights for reuse.
+
+    Args:
+        db: Active SleepDatabase connection
+        days: Number of days analyzed
+        insights: Parsed insights
+        stats: Statistics the insights were based on
+    """
+    db.conn.execute(
+        """
+        INSERT INTO insights_cache (days_analyzed, insights_text, stats, generated_at)
+        VALUES (?, ?, ?, now())
+        """,
+        [days, json.dumps(insights), json.dumps(stats)]
+    )
+
+
 @router.get("/generate")
 async def generate_insights(
     current_user: Annotated[str, Depends(get_current_user)],
@@ -90,56 +166,37 @@ async def generate_insights(
     Returns:
         Generated insights and recommendations
     """
-    with SleepDatabase() as db:
-        # Check for cached insights unless force_regenerate is True
-        if not force_regenerate:
-            cached = db.conn.execute(
-                """
-                SELECT insights_text, stats, generated_at
-                FROM insights_cache
-                WHERE days_analyzed = ?
-                AND generated_at > now() - INTERVAL '7 days'
-                ORDER BY generated_at DESC
-                LIMIT 1
-                """,
-                [days]
-            ).fetchone()
-
-            if cached:
-                import json
-                # Parse cached JSON
-                insights_data = json.loads(cached[0]) if isinstance(cached[0], str) else cached[0]
-                stats_data = json.loads(cached[1]) if isinstance(cached[1], str) else cached[1]
-
-                return {
-                    "insights": insights_data,
-                    "stats": stats_data,
-                    "generated_at": cached[2].isoformat(),
-                    "from_cache": True
-                }
-
-        # Calculate date range
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days)
-
-        # Fetch sleep data
-        summary_df = db.get_nightly_summary(
-            start_date=str(start_date),
-            end_date=str(end_date)
-        )
+    # Check for cached insights unless force_regenerate is True
+    if not force_regenerate:
+        cached = await async_db.run(_get_cached_insights, days)
+        if cached:
+            return cached
+
+    # Calculate date range
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+
+    # Fetch sleep data
+    summary_df = await async_db.run(
+        SleepDatabase.get_nightly_summary,
+        start_date=str(start_date),
+        end_date=str(end_date)
+    )
 
-        if summary_df.is_empty():
-            raise HTTPException(
-                status_code=404,
-                detail="No sleep data available for the requested period"
-            )
+    if summary_df.is_empty():
+        raise HTTPException(
+            status_code=404,
+            detail="No sleep data available for the requested period"
+        )
 
-        # Format data for LLM
-        sleep_data = _format_sleep_data_for_prompt(summary_df)
-        benchmarks = _get_benchmarks_text(db)
+    # Format data for LLM
+    sleep_data = _format_sleep_data_for_prompt(summary_df)
+    benchmarks = await async_db.run(
+        _get_benchmarks_text, str(start_date), str(end_date)
+    )
 
-        # Build prompt
-        prompt = f"""You are a health insights assistant that analyzes consumer sleep and cardiac data.
+    # Build prompt
+    prompt = f"""You are a health insights assistant that analyzes consumer sleep and cardiac data.
 You are not a doctor and you do not provide diagnoses. You provide clear, practical guidance to help users improve their sleep habits.
 
 INPUTS
@@ -180,77 +237,70 @@ You MUST respond with valid JSON in this exact structure (no additional text bef
   "patterns": "1 short paragraph explaining any concerning trends and suggested next steps, or 'No significant concerns identified' if data looks good"
 }}"""
 
-        # Get Ollama host from environment
-        ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    # Get Ollama host from environment
+    ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+
+    try:
+        # Generate insights using Ollama
+        client = ollama.AsyncClient(host=ollama_host)
+
+        # Use a small, fast model for quick responses
+        # llama3.2 is a good balance of speed and quality
+        response = await client.generate(
+            model="llama3.2",
+            prompt=prompt,
+        )
+
+        insights_text = response["response"]
 
+        # Parse JSON response
         try:
-            # Generate insights using Ollama
-            client = ollama.Client(host=ollama_host)
-
-            # Use a small, fast model for quick responses
-            # llama3.2 is a good balance of speed and quality
-            response = client.generate(
-                model="llama3.2",
-                prompt=prompt,
-            )
+            # Try to parse the JSON response
+            insights_json = json.loads(insights_text)
+
+            # Validate structure
+            if not all(k in insights_json for k in ["overview", "recommendations", "patterns"]):
+                raise ValueError("Invalid JSON structure from LLM")
+
+        except (json.JSONDecodeError, ValueError) as e:
+            # If JSON parsing fails, fall back to plain text format
+            insights_json = {
+                "overview": insights_text,
+                "recommendations": [],
+                "patterns": ""
+            }
 
-            insights_text = response["response"]
-
-            # Parse JSON response
-            import json
-            try:
-                # Try to parse the JSON response
-                insights_json = json.loads(insights_text)
-
-                # Validate structure
-                if not all(k in insights_json for k in ["overview", "recommendations", "patterns"]):
-                    raise ValueError("Invalid JSON structure from LLM")
-
-            except (json.JSONDecodeError, ValueError) as e:
-                # If JSON parsing fails, fall back to plain text format
-                insights_json = {
-                    "overview": insights_text,
-                    "recommendations": [],
-                    "patterns": ""
-                }
-
-            # Calculate basic statistics for context
-            stats = {
-                "average_sleep_hours": float(summary_df["total_sleep_hours"].mean()),
-                "average_efficiency": float(summary_df["sleep_efficiency_pct"].mean()),
-                "nights_analyzed": len(summary_df),
-                "date_range": {
-                    "start": str(summary_df["date"].min()),
-                    "end": str(summary_df["date"].max())
-                }
+        # Calculate basic statistics for context
+        stats = {
+            "average_sleep_hours": float(summary_df["total_sleep_hours"].mean()),
+            "average_efficiency": float(summary_df["sleep_efficiency_pct"].mean()),
+            "nights_analyzed": len(summary_df),
+            "date_range": {
+                "start": str(summary_df["date"].min()),
+                "end": str(summary_df["date"].max())
             }
+        }
 
-            if "asleep_rem_pct" in summary_df.columns:
-                stats["average_rem_pct"] = float(
-                    summary_df["asleep_rem_pct"].drop_nulls().mean()
-                )
-                stats["average_deep_pct"] = float(
-                    summary_df["asleep_deep_pct"].drop_nulls().mean()
-                )
-
-            # Cache the insights (store as JSON string)
-            db.conn.execute(
-                """
-                INSERT INTO insights_cache (days_analyzed, insights_text, stats, generated_at)
-                VALUES (?, ?, ?, now())
-                """,
-                [days, json.dumps(insights_json), json.dumps(stats)]
+        if "asleep_rem_pct" in summary_df.columns:
+            stats["average_rem_pct"] = float(
+                summary_df["asleep_rem_pct"].drop_nulls().mean()
+            )
+            stats["average_deep_pct"] = float(
+                summary_df["asleep_deep_pct"].drop_nulls().mean()
             )
 
-            return {
-                "insights": insights_json,
-                "stats": stats,
-                "generated_at": datetime.now().isoformat(),
-                "from_cache": False
-            }
+        # Cache the insights (store as JSON string)
+        await async_db.run(_cache_insights, days, insights_json, stats)
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to generate insights: {str(e)}"
-            )
+        return {
+            "insights": insights_json,
+            "stats": stats,
+            "generated_at": datetime.now().isoformat(),
+            "from_cache": False
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate insights: {str(e)}"
+        )
@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 
 from backend.api.routes.auth import get_current_user
+from backend.database.async_db import async_db
 from backend.database.sleep_db import SleepDatabase
 
 router = APIRouter(prefix="/api/onboarding", tags=["onboarding"])
@@ -50,26 +51,24 @@ async def get_onboarding_status(
     Returns:
         Onboarding status including completion state and configuration
     """
-    db = SleepDatabase()
-    try:
-        onboarding_status = db.get_onboarding_status(current_user)
-        if onboarding_status is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found",
-            )
-
-        return OnboardingStatusResponse(
-            is_onboarded=onboarding_status["is_onboarded"],
-            has_sleep_data=onboarding_status["has_sleep_data"],
-            has_completed_tour=onboarding_status["has_completed_tour"],
-            wearables_configured=onboarding_status["wearable_type"] is not None,
-            wearable_type=onboarding_status["wearable_type"],
-            sleep_goals=onboarding_status["sleep_goals"],
-            preferences=onboarding_status["preferences"],
+    onboarding_status = await async_db.run(
+        SleepDatabase.get_onboarding_status, current_user
+    )
+    if onboarding_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
         )
-    finally:
-        db.close()
+
+    return OnboardingStatusResponse(
+        is_onboarded=onboarding_status["is_onboarded"],
+        has_sleep_data=onboarding_status["has_sleep_data"],
+        has_completed_tour=onboarding_status["has_completed_tour"],
+        wearables_configured=onboarding_status["wearable_type"] is not None,
+        wearable_type=onboarding_status["wearable_type"],
+        sleep_goals=onboarding_status["sleep_goals"],
+        preferences=onboarding_status["preferences"],
+    )
 
 
 @router.post("/complete", status_code=status.HTTP_200_OK)
@@ -86,26 +85,23 @@ async def complete_onboarding(
     Returns:
         Success message
     """
-    db = SleepDatabase()
-    try:
-        success = db.update_onboarding_completion(
-            username=current_user,
-            onboarding_completed=True,
-            tour_completed=request.tour_completed,
-            wearable_type=request.wearable_type,
-            sleep_goals=request.sleep_goals,
-            preferences=request.preferences,
+    success = await async_db.run(
+        SleepDatabase.update_onboarding_completion,
+        username=current_user,
+        onboarding_completed=True,
+        tour_completed=request.tour_completed,
+        wearable_type=request.wearable_type,
+        sleep_goals=request.sleep_goals,
+        preferences=request.preferences,
+    )
+
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update onboarding status",
         )
 
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update onboarding status",
-            )
-
-        return {"message": "Onboarding completed successfully"}
-    finally:
-        db.close()
+    return {"message": "Onboarding completed successfully"}
 
 
 @router.post("/tour/restart", status_code=status.HTTP_200_OK)
@@ -118,19 +114,16 @@ async def restart_tour(current_user: Annotated[str, Depends(get_current_user)]):
     Returns:
         Success message
     """
-    db = SleepDatabase()
-    try:
-        success = db.update_onboarding_completion(
-            username=current_user,
-            tour_completed=False,
+    success = await async_db.run(
+        SleepDatabase.update_onboarding_completion,
+        username=current_user,
+        tour_completed=False,
+    )
+
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to restart tour",
         )
 
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to restart tour",
-            )
-
-        return {"message": "Tour reset successfully"}
-    finally:
-        db.close()
+    return {"message": "Tour reset successfully"}
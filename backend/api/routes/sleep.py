@@ -2,25 +2,260 @@
 Sleep data query endpoints.
 """
 
+import base64
+import binascii
+import json
+import math
+from datetime import date, datetime, timedelta
 from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 
+from backend.analysis.circadian import circadian_summary
+from backend.analysis.stage_raster import stage_transitions
+from backend.api.caching import versioned_response
+from backend.api.responses import frame_response, negotiate_format
 from backend.api.routes.auth import get_current_user
+from backend.database.async_db import async_db
 from backend.database.sleep_db import SleepDatabase
 
 router = APIRouter(prefix="/api/sleep", tags=["sleep"])
 
+# Records per page when /records is paginated without an explicit limit
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Response header carrying the cursor of the next /records page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Nights /circadian covers by default, ending at the latest night, and at most
+DEFAULT_CIRCADIAN_NIGHTS = 28
+MAX_CIRCADIAN_NIGHTS = 3660
+
+
+def _encode_cursor(start_date: datetime, record_id: int) -> str:
+    """Encode the sort key of the last record on a page as an opaque cursor."""
+    key = json.dumps([start_date.isoformat(), record_id])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a cursor produced by ``_encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        start_date, record_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(start_date), int(record_id)
+    except (binascii.Error, TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _summary_response(
+    db: SleepDatabase,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    format: str = "json",
+) -> Response:
+    """Load nightly summaries and encode them in the negotiated format."""
+    df = db.get_nightly_summary(start_date, end_date)
+
+    # Encoding thousands of rows takes longer than the query, so it is done
+    # here on the database thread rather than by FastAPI on the event loop
+    return frame_response(df, format)
+
+
+def _records_response(
+    db: SleepDatabase,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    after: Optional[tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+    fields: Optional[list[str]] = None,
+    format: str = "json",
+) -> Response:
+    """
+    Load a page of sleep stage records and encode it in the negotiated format.
+
+    With a ``limit`` one extra record is read to learn whether another page
+    follows; if so its cursor is returned in the X-Next-Cursor header.
+    """
+    if limit is None:
+        df = db.get_sleep_records(start_date, end_date, fields=fields)
+        return frame_response(df, format)
+
+    # The sort key is needed for the cursor even if it was not asked for
+    query_fields = fields
+    if fields is not None:
+        query_fields = list(dict.fromkeys([*fields, "start_date", "id"]))
+
+    df = db.get_sleep_records(
+        start_date, end_date, after=after, limit=limit + 1, fields=query_fields
+    )
+
+    headers = {}
+    if len(df) > limit:
+        df = df.head(limit)
+        last = df.row(limit - 1, named=True)
+        headers[NEXT_CURSOR_HEADER] = _encode_cursor(last["start_date"], last["id"])
+
+    if fields is not None:
+        df = df.select(list(dict.fromkeys(fields)))
+
+    return frame_response(df, format, headers=headers)
+
+
+def _hypnogram_response(
+    db: SleepDatabase, night: date, format: str = "json"
+) -> Response:
+    """Load one night's stage segments and encode them in the negotiated format."""
+    return frame_response(db.get_sleep_stage_events(night), format)
+
+
+def _metrics_response(
+    db: SleepDatabase,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    metric: Optional[str],
+    format: str = "json",
+) -> Response:
+    """Load nights' benchmark scores and encode them in the negotiated format."""
+    return frame_response(db.get_sleep_metrics(start_date, end_date, metric), format)
+
+
+def _trends_response(
+    db: SleepDatabase,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    format: str = "json",
+) -> Response:
+    """Load rolling trends and encode them in the negotiated format."""
+    return frame_response(db.get_sleep_trends(start_date, end_date), format)
+
+
+def _transitions_response(
+    db: SleepDatabase,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    format: str = "json",
+) -> Response:
+    """Measure fragmentation from stage rasters, in the negotiated format."""
+    return frame_response(
+        stage_transitions(db.get_stage_rasters(start_date, end_date)), format
+    )
+
+
+def _circadian_range(
+    db: SleepDatabase, first_day: Optional[date], last_day: Optional[date]
+) -> tuple[date, date]:
+    """
+    Resolve the nights /circadian covers.
+
+    A missing last night defaults to the latest night (today without data),
+    a missing first night to the DEFAULT_CIRCADIAN_NIGHTS nights up to the
+    last one.
+    """
+    if last_day is None:
+        last_day = db.get_night_range()[1] or datetime.now().date()
+    if first_day is None:
+        first_day = last_day - timedelta(days=DEFAULT_CIRCADIAN_NIGHTS - 1)
+    return first_day, last_day
+
+
+def _circadian_response(
+    db: SleepDatabase, first_day: date, last_day: date
+) -> JSONResponse:
+    """Compute circadian metrics of a resolved range of nights."""
+    return JSONResponse(circadian_summary(db, first_day, last_day))
+
+
+def _metric_stats(row: dict) -> dict:
+    """
+    Derive mean, variance and standard deviation from a sleep_stats row.
+
+    Args:
+        row: Row from ``SleepDatabase.get_sleep_stats``
+
+    Returns:
+        Dict with nights, mean, variance (sample, n - 1) and stddev; the
+        moments are None when there are too few nights to define them
+    """
+    n = row["night_count"]
+    mean = row["total"] / n if n else None
+    variance = None
+    if n > 1:
+        # Rounding can leave a tiny negative value for constant metrics
+        variance = max(row["total_sq"] - row["total"] ** 2 / n, 0.0) / (n - 1)
+    return {
+        "nights": n,
+        "mean": mean,
+        "variance": variance,
+        "stddev": math.sqrt(variance) if variance is not None else None,
+    }
+
+
+def _summary_stats(db: SleepDatabase) -> dict:
+    """Read all-time and rolling-window statistics of the nightly summaries."""
+    windows: dict[int, dict[str, dict]] = {}
+    for row in db.get_sleep_stats():
+        windows.setdefault(row["window_days"], {})[row["metric"]] = row
+
+    all_time = windows.pop(0, {})
+    hours = all_time.get("total_sleep_hours")
+    if hours is None or hours["night_count"] == 0:
+        return {
+            "total_nights": 0,
+            "average_sleep_hours": 0,
+            "average_efficiency": 0
+        }
+
+    all_time_stats = {
+        metric: _metric_stats(row) for metric, row in all_time.items()
+    }
+    stats = {
+        "total_nights": hours["night_count"],
+        "average_sleep_hours": all_time_stats["total_sleep_hours"]["mean"],
+        "average_efficiency": all_time_stats["sleep_efficiency_pct"]["mean"],
+        "date_range": {
+            "start": str(hours["first_date"]),
+            "end": str(hours["last_date"])
+        },
+        "average_rem_pct": all_time_stats["asleep_rem_pct"]["mean"],
+        "average_deep_pct": all_time_stats["asleep_deep_pct"]["mean"],
+        "average_core_pct": all_time_stats["asleep_core_pct"]["mean"],
+        "all_time": all_time_stats,
+        # Keyed by days up to and including the latest night
+        "windows": {
+            str(days): {metric: _metric_stats(row) for metric, row in rows.items()}
+            for days, rows in sorted(windows.items())
+        },
+    }
+
+    return stats
+
+
+def _stats_response(db: SleepDatabase) -> JSONResponse:
+    """Compute overall statistics and encode them as JSON."""
+    return JSONResponse(_summary_stats(db))
+
 
 @router.get("/summary")
 async def get_sleep_summary(
+    request: Request,
     current_user: Annotated[str, Depends(get_current_user)],
-    start_date: Optional[str] = Query(
+    start_date: Optional[date] = Query(
         None, description="Start date filter (ISO format: YYYY-MM-DD)"
     ),
-    end_date: Optional[str] = Query(
+    end_date: Optional[date] = Query(
         None, description="End date filter (ISO format: YYYY-MM-DD)"
-    )
+    ),
+    format: Optional[str] = Query(
+        None, description="json, arrow or parquet; overrides the Accept header"
+    ),
+    accept: Annotated[str | None, Header()] = None,
 ):
     """
     Get nightly sleep summaries.
@@ -31,31 +266,57 @@ async def get_sleep_summary(
     - Sleep stage breakdowns (REM, Deep, Core, Awake)
     - Sleep stage percentages
 
+    Responds with JSON unless Arrow IPC
+    (``Accept: application/vnd.apache.arrow.stream`` or ``?format=arrow``)
+    or Parquet (``Accept: application/vnd.apache.parquet`` or
+    ``?format=parquet``) is requested.
+
+    Responses carry an ETag that changes when new data is ingested;
+    send it back in If-None-Match to get 304 Not Modified.
+
     Args:
         start_date: Optional start date for filtering
         end_date: Optional end date for filtering
+        format: Optional response format, "json", "arrow" or "parquet"
 
     Returns:
-        List of nightly summary records
+        List of nightly summary records, or the same table as Arrow/Parquet
     """
-    with SleepDatabase() as db:
-        df = db.get_nightly_summary(start_date, end_date)
-
-        if df.is_empty():
-            return []
+    try:
+        response_format = negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return df.to_dicts()
+    return await versioned_response(
+        request,
+        lambda: async_db.run(_summary_response, start_date, end_date, response_format),
+        variant=response_format,
+    )
 
 
 @router.get("/records")
 async def get_sleep_records(
+    request: Request,
     current_user: Annotated[str, Depends(get_current_user)],
-    start_date: Optional[str] = Query(
+    start_date: Optional[date] = Query(
         None, description="Start date filter (ISO format: YYYY-MM-DD)"
     ),
-    end_date: Optional[str] = Query(
+    end_date: Optional[date] = Query(
         None, description="End date filter (ISO format: YYYY-MM-DD)"
-    )
+    ),
+    limit: Optional[int] = Query(
+        None, ge=1, le=MAX_PAGE_SIZE, description="Records per page"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor header of the previous page"
+    ),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated columns to return (default: all)"
+    ),
+    format: Optional[str] = Query(
+        None, description="json, arrow or parquet; overrides the Accept header"
+    ),
+    accept: Annotated[str | None, Header()] = None,
 ):
     """
     Get detailed sleep stage records.
@@ -63,59 +324,304 @@ async def get_sleep_records(
     Returns individual sleep stage events with timestamps and durations.
     Useful for creating hypnograms and detailed visualizations.
 
+    Records are ordered by start time. Passing ``limit`` or ``cursor``
+    returns one page; while more records follow, the response carries an
+    X-Next-Cursor header to pass as ``cursor`` for the next page. Without
+    either, every matching record is returned. Formats and ETags work as
+    for /summary.
+
+    Args:
+        start_date: Optional start date for filtering
+        end_date: Optional end date for filtering
+        limit: Optional page size, defaults to 1000 when ``cursor`` is given
+        cursor: Optional cursor of the page to fetch
+        fields: Optional comma-separated list of columns to return
+        format: Optional response format, "json", "arrow" or "parquet"
+
+    Returns:
+        List of sleep stage records, or the same table as Arrow/Parquet
+    """
+    try:
+        response_format = negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    after = None
+    if cursor is not None:
+        try:
+            after = _decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if limit is None:
+            limit = DEFAULT_PAGE_SIZE
+
+    field_list = None
+    if fields is not None:
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+
+    try:
+        return await versioned_response(
+            request,
+            lambda: async_db.run(
+                _records_response,
+                start_date,
+                end_date,
+                after,
+                limit,
+                field_list,
+                response_format,
+            ),
+            variant=response_format,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/hypnogram")
+async def get_hypnogram(
+    request: Request,
+    current_user: Annotated[str, Depends(get_current_user)],
+    night: date = Query(
+        ..., alias="date", description="Night date (ISO format: YYYY-MM-DD)"
+    ),
+    format: Optional[str] = Query(
+        None, description="json, arrow or parquet; overrides the Accept header"
+    ),
+    accept: Annotated[str | None, Header()] = None,
+):
+    """
+    Get the hypnogram of one night.
+
+    Returns the night's sleep stages as ordered, non-overlapping segments,
+    derived from the raw records at ingest time. Formats and ETags work
+    as for /summary.
+
+    Args:
+        night: Night date, passed as ``date``
+        format: Optional response format, "json", "arrow" or "parquet"
+
+    Returns:
+        List of segments with sequence_order, sleep_stage, start_time,
+        end_time and duration_minutes; empty for a night without data
+    """
+    try:
+        response_format = negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await versioned_response(
+        request,
+        lambda: async_db.run(_hypnogram_response, night, response_format),
+        variant=response_format,
+    )
+
+
+@router.get("/metrics")
+async def get_sleep_metrics(
+    request: Request,
+    current_user: Annotated[str, Depends(get_current_user)],
+    start_date: Optional[date] = Query(
+        None, description="Start date filter (ISO format: YYYY-MM-DD)"
+    ),
+    end_date: Optional[date] = Query(
+        None, description="End date filter (ISO format: YYYY-MM-DD)"
+    ),
+    metric: Optional[str] = Query(
+        None, description="Benchmark to restrict to, e.g. sleep_duration"
+    ),
+    format: Optional[str] = Query(
+        None, description="json, arrow or parquet; overrides the Accept header"
+    ),
+    accept: Annotated[str | None, Header()] = None,
+):
+    """
+    Get nights scored against the scientific benchmarks.
+
+    Each row is one night measured on one benchmark, with how far the
+    value lies outside the optimal range and whether it meets it. Scores
+    are computed at ingest time. Formats and ETags work as for /summary.
+
     Args:
         start_date: Optional start date for filtering
         end_date: Optional end date for filtering
+        metric: Optional benchmark name
+        format: Optional response format, "json", "arrow" or "parquet"
 
     Returns:
-        List of sleep stage records
+        List of benchmark scores ordered by date and metric
     """
-    with SleepDatabase() as db:
-        df = db.get_sleep_records(start_date, end_date)
+    try:
+        response_format = negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if df.is_empty():
-            return []
+    return await versioned_response(
+        request,
+        lambda: async_db.run(
+            _metrics_response, start_date, end_date, metric, response_format
+        ),
+        variant=response_format,
+    )
+
+
+@router.get("/transitions")
+async def get_stage_transitions(
+    request: Request,
+    current_user: Annotated[str, Depends(get_current_user)],
+    start_date: Optional[date] = Query(
+        None, description="Start date filter (ISO format: YYYY-MM-DD)"
+    ),
+    end_date: Optional[date] = Query(
+        None, description="End date filter (ISO format: YYYY-MM-DD)"
+    ),
+    format: Optional[str] = Query(
+        None, description="json, arrow or parquet; overrides the Accept header"
+    ),
+    accept: Annotated[str | None, Header()] = None,
+):
+    """
+    Get sleep fragmentation per night.
 
-        return df.to_dicts()
+    Computed from the compact 30-second stage rasters stored at ingest,
+    over each night's sleep period (first to last asleep epoch):
+    - Number of changes between stages
+    - Number of awake bouts and the minutes awake after sleep onset
+
+    Formats and ETags work as for /summary.
+
+    Args:
+        start_date: Optional start date for filtering
+        end_date: Optional end date for filtering
+        format: Optional response format, "json", "arrow" or "parquet"
+
+    Returns:
+        List of nights with stage_transitions, awakenings and
+        wake_after_sleep_onset_minutes, ordered by date
+    """
+    try:
+        response_format = negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await versioned_response(
+        request,
+        lambda: async_db.run(
+            _transitions_response, start_date, end_date, response_format
+        ),
+        variant=response_format,
+    )
+
+
+@router.get("/trends")
+async def get_sleep_trends(
+    request: Request,
+    current_user: Annotated[str, Depends(get_current_user)],
+    start_date: Optional[date] = Query(
+        None, description="Start date filter (ISO format: YYYY-MM-DD)"
+    ),
+    end_date: Optional[date] = Query(
+        None, description="End date filter (ISO format: YYYY-MM-DD)"
+    ),
+    format: Optional[str] = Query(
+        None, description="json, arrow or parquet; overrides the Accept header"
+    ),
+    accept: Annotated[str | None, Header()] = None,
+):
+    """
+    Get rolling sleep trends.
+
+    One row per night with, over the 7, 30 and 90 days ending that night:
+    - Moving averages of sleep duration and efficiency
+    - Average bedtime (local clock hours) and bedtime/wake time spread in
+      minutes
+    - Sleep debt against an 8-hour need, over 7 days and in total
+
+    Trends are maintained at ingest time. Formats and ETags work as for
+    /summary.
+
+    Args:
+        start_date: Optional start date for filtering
+        end_date: Optional end date for filtering
+        format: Optional response format, "json", "arrow" or "parquet"
+
+    Returns:
+        List of nightly trend rows ordered by date
+    """
+    try:
+        response_format = negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await versioned_response(
+        request,
+        lambda: async_db.run(_trends_response, start_date, end_date, response_format),
+        variant=response_format,
+    )
+
+
+@router.get("/circadian")
+async def get_circadian_metrics(
+    request: Request,
+    current_user: Annotated[str, Depends(get_current_user)],
+    start_date: Optional[date] = Query(
+        None, description="First night (ISO format: YYYY-MM-DD)"
+    ),
+    end_date: Optional[date] = Query(
+        None, description="Last night (ISO format: YYYY-MM-DD)"
+    ),
+):
+    """
+    Get sleep regularity and circadian timing over a range of nights.
+
+    Computed from a minute-by-minute sleep raster of the range:
+    - Sleep Regularity Index: how often the sleep/wake state of each minute
+      matches the same minute a day earlier, from -100 to 100
+    - Sleep midpoints overall, on workdays and on free days (local clock
+      hours)
+    - Social jetlag: hours between free-day and workday midpoints
+    - Chronotype from the free-day midpoint corrected for catch-up sleep
+
+    Defaults to the 28 nights up to the latest one; a range given by only
+    one bound is completed the same way. Ranges longer than 3660 nights or
+    ending before they start are rejected. ETags work as for /summary.
+
+    Args:
+        start_date: Optional first night
+        end_date: Optional last night
+
+    Returns:
+        Range metrics and per-night midpoint and regularity
+    """
+    # The missing bound is resolved first, so the range is checked however
+    # it was given (a lone start_date=1900-01-01 would span 40k nights)
+    first_day, last_day = await async_db.run(_circadian_range, start_date, end_date)
+    nights = (last_day - first_day).days + 1
+    if not 1 <= nights <= MAX_CIRCADIAN_NIGHTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range must span 1 to {MAX_CIRCADIAN_NIGHTS} nights",
+        )
+
+    return await versioned_response(
+        request, lambda: async_db.run(_circadian_response, first_day, last_day)
+    )
 
 
 @router.get("/stats")
-async def get_sleep_stats(current_user: Annotated[str, Depends(get_current_user)]):
+async def get_sleep_stats(
+    request: Request, current_user: Annotated[str, Depends(get_current_user)]
+):
     """
     Get overall sleep statistics.
 
+    Besides the all-time averages, reports nights, mean, variance and
+    standard deviation of each nightly metric over all time and over the
+    last 7, 30, 90 and 365 days. The figures are maintained as nights are
+    ingested, so this is a lookup rather than a scan of every night.
+
+    ETags work as for /summary.
+
     Returns:
         Summary statistics across all sleep data
     """
-    with SleepDatabase() as db:
-        summary_df = db.get_nightly_summary()
-
-        if summary_df.is_empty():
-            return {
-                "total_nights": 0,
-                "average_sleep_hours": 0,
-                "average_efficiency": 0
-            }
-
-        stats = {
-            "total_nights": len(summary_df),
-            "average_sleep_hours": float(summary_df["total_sleep_hours"].mean()),
-            "average_efficiency": float(summary_df["sleep_efficiency_pct"].mean()),
-            "date_range": {
-                "start": str(summary_df["date"].min()),
-                "end": str(summary_df["date"].max())
-            }
-        }
-
-        if "asleep_rem_pct" in summary_df.columns:
-            stats["average_rem_pct"] = float(
-                summary_df["asleep_rem_pct"].drop_nulls().mean()
-            )
-            stats["average_deep_pct"] = float(
-                summary_df["asleep_deep_pct"].drop_nulls().mean()
-            )
-            stats["average_core_pct"] = float(
-                summary_df["asleep_core_pct"].drop_nulls().mean()
-            )
-
-        return stats
+    return await versioned_response(request, lambda: async_db.run(_stats_response))
@@ -0,0 +1,140 @@
+"""
+Content-addressed profile picture storage with thumbnails.
+"""
+
+import hashlib
+import io
+from typing import Optional
+
+from PIL import Image
+
+from backend.auth.users import invalidate_principal
+from backend.cache import TTLCache
+from backend.database.sleep_db import SleepDatabase
+
+# Longest side of generated thumbnails, in pixels
+THUMBNAIL_SIZE = 128
+
+# Formats Pillow writes thumbnails in, keyed by upload MIME type
+_THUMBNAIL_FORMATS = {
+    "image/jpeg": "JPEG",
+    "image/png": "PNG",
+    "image/webp": "WEBP",
+}
+
+# Recently served images keyed by (sha256, thumbnail). Content never
+# changes for a hash, so entries only leave by LRU eviction or expiry.
+_picture_cache = TTLCache(maxsize=64, ttl=3600.0)
+
+
+def make_thumbnail(data: bytes, mime_type: str) -> Optional[bytes]:
+    """
+    Downscale an image to at most ``THUMBNAIL_SIZE`` pixels per side.
+
+    Args:
+        data: Image bytes
+        mime_type: MIME type of ``data``
+
+    Returns:
+        Thumbnail in the same format, or None when the format is not
+        supported (e.g. animated GIF) or the image is already small
+    """
+    image_format = _THUMBNAIL_FORMATS.get(mime_type)
+    if image_format is None:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= THUMBNAIL_SIZE:
+                return None
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, format=image_format)
+            return out.getvalue()
+    except Exception:
+        # Undecodable uploads are still stored; they just get no thumbnail
+        return None
+
+
+def _evict_current_picture(db: SleepDatabase, username: str):
+    """Forget the cached bytes of a picture that is about to be replaced."""
+    user = db.get_user(username)
+    if user and user["profile_picture_sha256"]:
+        sha256 = user["profile_picture_sha256"]
+        _picture_cache.discard_if(lambda key: key[0] == sha256)
+
+
+def store_profile_picture(username: str, data: bytes, mime_type: str) -> Optional[str]:
+    """
+    Store a profile picture and make it the user's current one.
+
+    Args:
+        username: User's email/username
+        data: Image bytes
+        mime_type: MIME type of ``data``
+
+    Returns:
+        Hex SHA-256 of the stored image, or None if the user does not exist
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    thumbnail = make_thumbnail(data, mime_type)
+
+    with SleepDatabase() as db:
+        _evict_current_picture(db, username)
+        stored = db.set_profile_picture(
+            username,
+            sha256,
+            data,
+            mime_type,
+            thumbnail=thumbnail,
+            thumbnail_mime_type=mime_type if thumbnail else None,
+        )
+
+    invalidate_principal(username)
+    return sha256 if stored else None
+
+
+def delete_profile_picture(username: str) -> bool:
+    """
+    Remove a user's profile picture.
+
+    Args:
+        username: User's email/username
+
+    Returns:
+        True if the user exists, False otherwise
+    """
+    with SleepDatabase() as db:
+        _evict_current_picture(db, username)
+        deleted = db.clear_profile_picture(username)
+
+    invalidate_principal(username)
+    return deleted
+
+
+def load_profile_picture(
+    sha256: str, thumbnail: bool = False
+) -> Optional[tuple[bytes, str]]:
+    """
+    Load a stored profile picture, served from memory when recently used.
+
+    Args:
+        sha256: Hex SHA-256 of the image
+        thumbnail: Load the thumbnail instead of the full image
+
+    Returns:
+        Tuple of (image bytes, MIME type) or None if not found
+    """
+    key = (sha256, thumbnail)
+    picture = _picture_cache.get(key)
+    if picture is not None:
+        return picture
+
+    with SleepDatabase() as db:
+        picture = db.get_profile_picture(sha256, thumbnail=thumbnail)
+
+    if picture is not None:
+        _picture_cache.set(key, picture)
+    return picture
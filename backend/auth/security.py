@@ -2,18 +2,32 @@
 Authentication and security utilities.
 """
 
+import asyncio
+import hashlib
+import hmac
 import os
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Optional
 
 import bcrypt
 from jose import JWTError, jwt
 
+from backend.config.settings import settings
+
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Signed profile picture URLs expire at the end of the day after they are
+# issued, so one URL (and the browser's cached copy) is reused all day
+PICTURE_URL_PERIOD_SECONDS = 60 * 60 * 24
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -28,6 +42,117 @@ def get_password_hash(password: str) -> str:
     return hashed.decode("utf-8")
 
 
+class PasswordPoolFull(Exception):
+    """Raised when too many password operations are already waiting."""
+
+
+class PasswordWorkerPool:
+    """
+    Bounded thread pool for bcrypt, keeping it off the event loop.
+
+    bcrypt releases the GIL while it works, so up to ``max_workers`` hashes
+    run in parallel. At most ``max_pending`` operations may be running or
+    queued at once; beyond that ``run`` fails fast with PasswordPoolFull
+    rather than letting a burst of logins queue without bound.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run ``fn(*args)`` on the pool and wait for it without blocking.
+
+        Args:
+            fn: Function to call on a worker thread
+            *args: Arguments for ``fn``
+
+        Returns:
+            Return value of ``fn``
+
+        Raises:
+            PasswordPoolFull: If ``max_pending`` operations are already pending
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordPoolFull(
+                    f"{self._pending} password operations already pending"
+                )
+            self._pending += 1
+            self._peak_queued = max(self._peak_queued, self._pending - self._running)
+
+        future = self._executor.submit(self._call, time.perf_counter(), fn, args)
+        # Runs when the call finishes or is cancelled before it starts
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, submitted: float, fn: Callable[..., Any], args: tuple) -> Any:
+        """Run one operation on a worker thread, recording its queue wait."""
+        with self._lock:
+            self._running += 1
+            self._total_wait += time.perf_counter() - submitted
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        """
+        Get a snapshot of the pool's load.
+
+        Returns:
+            Dictionary with worker count, running, queued and peak queued
+            operations, completed and rejected totals, and the mean time
+            completed operations spent queued in milliseconds
+        """
+        with self._lock:
+            mean_wait = self._total_wait / self._completed if self._completed else 0.0
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "mean_wait_ms": mean_wait * 1000,
+            }
+
+
+password_pool = PasswordWorkerPool(
+    max_workers=settings.password_workers,
+    max_pending=settings.password_queue_limit,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password pool."""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the password pool."""
+    return await password_pool.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -36,7 +161,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire})
+    # Unique token id; the principal cache is keyed by it
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -48,3 +174,36 @@ def verify_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+
+def _picture_signature(sha256: str, expires: int) -> str:
+    message = f"profile-picture:{sha256}:{expires}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def sign_picture(sha256: str, now: Optional[float] = None) -> tuple[int, str]:
+    """
+    Sign access to a profile picture for one to two days.
+
+    Args:
+        sha256: Hex SHA-256 of the picture
+        now: Current Unix time, defaults to the clock
+
+    Returns:
+        Expiry as Unix time and the hex signature to put in the URL
+    """
+    if now is None:
+        now = time.time()
+    expires = (int(now) // PICTURE_URL_PERIOD_SECONDS + 2) * PICTURE_URL_PERIOD_SECONDS
+    return expires, _picture_signature(sha256, expires)
+
+
+def verify_picture_signature(
+    sha256: str, expires: int, signature: str, now: Optional[float] = None
+) -> bool:
+    """Check a signature from sign_picture and that it has not expired."""
+    if now is None:
+        now = time.time()
+    if expires <= now:
+        return False
+    return hmac.compare_digest(_picture_signature(sha256, expires), signature)
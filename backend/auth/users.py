@@ -5,9 +5,22 @@ User management with DuckDB persistence.
 from dataclasses import dataclass
 from typing import Optional
 
-from backend.auth.security import get_password_hash, verify_password
+from backend.auth.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_password_async,
+)
+from backend.cache import TTLCache
+from backend.database.async_db import async_db
 from backend.database.sleep_db import SleepDatabase
 
+# Authenticated principals keyed by (username, token jti). Entries are
+# dropped by update_user_profile and otherwise expire, bounding how long a
+# change made outside this process goes unnoticed.
+PRINCIPAL_CACHE_SIZE = 1024
+PRINCIPAL_CACHE_TTL = 60.0
+_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
 
 @dataclass
 class User:
@@ -17,8 +30,17 @@ class User:
     hashed_password: str
     first_name: Optional[str] = None
     last_name: Optional[str] = None
-    profile_picture: Optional[bytes] = None
-    profile_picture_mime_type: Optional[str] = None
+    profile_picture_sha256: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Identity of an authenticated user, without credentials."""
+
+    username: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    profile_picture_sha256: Optional[str] = None
 
 
 def _get_db() -> SleepDatabase:
@@ -53,50 +75,90 @@ def get_user(username: str) -> Optional[User]:
                 hashed_password=user_dict["hashed_password"],
                 first_name=user_dict["first_name"],
                 last_name=user_dict["last_name"],
-                profile_picture=user_dict.get("profile_picture"),
-                profile_picture_mime_type=user_dict.get("profile_picture_mime_type"),
+                profile_picture_sha256=user_dict["profile_picture_sha256"],
             )
         return None
     finally:
         db.close()
 
 
-def authenticate_user(username: str, password: str) -> Optional[User]:
-    """Authenticate a user with username and password."""
-    user = get_user(username)
+def cached_principal(username: str, jti: Optional[str] = None) -> Optional[Principal]:
+    """
+    Get a cached principal without touching the database.
+
+    Cheap enough to call on the event loop; on a miss, call get_principal
+    on a database thread.
+    """
+    return _principal_cache.get((username, jti))
+
+
+def get_principal(username: str, jti: Optional[str] = None) -> Optional[Principal]:
+    """
+    Get the identity of an authenticated user, cached per token.
+
+    Unknown users are not cached, so a user created after a failed lookup
+    is found on the next request.
+    """
+    key = (username, jti)
+    principal = _principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    db = _get_db()
+    try:
+        principal_dict = db.get_principal(username)
+    finally:
+        db.close()
+
+    if principal_dict is None:
+        return None
+
+    principal = Principal(**principal_dict)
+    _principal_cache.set(key, principal)
+    return principal
+
+
+def invalidate_principal(username: str):
+    """Drop every cached principal of a user."""
+    _principal_cache.discard_if(lambda key: key[0] == username)
+
+
+async def authenticate_user(username: str, password: str) -> Optional[User]:
+    """
+    Authenticate a user with username and password.
+
+    Raises:
+        PasswordPoolFull: If the password pool is saturated
+    """
+    user = await async_db.call(get_user, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
 
-def create_user(username: str, password: str) -> User:
+async def create_user(username: str, password: str) -> User:
     """Create a new user."""
-    db = _get_db()
-    try:
-        user_dict = db.create_user(
-            username=username, hashed_password=get_password_hash(password)
-        )
-        if not user_dict:
-            raise ValueError(f"User {username} already exists")
-
-        return User(
-            username=user_dict["username"],
-            hashed_password=user_dict["hashed_password"],
-            first_name=user_dict["first_name"],
-            last_name=user_dict["last_name"],
-        )
-    finally:
-        db.close()
+    hashed_password = await get_password_hash_async(password)
+    user_dict = await async_db.run(
+        SleepDatabase.create_user, username=username, hashed_password=hashed_password
+    )
+    if not user_dict:
+        raise ValueError(f"User {username} already exists")
+
+    return User(
+        username=user_dict["username"],
+        hashed_password=user_dict["hashed_password"],
+        first_name=user_dict["first_name"],
+        last_name=user_dict["last_name"],
+    )
 
 
 def update_user_profile(
     username: str,
     first_name: Optional[str] = None,
     last_name: Optional[str] = None,
-    profile_picture: Optional[bytes] = None,
-    profile_picture_mime_type: Optional[str] = None,
 ) -> Optional[User]:
     """Update user profile information."""
     db = _get_db()
@@ -105,17 +167,15 @@ def update_user_profile(
             username=username,
             first_name=first_name,
             last_name=last_name,
-            profile_picture=profile_picture,
-            profile_picture_mime_type=profile_picture_mime_type,
         )
+        invalidate_principal(username)
         if user_dict:
             return User(
                 username=user_dict["username"],
                 hashed_password=user_dict["hashed_password"],
                 first_name=user_dict["first_name"],
                 last_name=user_dict["last_name"],
-                profile_picture=user_dict.get("profile_picture"),
-                profile_picture_mime_type=user_dict.get("profile_picture_mime_type"),
+                profile_picture_sha256=user_dict["profile_picture_sha256"],
             )
         return None
     finally:
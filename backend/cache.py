@@ -0,0 +1,106 @@
+"""
+Small in-process caches.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed time.
+
+    Once ``maxsize`` entries are stored, adding another evicts the least
+    recently used one. Expired entries are dropped lazily on lookup.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries kept
+            ttl: Seconds an entry stays valid after it is stored
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a live entry and mark it as recently used.
+
+        Args:
+            key: Entry key
+            default: Returned when the key is missing or expired
+
+        Returns:
+            Cached value or ``default``
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store an entry, evicting the least recently used one if full.
+
+        Args:
+            key: Entry key
+            value: Value to cache
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove an entry.
+
+        Args:
+            key: Entry key
+            default: Returned when the key is missing
+
+        Returns:
+            Removed value or ``default``
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def discard_if(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Remove every entry whose key matches ``predicate``.
+
+        Args:
+            predicate: Called with each key; True removes the entry
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
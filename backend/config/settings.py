@@ -19,6 +19,33 @@ class Settings:
         # Database path
         self.db_path = Path(os.getenv("DB_PATH", "data/sleep_analysis.duckdb"))
 
+        # Directory uploads are staged in while they wait to be ingested
+        self.staging_dir = Path(os.getenv("STAGING_DIR", "staging"))
+
+        # Threads async routes run their database queries on
+        self.db_workers = int(os.getenv("DB_WORKERS", "4"))
+
+        # Background ingest jobs run concurrently, and each parses its
+        # export with this many processes
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", "2"))
+        self.parse_workers = int(os.getenv("PARSE_WORKERS", "1"))
+
+        # bcrypt runs on this many threads; logins beyond the queue limit
+        # are turned away instead of waiting
+        self.password_workers = int(
+            os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1)))
+        )
+        self.password_queue_limit = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
+        # Where sleep records of several sources overlap, the time is
+        # credited once, to the first source whose name contains one of
+        # these (comma-separated, case-insensitive)
+        source_priority = os.getenv("SLEEP_SOURCE_PRIORITY", "Watch,iPhone")
+        self.sleep_source_priority = [
+            fragment.strip() for fragment in source_priority.split(",")
+            if fragment.strip()
+        ]
+
     def _get_or_create_encryption_key(self) -> str:
         """
         Get encryption key from environment or create a persistent one.
@@ -0,0 +1,113 @@
+"""
+Awaitable access to SleepDatabase for async route handlers.
+"""
+
+import asyncio
+import functools
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Concatenate, ParamSpec, TypeVar
+
+from backend.config.settings import settings
+from backend.database.sleep_db import SleepDatabase
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class AsyncSleepDatabase:
+    """
+    Run blocking database work on a dedicated thread pool.
+
+    DuckDB queries release the GIL but block the calling thread, so an
+    ``async def`` route that queried SleepDatabase directly stalled the
+    event loop, and with it every other request, for the whole query.
+    Routes instead await ``run()`` (or ``call()`` for helpers that open
+    their own SleepDatabase), which executes the work on one of
+    ``max_workers`` threads. Each thread keeps its own cursor in the
+    connection pool, so the number of open cursors stays bounded.
+
+    The executor is created on first use and can be shut down and
+    recreated, matching the application lifespan.
+    """
+
+    def __init__(self, max_workers: int, db_path: str | Path | None = None):
+        """
+        Initialize the facade.
+
+        Args:
+            max_workers: Number of database threads
+            db_path: Path to DuckDB database file, defaults to settings.db_path
+        """
+        self.max_workers = max_workers
+        self.db_path = Path(db_path) if db_path is not None else settings.db_path
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    async def run(
+        self,
+        fn: Callable[Concatenate[SleepDatabase, P], T],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        """
+        Call ``fn(db, *args, **kwargs)`` on a database thread.
+
+        ``fn`` is typically an unbound SleepDatabase method, e.g.
+        ``await async_db.run(SleepDatabase.get_nightly_summary, start, end)``,
+        or a function doing several queries and shaping the result, so
+        that no per-row work is left for the event loop.
+
+        Args:
+            fn: Function taking a SleepDatabase as its first argument
+            *args: Further positional arguments for ``fn``
+            **kwargs: Keyword arguments for ``fn``
+
+        Returns:
+            Return value of ``fn``
+        """
+        return await self.call(self._with_db, fn, *args, **kwargs)
+
+    async def call(self, fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        """
+        Call ``fn(*args, **kwargs)`` on a database thread.
+
+        For helpers that open their own SleepDatabase, such as the user
+        and profile picture functions.
+
+        Args:
+            fn: Blocking function to call
+            *args: Positional arguments for ``fn``
+            **kwargs: Keyword arguments for ``fn``
+
+        Returns:
+            Return value of ``fn``
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(fn, *args, **kwargs)
+        )
+
+    def shutdown(self):
+        """Wait for running work to finish and stop the database threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _with_db(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        with SleepDatabase(self.db_path) as db:
+            return fn(db, *args, **kwargs)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="db"
+                )
+            return self._executor
+
+
+async_db = AsyncSleepDatabase(max_workers=settings.db_workers)
@@ -0,0 +1,404 @@
+"""
+Versioned schema migrations for the sleep database.
+
+Every step runs once per database, in order, inside its own transaction,
+and is recorded in the schema_version table. ``migrate()`` runs when the
+database is first attached, so opening an up-to-date database costs a
+single version lookup and no DDL.
+
+To change the schema, append a step to ``MIGRATIONS``; never edit or
+renumber a step that has shipped. schema.sql is the baseline (step 1).
+Tables derived from sleep records are not filled by the step adding them
+but by re-aggregating the nights once the schema is current (see
+_add_derived_data_version).
+"""
+
+from collections.abc import Callable
+from pathlib import Path
+
+import duckdb
+
+SCHEMA_PATH = Path(__file__).parent / "schema.sql"
+
+
+def _create_schema(conn: duckdb.DuckDBPyConnection):
+    """Create the baseline tables, sequences and indexes."""
+    conn.execute(SCHEMA_PATH.read_text())
+
+
+def _add_user_profile_columns(conn: duckdb.DuckDBPyConnection):
+    """Add profile and onboarding columns to users tables that predate them."""
+    for column, column_type in (
+        ("profile_picture", "BLOB"),
+        ("profile_picture_mime_type", "VARCHAR"),
+        ("onboarding_completed", "BOOLEAN DEFAULT FALSE"),
+        ("onboarding_completed_at", "TIMESTAMP WITH TIME ZONE"),
+        ("tour_completed", "BOOLEAN DEFAULT FALSE"),
+        ("wearable_type", "VARCHAR"),
+        ("sleep_goals", "TEXT"),
+        ("preferences", "JSON"),
+    ):
+        conn.execute(
+            f"ALTER TABLE users ADD COLUMN IF NOT EXISTS {column} {column_type};"
+        )
+
+
+def _add_sleep_records_natural_key(conn: duckdb.DuckDBPyConnection):
+    """
+    Make (record_type, source_name, start_date, end_date, value) unique.
+
+    Databases created before the key existed may hold duplicates from
+    repeated uploads; the oldest copy of each record is kept.
+    """
+    conn.execute(
+        """
+        DELETE FROM sleep_records
+        WHERE id NOT IN (
+            SELECT MIN(id)
+            FROM sleep_records
+            GROUP BY record_type, source_name, start_date, end_date, value
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sleep_records_natural_key
+        ON sleep_records(record_type, source_name, start_date, end_date, value)
+        """
+    )
+
+
+def _move_profile_pictures_to_blob_store(conn: duckdb.DuckDBPyConnection):
+    """
+    Store profile pictures once per content hash instead of inline in users.
+
+    users keeps only the SHA-256 of its picture, so user lookups never read
+    image bytes. The old inline columns are emptied rather than dropped;
+    DuckDB cannot drop columns from a table that has indexes.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS profile_pictures (
+            sha256 VARCHAR PRIMARY KEY,
+            mime_type VARCHAR NOT NULL,
+            data BLOB NOT NULL,
+            thumbnail BLOB,
+            thumbnail_mime_type VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS profile_picture_sha256 VARCHAR;"
+    )
+    conn.execute(
+        """
+        INSERT INTO profile_pictures (sha256, mime_type, data)
+        SELECT sha256(profile_picture),
+               ANY_VALUE(COALESCE(profile_picture_mime_type, 'image/jpeg')),
+               ANY_VALUE(profile_picture)
+        FROM users
+        WHERE octet_length(profile_picture) > 0
+        GROUP BY sha256(profile_picture)
+        """
+    )
+    conn.execute(
+        """
+        UPDATE users
+        SET profile_picture_sha256 = CASE
+                WHEN octet_length(profile_picture) > 0
+                THEN sha256(profile_picture)
+            END,
+            profile_picture = NULL,
+            profile_picture_mime_type = NULL
+        WHERE profile_picture IS NOT NULL
+        """
+    )
+
+
+def _add_data_version(conn: duckdb.DuckDBPyConnection):
+    """
+    Add a counter bumped whenever ingest changes sleep data.
+
+    Responses derived from sleep data are cached and tagged with it, so it
+    lives in the database to keep counting across restarts.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO data_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING"
+    )
+
+
+def _add_sleep_stats(conn: duckdb.DuckDBPyConnection):
+    """
+    Materialize count, sum and sum of squares of nightly summary metrics.
+
+    window_days 0 holds all-time aggregates; 7, 30, 90 and 365 cover that
+    many days up to the latest night. There is no primary key: every
+    ingest rewrites these rows, which DuckDB's indexes handle poorly on
+    encrypted files.
+    """
+    metrics = [
+        "total_sleep_hours",
+        "sleep_efficiency_pct",
+        "asleep_rem_pct",
+        "asleep_deep_pct",
+        "asleep_core_pct",
+    ]
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sleep_stats (
+            window_days INTEGER NOT NULL,
+            metric VARCHAR NOT NULL,
+            night_count BIGINT NOT NULL,
+            total DOUBLE NOT NULL,
+            total_sq DOUBLE NOT NULL,
+            first_date DATE,
+            last_date DATE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO sleep_stats (
+            window_days, metric, night_count, total, total_sq,
+            first_date, last_date
+        )
+        WITH latest AS (
+            SELECT MAX(date) AS date FROM sleep_nightly_summary
+        ),
+        nights AS (
+            UNPIVOT (SELECT date, {", ".join(metrics)} FROM sleep_nightly_summary)
+            ON {", ".join(metrics)}
+            INTO NAME metric VALUE value
+        )
+        SELECT
+            windows.days,
+            metrics.metric,
+            COUNT(nights.value),
+            COALESCE(SUM(nights.value), 0),
+            COALESCE(SUM(nights.value * nights.value), 0),
+            MIN(nights.date),
+            MAX(nights.date)
+        FROM unnest([0, 7, 30, 90, 365]) AS windows(days)
+        CROSS JOIN unnest(?::VARCHAR[]) AS metrics(metric)
+        CROSS JOIN latest
+        LEFT JOIN nights
+            ON nights.metric = metrics.metric
+            AND (
+                windows.days = 0
+                OR nights.date > latest.date - windows.days
+            )
+        GROUP BY windows.days, metrics.metric
+        """,
+        [metrics],
+    )
+
+
+def _add_sleep_trends(conn: duckdb.DuckDBPyConnection):
+    """
+    Add rolling sleep trends per night.
+
+    Each row aggregates the nights in the 7, 30 or 90 days ending on its
+    date; see SleepDatabase.update_sleep_trends, which fills the table in
+    the derived data rebuild (see _add_derived_data_version). No primary
+    key: ingest rewrites the tail of the table.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sleep_trends (
+            date DATE NOT NULL,
+            nights_7d INTEGER NOT NULL,
+            sleep_hours_7d DOUBLE,
+            sleep_hours_30d DOUBLE,
+            sleep_hours_90d DOUBLE,
+            efficiency_7d DOUBLE,
+            efficiency_30d DOUBLE,
+            efficiency_90d DOUBLE,
+            bedtime_7d DOUBLE,
+            bedtime_30d DOUBLE,
+            bedtime_stddev_7d_minutes DOUBLE,
+            bedtime_stddev_30d_minutes DOUBLE,
+            wake_time_stddev_30d_minutes DOUBLE,
+            sleep_debt_7d_hours DOUBLE,
+            sleep_debt_total_hours DOUBLE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _add_sleep_circadian(conn: duckdb.DuckDBPyConnection):
+    """
+    Add per-night sleep midpoint and regularity.
+
+    Rows come from the minute raster in backend.analysis.circadian, filled
+    by the derived data rebuild (see _add_derived_data_version).
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sleep_circadian (
+            date DATE NOT NULL,
+            asleep_minutes INTEGER NOT NULL,
+            sleep_midpoint_hour DOUBLE,
+            sleep_regularity DOUBLE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _add_sleep_stage_rasters(conn: duckdb.DuckDBPyConnection):
+    """
+    Add run-length encoded per-night stage rasters.
+
+    Rows are built from stored records by the derived data rebuild (see
+    _add_derived_data_version).
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sleep_stage_rasters (
+            date DATE NOT NULL,
+            start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            epoch_seconds INTEGER NOT NULL,
+            epochs INTEGER NOT NULL,
+            stages BLOB NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _add_derived_data_version(conn: duckdb.DuckDBPyConnection):
+    """
+    Record which version of the derivations produced the derived tables.
+
+    Summaries, stage rasters, hypnograms, scores, trends and circadian
+    metrics are computed from sleep records by application code. When
+    that code changes, SleepDatabase.DERIVED_DATA_VERSION is bumped and a
+    database derived by an older version is re-aggregated once, after the
+    schema steps, so backfills never depend on the schema of the step
+    that added them. Version 0 means never derived.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS derived_data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO derived_data_version (id, version) VALUES (1, 0)"
+        " ON CONFLICT DO NOTHING"
+    )
+
+
+def _add_local_clock_times(conn: duckdb.DuckDBPyConnection):
+    """
+    Keep the UTC offset of sleep records and local clock times of nights.
+
+    Records stored before have no offset until an export containing them
+    is ingested again in full; their nights read as UTC until then.
+    """
+    for table, column, column_type in (
+        ("sleep_records", "utc_offset_minutes", "SMALLINT"),
+        ("sleep_nightly_summary", "sleep_start_local", "TIMESTAMP"),
+        ("sleep_nightly_summary", "sleep_end_local", "TIMESTAMP"),
+    ):
+        conn.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type};"
+        )
+
+
+# (version, description, step) in the order they are applied
+MIGRATIONS: list[tuple[int, str, Callable[[duckdb.DuckDBPyConnection], None]]] = [
+    (1, "Create baseline schema", _create_schema),
+    (2, "Add user profile and onboarding columns", _add_user_profile_columns),
+    (3, "Add sleep_records natural key", _add_sleep_records_natural_key),
+    (4, "Move profile pictures to blob store", _move_profile_pictures_to_blob_store),
+    (5, "Add data version", _add_data_version),
+    (6, "Add materialized sleep stats", _add_sleep_stats),
+    (7, "Add sleep trends", _add_sleep_trends),
+    (8, "Add sleep circadian metrics", _add_sleep_circadian),
+    (9, "Add sleep stage rasters", _add_sleep_stage_rasters),
+    (10, "Add derived data version", _add_derived_data_version),
+    (11, "Add local clock times", _add_local_clock_times),
+]
+
+
+def get_schema_version(conn: duckdb.DuckDBPyConnection) -> int:
+    """
+    Get the version of the current database's schema.
+
+    Args:
+        conn: Connection with the database selected
+
+    Returns:
+        Highest applied migration version, 0 for a new database
+    """
+    exists = conn.execute(
+        """
+        SELECT COUNT(*) FROM duckdb_tables()
+        WHERE database_name = current_database()
+        AND table_name = 'schema_version'
+        """
+    ).fetchone()[0]
+    if not exists:
+        return 0
+
+    return conn.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM schema_version"
+    ).fetchone()[0]
+
+
+def migrate(conn: duckdb.DuckDBPyConnection) -> int:
+    """
+    Apply pending migrations to the current database.
+
+    Args:
+        conn: Connection with the database selected
+
+    Returns:
+        Number of migrations applied
+    """
+    version = get_schema_version(conn)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        return 0
+
+    if version == 0:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+    for step_version, description, step in pending:
+        conn.begin()
+        try:
+            step(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                [step_version, description],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return len(pending)
@@ -0,0 +1,164 @@
+"""
+Process-wide DuckDB connection pool handing out per-thread cursors.
+"""
+
+import itertools
+import threading
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import duckdb
+
+
+@dataclass
+class _Attachment:
+    """An attached database file and the cursors opened on it."""
+
+    root: duckdb.DuckDBPyConnection
+    users: int = 0
+    pinned: bool = False
+    cursors: dict[int, duckdb.DuckDBPyConnection] = field(default_factory=dict)
+
+
+class _ThreadToken:
+    """Kept in a thread's local storage, so it is dropped when the thread exits."""
+
+    _keys = itertools.count()
+
+    def __init__(self):
+        self.key = next(self._keys)
+
+
+class ConnectionPool:
+    """
+    Share one attachment per database file across the whole process.
+
+    Opening the encrypted database (connect, load httpfs, ATTACH, schema
+    check) costs tens of milliseconds, and DuckDB refuses to attach the
+    same file twice in one process. The pool attaches each file once and
+    gives every thread its own cursor on it, reused across borrows, since
+    a DuckDB connection must not be used by two threads at the same time.
+    A thread's cursors are closed at the next borrow after it exits.
+
+    Files opened with ``open()`` stay attached until ``close()``; the app
+    does this at startup. Otherwise a file is detached when its last
+    borrower releases it, so scripts that never open the pool still work.
+    """
+
+    def __init__(self, connect: Callable[[Path], duckdb.DuckDBPyConnection]):
+        """
+        Initialize the pool.
+
+        Args:
+            connect: Opens a connection with the database file attached and
+                     selected as the default database
+        """
+        self._connect = connect
+        self._attachments: dict[Path, _Attachment] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Keys of exited threads whose cursors are still open
+        self._exited: list[int] = []
+
+    def open(self, db_path: str | Path):
+        """
+        Attach a database file and keep it attached until ``close()``.
+
+        Args:
+            db_path: Path to DuckDB database file
+        """
+        with self._lock:
+            self._attachment(Path(db_path)).pinned = True
+
+    def close(self):
+        """Detach every database file; outstanding cursors become unusable."""
+        with self._lock:
+            attachments = list(self._attachments.values())
+            self._attachments.clear()
+        for attachment in attachments:
+            self._detach(attachment)
+
+    def acquire(self, db_path: str | Path) -> duckdb.DuckDBPyConnection:
+        """
+        Borrow the calling thread's cursor on a database file.
+
+        Every ``acquire()`` must be paired with a ``release()``.
+
+        Args:
+            db_path: Path to DuckDB database file
+
+        Returns:
+            Cursor with the attached database selected
+        """
+        key = self._thread_key()
+        with self._lock:
+            self._close_exited_cursors()
+            attachment = self._attachment(Path(db_path))
+            attachment.users += 1
+            cursor = attachment.cursors.get(key)
+            if cursor is None:
+                cursor = attachment.root.cursor()
+                cursor.execute("USE db;")
+                attachment.cursors[key] = cursor
+        return cursor
+
+    def release(self, db_path: str | Path):
+        """
+        Return a cursor borrowed with ``acquire()``.
+
+        Args:
+            db_path: Path to DuckDB database file
+        """
+        key = Path(db_path).resolve()
+        with self._lock:
+            attachment = self._attachments.get(key)
+            if attachment is None:
+                # Pool closed while the cursor was borrowed
+                return
+            attachment.users -= 1
+            if attachment.users > 0 or attachment.pinned:
+                return
+            del self._attachments[key]
+        self._detach(attachment)
+
+    def _thread_key(self) -> int:
+        """
+        Identify the calling thread for as long as it runs.
+
+        Thread ids are reused once a thread exits, so they cannot tell a
+        new executor thread from the one whose cursor is still stored.
+        """
+        token = getattr(self._local, "token", None)
+        if token is None:
+            token = self._local.token = _ThreadToken()
+            # Runs in whichever thread drops the token, possibly while the
+            # pool lock is held, so only record the key here
+            weakref.finalize(token, self._exited.append, token.key)
+        return token.key
+
+    def _close_exited_cursors(self):
+        """Close the cursors of threads that have exited; caller holds the lock."""
+        while self._exited:
+            key = self._exited.pop()
+            for attachment in self._attachments.values():
+                cursor = attachment.cursors.pop(key, None)
+                if cursor is not None:
+                    cursor.close()
+
+    def _attachment(self, db_path: Path) -> _Attachment:
+        """Look up or create the attachment for a file; caller holds the lock."""
+        key = db_path.resolve()
+        attachment = self._attachments.get(key)
+        if attachment is None:
+            attachment = _Attachment(root=self._connect(db_path))
+            self._attachments[key] = attachment
+        return attachment
+
+    @staticmethod
+    def _detach(attachment: _Attachment):
+        """Close an attachment's cursors and its root connection."""
+        for cursor in attachment.cursors.values():
+            cursor.close()
+        attachment.root.close()
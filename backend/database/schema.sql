@@ -1,4 +1,7 @@
 -- DuckDB schema for Apple Health sleep data analysis
+--
+-- Baseline schema, applied once as migration 1. Later schema changes are
+-- new steps in migrations.py.
 
 -- Sequences for auto-incrementing IDs
 CREATE SEQUENCE IF NOT EXISTS seq_users START 1;
@@ -128,6 +131,34 @@ CREATE TABLE IF NOT EXISTS insights_cache (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Ingest jobs table: background export processing and its progress
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id VARCHAR PRIMARY KEY,
+    username VARCHAR NOT NULL,
+    filename VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    bytes_total BIGINT DEFAULT 0,
+    bytes_parsed BIGINT DEFAULT 0,
+    records_seen BIGINT DEFAULT 0,
+    rows_written BIGINT DEFAULT 0,
+    result JSON,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Ingest watermarks: newest record stored per record type and source, so
+-- re-uploads of a cumulative export only write what is new
+CREATE TABLE IF NOT EXISTS ingest_watermarks (
+    record_type VARCHAR NOT NULL,
+    source_name VARCHAR NOT NULL,
+    max_creation_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    max_end_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (record_type, source_name)
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_sleep_records_date ON sleep_records(date);
@@ -137,3 +168,4 @@ CREATE INDEX IF NOT EXISTS idx_sleep_metrics_date ON sleep_metrics(date);
 CREATE INDEX IF NOT EXISTS idx_sleep_metrics_name ON sleep_metrics(metric_name);
 CREATE INDEX IF NOT EXISTS idx_insights_cache_days ON insights_cache(days_analyzed);
 CREATE INDEX IF NOT EXISTS idx_insights_cache_generated ON insights_cache(generated_at);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_username ON ingest_jobs(username);
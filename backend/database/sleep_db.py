@@ -2,250 +2,978 @@
 DuckDB database operations for sleep data.
 """
 
+import os
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from datetime import date, datetime
 from pathlib import Path
 
 import duckdb
 import polars as pl
 
+from backend.analysis.intervals import merge_intervals
 from backend.config.settings import settings
+from backend.database.migrations import migrate
+from backend.database.pool import ConnectionPool
+
+# Connections (by id) inside a SleepDatabase.transaction() block, so that
+# nested blocks join the outer transaction instead of committing early
+_open_transactions: set[int] = set()
+
+# Callbacks waiting for the transaction of a connection (by id) to commit
+_after_commit: dict[int, list[Callable[[], object]]] = {}
 
 
 class SleepDatabase:
     """Manage sleep data in DuckDB with encryption at rest."""
 
-    def __init__(self, db_path: str | Path = "data/sleep_analysis.duckdb"):
+    # Columns of sleep_records that get_sleep_records() can project
+    SLEEP_RECORD_FIELDS = (
+        "id",
+        "record_type",
+        "source_name",
+        "source_version",
+        "device",
+        "creation_date",
+        "start_date",
+        "end_date",
+        "value",
+        "sleep_stage",
+        "duration_minutes",
+        "date",
+        "utc_offset_minutes",
+    )
+
+    # Nightly summary columns aggregated in sleep_stats, and the rolling
+    # windows (in days, ending at the latest night) kept besides all-time
+    STATS_METRICS = (
+        "total_sleep_hours",
+        "sleep_efficiency_pct",
+        "asleep_rem_pct",
+        "asleep_deep_pct",
+        "asleep_core_pct",
+    )
+    STATS_WINDOWS = (7, 30, 90, 365)
+
+    # How each benchmark in sleep_benchmarks is measured on a night, as a
+    # DOUBLE expression over sleep_nightly_summary. Clock times are local
+    # hours where the night was recorded; onsets after midnight count past
+    # 24 so they compare as late rather than early. Benchmarks not listed here
+    # (latency, consistency, midpoint) are not scored per night.
+    BENCHMARK_METRICS = {
+        "sleep_duration": "total_sleep_hours",
+        "sleep_efficiency": "sleep_efficiency_pct",
+        "rem_sleep": "asleep_rem_pct",
+        "deep_sleep": "asleep_deep_pct",
+        "light_sleep": "asleep_core_pct",
+        "wake_after_sleep_onset": "CAST(awake_minutes AS DOUBLE)",
+        "sleep_onset_time": (
+            "hour(sleep_start_local) + minute(sleep_start_local) / 60.0"
+            " + CASE WHEN hour(sleep_start_local) < 12 THEN 24 ELSE 0 END"
+        ),
+        "wake_time": "hour(sleep_end_local) + minute(sleep_end_local) / 60.0",
+    }
+
+    # Nightly sleep need that sleep debt in sleep_trends is measured against
+    SLEEP_NEED_HOURS = 8.0
+
+    # Version of the code deriving tables from sleep records: summaries and
+    # stage breakdowns, stage rasters, hypnograms, scores, trends and
+    # circadian metrics. Bump it when a derivation changes; databases
+    # derived by an older version are re-aggregated once when attached.
+    DERIVED_DATA_VERSION = 4
+
+    # Stages drawn in hypnograms; in_bed spans the whole night and is not one
+    HYPNOGRAM_STAGES = (
+        "awake",
+        "asleep_rem",
+        "asleep_core",
+        "asleep_deep",
+        "asleep_unspecified",
+    )
+
+    def __init__(self, db_path: str | Path = settings.db_path):
         """
-        Initialize database connection with encryption.
+        Borrow this thread's connection to the encrypted database.
 
         Args:
             db_path: Path to DuckDB database file
         """
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = db_pool.acquire(self.db_path)
+        self._pooled = True
+
+    @classmethod
+    def _on_connection(
+        cls, conn: duckdb.DuckDBPyConnection, db_path: Path
+    ) -> "SleepDatabase":
+        """
+        Wrap a connection that was not borrowed from the pool.
+
+        Used while the pool is still opening it; close() leaves it open.
+
+        Args:
+            conn: Connection with the database selected
+            db_path: Path to the attached DuckDB database file
+        """
+        db = cls.__new__(cls)
+        db.db_path = Path(db_path)
+        db.conn = conn
+        db._pooled = False
+        return db
+
+    @staticmethod
+    def connect(db_path: Path) -> duckdb.DuckDBPyConnection:
+        """
+        Open the encrypted database file and bring its schema up to date.
+
+        Args:
+            db_path: Path to DuckDB database file
+
+        Returns:
+            Connection with the database attached as ``db`` and selected
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
 
         # Get encryption key
         encryption_key = settings.db_encryption_key
 
         # Start with in-memory connection
-        self.conn = duckdb.connect(":memory:")
+        conn = duckdb.connect(":memory:")
 
         # Load httpfs extension for OpenSSL hardware-accelerated encryption
         try:
-            self.conn.execute("INSTALL httpfs;")
-            self.conn.execute("LOAD httpfs;")
+            conn.execute("INSTALL httpfs;")
+            conn.execute("LOAD httpfs;")
         except Exception:
             # httpfs not available, will use MbedTLS (slower but functional)
             pass
 
         # Attach the database file with encryption
         # Use parameterized query for safety
-        self.conn.execute(
-            f"ATTACH '{self.db_path}' AS db (ENCRYPTION_KEY '{encryption_key}');"
+        conn.execute(
+            f"ATTACH '{db_path}' AS db (ENCRYPTION_KEY '{encryption_key}');"
         )
 
         # Use the attached database
-        self.conn.execute("USE db;")
+        conn.execute("USE db;")
 
         # Enable temporary file encryption for additional security
-        self.conn.execute("SET temp_file_encryption = true;")
+        conn.execute("SET temp_file_encryption = true;")
+
+        # On an encrypted file, an index lookup of a row that was on disk
+        # when the file was attached returns NULL for any column updated
+        # from NULL, until the next checkpoint (tests/test_database.py).
+        # That covers profile names and ingest job outcomes. UPDATE and
+        # ON CONFLICT writes are both affected, and CHECKPOINT fails while
+        # another write is active, so point lookups use table scans
+        # instead; indexes still enforce uniqueness and ON CONFLICT.
+        conn.execute("SET GLOBAL index_scan_max_count = 0;")
+        conn.execute("SET GLOBAL index_scan_percentage = 0;")
+
+        # Bring the schema up to date; a no-op once the database is current
+        migrate(conn)
+        db = SleepDatabase._on_connection(conn, db_path)
+        db._rederive_if_outdated()
+        # The file may be missing or stale, e.g. if the database was restored
+        db.publish_data_version()
+        return conn
+
+    def _rederive_if_outdated(self):
+        """
+        Re-aggregate every night if derived by an older DERIVED_DATA_VERSION.
 
-        self._initialize_schema()
+        Runs after the migrations, so the current derivations always find
+        the schema they expect.
+        """
+        derived = self.conn.execute(
+            "SELECT version FROM derived_data_version WHERE id = 1"
+        ).fetchone()[0]
+        if derived >= self.DERIVED_DATA_VERSION:
+            return
+
+        # Imported here: the ingest pipeline imports this module
+        from backend.ingest.pipeline import aggregate_nights
+
+        with self.transaction():
+            dates = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT DISTINCT date FROM sleep_records ORDER BY date"
+                ).fetchall()
+            ]
+            if aggregate_nights(self, dates):
+                self.bump_data_version()
+            self.conn.execute(
+                """
+                UPDATE derived_data_version
+                SET version = ?, updated_at = now()
+                WHERE id = 1
+                """,
+                [self.DERIVED_DATA_VERSION],
+            )
 
-    def _initialize_schema(self):
-        """Create tables if they don't exist."""
-        schema_path = Path(__file__).parent / "schema.sql"
-        with open(schema_path) as f:
-            schema_sql = f.read()
-        self.conn.execute(schema_sql)
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Run the block in a transaction, committed when the block completes.
 
-        # Run migrations for existing databases
-        self._run_migrations()
+        Blocks nest: one inside another block on the same connection joins
+        the outer transaction, so the outermost block commits or rolls
+        back everything together.
+        """
+        key = id(self.conn)
+        if key in _open_transactions:
+            yield
+            return
 
-    def _run_migrations(self):
-        """Run database migrations for schema updates."""
+        self.conn.begin()
+        _open_transactions.add(key)
         try:
-            # Check which columns exist in users table
-            result = self.conn.execute("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name = 'users'
-                AND column_name IN (
-                    'profile_picture',
-                    'profile_picture_mime_type',
-                    'onboarding_completed',
-                    'onboarding_completed_at',
-                    'tour_completed',
-                    'wearable_type',
-                    'sleep_goals',
-                    'preferences'
-                )
-            """).fetchall()
-
-            existing_columns = [row[0] for row in result]
-
-            # Add profile_picture column if it doesn't exist
-            if 'profile_picture' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN profile_picture BLOB;")
-
-            # Add profile_picture_mime_type column if it doesn't exist
-            if 'profile_picture_mime_type' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN profile_picture_mime_type VARCHAR;")
-
-            # Add onboarding_completed column if it doesn't exist
-            if 'onboarding_completed' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN onboarding_completed BOOLEAN DEFAULT FALSE;")
-
-            # Add onboarding_completed_at column if it doesn't exist
-            if 'onboarding_completed_at' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN onboarding_completed_at TIMESTAMP WITH TIME ZONE;")
-
-            # Add tour_completed column if it doesn't exist
-            if 'tour_completed' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN tour_completed BOOLEAN DEFAULT FALSE;")
-
-            # Add wearable_type column if it doesn't exist
-            if 'wearable_type' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN wearable_type VARCHAR;")
-
-            # Add sleep_goals column if it doesn't exist
-            if 'sleep_goals' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN sleep_goals TEXT;")
-
-            # Add preferences column if it doesn't exist
-            if 'preferences' not in existing_columns:
-                self.conn.execute("ALTER TABLE users ADD COLUMN preferences JSON;")
+            yield
+            self.conn.commit()
         except Exception:
-            # If migration fails, it's likely because the columns already exist
-            # or the table doesn't exist yet (will be created by schema.sql)
-            pass
-
-    def insert_sleep_records(self, df: pl.DataFrame) -> int:
+            self.conn.rollback()
+            raise
+        finally:
+            _open_transactions.discard(key)
+            callbacks = _after_commit.pop(key, [])
+
+        for callback in callbacks:
+            callback()
+
+    def _on_commit(self, callback: Callable[[], object]):
+        """Call ``callback`` once the open transaction commits, or now."""
+        key = id(self.conn)
+        if key in _open_transactions:
+            _after_commit.setdefault(key, []).append(callback)
+        else:
+            callback()
+
+    def insert_sleep_records(self, df: pl.DataFrame) -> pl.Series:
         """
         Insert sleep records from Polars DataFrame.
 
+        Records already stored, by (type, source, start, end, value), are
+        skipped, except that those stored without a UTC offset take the
+        one in ``df``.
+
         Args:
             df: DataFrame with sleep records from SleepExtractor
 
         Returns:
-            Number of rows inserted
+            Night date of every row inserted or given its offset; its length
+            is the number of changed rows and its unique values are the
+            nights that changed
         """
         # DuckDB can directly query Polars DataFrames
-        result = self.conn.execute(
+        return self.conn.execute(
             """
             INSERT INTO sleep_records (
                 record_type, source_name, source_version, device,
                 creation_date, start_date, end_date, value,
-                sleep_stage, duration_minutes, date
+                sleep_stage, duration_minutes, date, utc_offset_minutes
             )
             SELECT
                 type, sourceName, sourceVersion, device,
                 creationDate, startDate, endDate, value,
-                sleep_stage, duration_minutes, date
+                sleep_stage, duration_minutes, date, utc_offset_minutes
             FROM df
-            ON CONFLICT DO NOTHING
+            ON CONFLICT (record_type, source_name, start_date, end_date, value)
+            DO UPDATE SET utc_offset_minutes = EXCLUDED.utc_offset_minutes
+            WHERE sleep_records.utc_offset_minutes IS NULL
+            AND EXCLUDED.utc_offset_minutes IS NOT NULL
+            RETURNING date
             """
-        )
-        return result.fetchall()[0][0] if result else 0
+        ).pl()["date"]
 
-    def insert_nightly_summary(self, df: pl.DataFrame) -> int:
+    def get_sleep_records_for_dates(
+        self, dates: list[date] | None
+    ) -> pl.DataFrame:
         """
-        Insert nightly summary data.
+        Retrieve every stored sleep record of the given nights.
+
+        Columns are named like SleepExtractor output so the result can be
+        fed back into SleepExtractor.get_nightly_totals().
 
         Args:
-            df: DataFrame with nightly totals from SleepExtractor
+            dates: Night dates to load; all nights if None
 
         Returns:
-            Number of rows inserted
+            Polars DataFrame with sleep records ordered by start time
         """
-        result = self.conn.execute(
+        date_filter = "WHERE date = ANY(?)" if dates is not None else ""
+        return self.conn.execute(
+            f"""
+            SELECT
+                record_type AS type,
+                source_name AS sourceName,
+                source_version AS sourceVersion,
+                device,
+                creation_date AS creationDate,
+                start_date AS startDate,
+                end_date AS endDate,
+                value,
+                sleep_stage,
+                duration_minutes,
+                date,
+                utc_offset_minutes
+            FROM sleep_records
+            {date_filter}
+            ORDER BY start_date, id
+            """,
+            [dates] if dates is not None else [],
+        ).pl()
+
+    def get_ingest_watermarks(self) -> pl.DataFrame:
+        """
+        Retrieve the newest stored record per record type and source.
+
+        Returns:
+            Polars DataFrame with type, sourceName, max_creation_date and
+            max_end_date columns, named to join against parsed records
+        """
+        return self.conn.execute(
             """
-            INSERT INTO sleep_nightly_summary (
-                date, sleep_start, sleep_end,
-                total_sleep_minutes, total_sleep_hours,
-                time_in_bed_minutes, sleep_efficiency_pct,
-                source_name
-            )
             SELECT
-                date, sleep_start, sleep_end,
-                total_sleep_minutes, total_sleep_hours,
-                time_in_bed_minutes, sleep_efficiency_pct,
-                source
+                record_type AS type,
+                source_name AS sourceName,
+                max_creation_date,
+                max_end_date
+            FROM ingest_watermarks
+            """
+        ).pl()
+
+    def update_ingest_watermarks(self, df: pl.DataFrame):
+        """
+        Advance watermarks past the records of an ingested export.
+
+        Args:
+            df: DataFrame with sleep records from SleepExtractor
+        """
+        self.conn.execute(
+            """
+            INSERT INTO ingest_watermarks (
+                record_type, source_name, max_creation_date, max_end_date
+            )
+            SELECT type, sourceName, MAX(creationDate), MAX(endDate)
             FROM df
-            ON CONFLICT (date) DO UPDATE SET
-                sleep_start = EXCLUDED.sleep_start,
-                sleep_end = EXCLUDED.sleep_end,
-                total_sleep_minutes = EXCLUDED.total_sleep_minutes,
-                total_sleep_hours = EXCLUDED.total_sleep_hours,
-                time_in_bed_minutes = EXCLUDED.time_in_bed_minutes,
-                sleep_efficiency_pct = EXCLUDED.sleep_efficiency_pct,
-                source_name = EXCLUDED.source_name,
+            GROUP BY type, sourceName
+            ON CONFLICT (record_type, source_name) DO UPDATE SET
+                max_creation_date = GREATEST(
+                    ingest_watermarks.max_creation_date,
+                    EXCLUDED.max_creation_date
+                ),
+                max_end_date = GREATEST(
+                    ingest_watermarks.max_end_date, EXCLUDED.max_end_date
+                ),
                 updated_at = now()
             """
         )
-        return result.fetchall()[0][0] if result else 0
 
-    def update_sleep_stage_percentages(self):
-        """Calculate and update sleep stage percentages in nightly summary."""
-        self.conn.execute(
-            """
-            WITH stage_totals AS (
+    def insert_nightly_summary(self, df: pl.DataFrame) -> int:
+        """
+        Insert nightly summary data, stage breakdowns included.
+
+        Args:
+            df: DataFrame with nightly totals from SleepExtractor
+
+        Returns:
+            Number of rows inserted
+        """
+        with self._maintaining_stats(df["date"].to_list()):
+            result = self.conn.execute(
+                """
+                INSERT INTO sleep_nightly_summary (
+                    date, sleep_start, sleep_end,
+                    sleep_start_local, sleep_end_local,
+                    total_sleep_minutes, total_sleep_hours,
+                    time_in_bed_minutes, sleep_efficiency_pct,
+                    source_name,
+                    asleep_core_minutes, asleep_deep_minutes,
+                    asleep_rem_minutes, awake_minutes,
+                    asleep_core_pct, asleep_deep_pct,
+                    asleep_rem_pct, awake_pct
+                )
+                SELECT
+                    date, sleep_start, sleep_end,
+                    sleep_start_local, sleep_end_local,
+                    total_sleep_minutes, total_sleep_hours,
+                    time_in_bed_minutes, sleep_efficiency_pct,
+                    source,
+                    asleep_core_minutes, asleep_deep_minutes,
+                    asleep_rem_minutes, awake_minutes,
+                    asleep_core_pct, asleep_deep_pct,
+                    asleep_rem_pct, awake_pct
+                FROM df
+                ON CONFLICT (date) DO UPDATE SET
+                    sleep_start = EXCLUDED.sleep_start,
+                    sleep_end = EXCLUDED.sleep_end,
+                    sleep_start_local = EXCLUDED.sleep_start_local,
+                    sleep_end_local = EXCLUDED.sleep_end_local,
+                    total_sleep_minutes = EXCLUDED.total_sleep_minutes,
+                    total_sleep_hours = EXCLUDED.total_sleep_hours,
+                    time_in_bed_minutes = EXCLUDED.time_in_bed_minutes,
+                    sleep_efficiency_pct = EXCLUDED.sleep_efficiency_pct,
+                    source_name = EXCLUDED.source_name,
+                    asleep_core_minutes = EXCLUDED.asleep_core_minutes,
+                    asleep_deep_minutes = EXCLUDED.asleep_deep_minutes,
+                    asleep_rem_minutes = EXCLUDED.asleep_rem_minutes,
+                    awake_minutes = EXCLUDED.awake_minutes,
+                    asleep_core_pct = EXCLUDED.asleep_core_pct,
+                    asleep_deep_pct = EXCLUDED.asleep_deep_pct,
+                    asleep_rem_pct = EXCLUDED.asleep_rem_pct,
+                    awake_pct = EXCLUDED.awake_pct,
+                    updated_at = now()
+                """
+            )
+            return result.fetchall()[0][0] if result else 0
+
+    def update_sleep_stage_events(
+        self,
+        dates: list[date] | None = None,
+        source_priority: Sequence[str] = settings.sleep_source_priority,
+    ):
+        """
+        Rebuild the hypnogram segments of nights from their sleep records.
+
+        Segments are the nights' merged timeline (in-bed time excluded), so
+        overlapping sources resolve as in nightly totals and stage rasters:
+        see intervals.merge_intervals. Back-to-back pieces of the same
+        stage are joined. Nights without a nightly summary are skipped.
+
+        Args:
+            dates: Nights to rebuild; all nights if omitted
+            source_priority: Source name fragments, highest priority first,
+                             as for intervals.merge_intervals
+        """
+        records = self.get_sleep_records_for_dates(dates)
+        timeline = merge_intervals(
+            records.filter(pl.col("sleep_stage").is_in(list(self.HYPNOGRAM_STAGES))),
+            source_priority,
+        )
+
+        date_filter = "WHERE date = ANY(?)" if dates is not None else ""
+        params = [dates] if dates is not None else []
+
+        with self.transaction():
+            self.conn.execute(
+                f"DELETE FROM sleep_stage_events {date_filter}", params
+            )
+            self.conn.execute(
+                """
+                INSERT INTO sleep_stage_events (
+                    date, sleep_stage, start_time, end_time,
+                    duration_minutes, sequence_order
+                )
+                WITH numbered AS (
+                    SELECT
+                        *,
+                        -- A segment starts wherever the stage changes or
+                        -- there is a gap
+                        SUM(
+                            CASE WHEN sleep_stage = previous_stage
+                                AND start_time = previous_end
+                            THEN 0 ELSE 1 END
+                        ) OVER (PARTITION BY date ORDER BY start_time)
+                            AS sequence_order
+                    FROM (
+                        SELECT
+                            date,
+                            sleep_stage,
+                            startDate AS start_time,
+                            endDate AS end_time,
+                            LAG(sleep_stage) OVER night AS previous_stage,
+                            LAG(endDate) OVER night AS previous_end
+                        FROM timeline
+                        WHERE date IN (SELECT date FROM sleep_nightly_summary)
+                        WINDOW night AS (PARTITION BY date ORDER BY startDate)
+                    )
+                )
                 SELECT
                     date,
-                    SUM(CASE WHEN sleep_stage = 'asleep_core'
-                        THEN duration_minutes ELSE 0 END) as core_min,
-                    SUM(CASE WHEN sleep_stage = 'asleep_deep'
-                        THEN duration_minutes ELSE 0 END) as deep_min,
-                    SUM(CASE WHEN sleep_stage = 'asleep_rem'
-                        THEN duration_minutes ELSE 0 END) as rem_min,
-                    SUM(CASE WHEN sleep_stage = 'awake'
-                        THEN duration_minutes ELSE 0 END) as awake_min
-                FROM sleep_records
-                GROUP BY date
-            ),
-            stage_totals_with_sum AS (
+                    ANY_VALUE(sleep_stage),
+                    MIN(start_time),
+                    MAX(end_time),
+                    CAST(
+                        FLOOR(EPOCH(MAX(end_time) - MIN(start_time)) / 60)
+                        AS INTEGER
+                    ),
+                    sequence_order
+                FROM numbered
+                GROUP BY date, sequence_order
+                ORDER BY date, sequence_order
+                """
+            )
+
+    def update_sleep_metrics(self, dates: list[date] | None = None) -> int:
+        """
+        Score nights against every benchmark in sleep_metrics.
+
+        Every night is measured on every metric of BENCHMARK_METRICS and
+        joined to sleep_benchmarks in one statement. deviation_from_optimal
+        is how far the value lies outside [optimal_min, optimal_max]
+        (negative below, positive above, 0 inside) and meets_benchmark
+        whether it lies inside; a missing bound is open. Nights without a
+        value for a metric, such as stage percentages before stages are
+        known, get no row for it.
+
+        Args:
+            dates: Nights to score; all nights if omitted
+
+        Returns:
+            Number of metric rows written
+        """
+        measures = ",\n".join(
+            f"CAST({expression} AS DOUBLE) AS {metric}"
+            for metric, expression in self.BENCHMARK_METRICS.items()
+        )
+        metrics = ", ".join(self.BENCHMARK_METRICS)
+        date_filter = "WHERE date = ANY($dates)" if dates is not None else ""
+        # Named parameters: DuckDB misplaces positional ones around UNPIVOT
+        params = {"dates": dates} if dates is not None else {}
+
+        with self.transaction():
+            self.conn.execute(
+                f"DELETE FROM sleep_metrics {date_filter}", params
+            )
+            result = self.conn.execute(
+                f"""
+                INSERT INTO sleep_metrics (
+                    date, metric_name, value, unit,
+                    deviation_from_optimal, meets_benchmark
+                )
+                WITH night_values AS (
+                    UNPIVOT (
+                        SELECT date, {measures}
+                        FROM sleep_nightly_summary
+                        {date_filter}
+                    )
+                    ON {metrics}
+                    INTO NAME metric_name VALUE value
+                )
                 SELECT
-                    *,
-                    (core_min + deep_min + rem_min) as total_asleep_min
-                FROM stage_totals
+                    v.date,
+                    v.metric_name,
+                    v.value,
+                    b.unit,
+                    CASE
+                        WHEN b.optimal_min IS NULL AND b.optimal_max IS NULL
+                            THEN NULL
+                        WHEN v.value < b.optimal_min
+                            THEN v.value - b.optimal_min
+                        WHEN v.value > b.optimal_max
+                            THEN v.value - b.optimal_max
+                        ELSE 0
+                    END,
+                    CASE
+                        WHEN b.optimal_min IS NULL AND b.optimal_max IS NULL
+                            THEN NULL
+                        ELSE v.value >= COALESCE(b.optimal_min, v.value)
+                            AND v.value <= COALESCE(b.optimal_max, v.value)
+                    END
+                FROM night_values AS v
+                JOIN sleep_benchmarks AS b USING (metric_name)
+                """,
+                params,
             )
-            UPDATE sleep_nightly_summary
+            inserted = result.fetchall()[0][0] if result else 0
+
+        return inserted
+
+    def update_sleep_trends(self, since: date | None = None) -> int:
+        """
+        Recompute the rolling trends of nights from ``since`` onwards.
+
+        Only the tail of sleep_trends is rewritten. Its moving averages
+        and spreads read the 89 nights before ``since`` for context, and
+        the running sleep debt continues from the last row kept, so the
+        cost follows the nights changed rather than the history.
+
+        Args:
+            since: Earliest night whose summary changed; all nights if
+                   omitted
+
+        Returns:
+            Number of trend rows written
+        """
+        if since is None:
+            since = self.conn.execute(
+                "SELECT MIN(date) FROM sleep_nightly_summary"
+            ).fetchone()[0]
+            if since is None:
+                self.conn.execute("DELETE FROM sleep_trends")
+                return 0
+
+        with self.transaction():
+            self.conn.execute("DELETE FROM sleep_trends WHERE date >= ?", [since])
+            carried = self.conn.execute(
+                """
+                SELECT sleep_debt_total_hours
+                FROM sleep_trends
+                ORDER BY date DESC
+                LIMIT 1
+                """
+            ).fetchone()
+            result = self.conn.execute(
+                """
+                INSERT INTO sleep_trends (
+                    date, nights_7d,
+                    sleep_hours_7d, sleep_hours_30d, sleep_hours_90d,
+                    efficiency_7d, efficiency_30d, efficiency_90d,
+                    bedtime_7d, bedtime_30d,
+                    bedtime_stddev_7d_minutes, bedtime_stddev_30d_minutes,
+                    wake_time_stddev_30d_minutes,
+                    sleep_debt_7d_hours, sleep_debt_total_hours
+                )
+                WITH nights AS (
+                    SELECT
+                        date,
+                        total_sleep_hours,
+                        sleep_efficiency_pct,
+                        -- Clock hours counted from noon, so bedtimes either
+                        -- side of midnight average and spread sensibly
+                        (
+                            hour(sleep_start_local)
+                            + minute(sleep_start_local) / 60.0
+                            + 12
+                        ) % 24 AS bedtime,
+                        hour(sleep_end_local) + minute(sleep_end_local) / 60.0
+                            AS wake_time,
+                        $need - total_sleep_hours AS debt
+                    FROM sleep_nightly_summary
+                    WHERE date > $since::DATE - 90
+                ),
+                trends AS (
+                    SELECT
+                        date,
+                        COUNT(*) OVER last_7 AS nights_7d,
+                        AVG(total_sleep_hours) OVER last_7,
+                        AVG(total_sleep_hours) OVER last_30,
+                        AVG(total_sleep_hours) OVER last_90,
+                        AVG(sleep_efficiency_pct) OVER last_7,
+                        AVG(sleep_efficiency_pct) OVER last_30,
+                        AVG(sleep_efficiency_pct) OVER last_90,
+                        (AVG(bedtime) OVER last_7 + 12) % 24,
+                        (AVG(bedtime) OVER last_30 + 12) % 24,
+                        STDDEV_SAMP(bedtime) OVER last_7 * 60,
+                        STDDEV_SAMP(bedtime) OVER last_30 * 60,
+                        STDDEV_SAMP(wake_time) OVER last_30 * 60,
+                        SUM(debt) OVER last_7,
+                        $carried + SUM(
+                            CASE WHEN date >= $since THEN debt ELSE 0 END
+                        ) OVER (ORDER BY date ROWS UNBOUNDED PRECEDING)
+                    FROM nights
+                    WINDOW
+                        last_7 AS (
+                            ORDER BY date
+                            RANGE BETWEEN INTERVAL 6 DAYS PRECEDING AND CURRENT ROW
+                        ),
+                        last_30 AS (
+                            ORDER BY date
+                            RANGE BETWEEN INTERVAL 29 DAYS PRECEDING AND CURRENT ROW
+                        ),
+                        last_90 AS (
+                            ORDER BY date
+                            RANGE BETWEEN INTERVAL 89 DAYS PRECEDING AND CURRENT ROW
+                        )
+                )
+                SELECT * FROM trends
+                WHERE date >= $since
+                ORDER BY date
+                """,
+                {
+                    "since": since,
+                    "need": self.SLEEP_NEED_HOURS,
+                    "carried": carried[0] if carried else 0.0,
+                },
+            )
+            inserted = result.fetchall()[0][0] if result else 0
+
+        return inserted
+
+    def replace_circadian_metrics(
+        self, first_day: date, last_day: date, nights: pl.DataFrame
+    ) -> int:
+        """
+        Replace the stored circadian metrics of a date range.
+
+        Args:
+            first_day: First night of the range, inclusive
+            last_day: Last night of the range, inclusive
+            nights: Rows from circadian.nightly_circadian within the range
+
+        Returns:
+            Number of nights stored
+        """
+        with self.transaction():
+            self.conn.execute(
+                "DELETE FROM sleep_circadian WHERE date BETWEEN ? AND ?",
+                [first_day, last_day],
+            )
+            result = self.conn.execute(
+                """
+                INSERT INTO sleep_circadian (
+                    date, asleep_minutes, sleep_midpoint_hour, sleep_regularity
+                )
+                SELECT date, asleep_minutes, sleep_midpoint_hour, sleep_regularity
+                FROM nights
+                """
+            )
+            inserted = result.fetchall()[0][0] if result else 0
+
+        return inserted
+
+    def replace_stage_rasters(self, dates: list[date], rasters: pl.DataFrame) -> int:
+        """
+        Replace the stored stage rasters of nights.
+
+        Args:
+            dates: Nights to replace; those missing from ``rasters`` are
+                   left without a raster
+            rasters: Rows from stage_raster.build_stage_rasters
+
+        Returns:
+            Number of nights stored
+        """
+        with self.transaction():
+            self.conn.execute(
+                "DELETE FROM sleep_stage_rasters WHERE date = ANY(?)", [dates]
+            )
+            result = self.conn.execute(
+                """
+                INSERT INTO sleep_stage_rasters (
+                    date, start_time, epoch_seconds, epochs, stages
+                )
+                SELECT date, start_time, epoch_seconds, epochs, stages
+                FROM rasters
+                """
+            )
+            inserted = result.fetchall()[0][0] if result else 0
+
+        return inserted
+
+    @contextmanager
+    def _maintaining_stats(self, dates: list[date] | None) -> Iterator[None]:
+        """
+        Keep sleep_stats in step with nightly summaries changed in the block.
+
+        The nights' old values are taken out of the all-time sums before the
+        block and their new values added after it, so the cost follows the
+        nights written rather than the history. Rolling windows are then
+        recomputed from the last year of nights. Everything runs in one
+        transaction with the block.
+
+        Args:
+            dates: Nights the block changes; all nights if None
+        """
+        with self.transaction():
+            self._adjust_all_time_stats(dates, -1)
+            yield
+            self._adjust_all_time_stats(dates, 1)
+            self._refresh_windowed_stats()
+
+    def _adjust_all_time_stats(self, dates: list[date] | None, sign: int):
+        """
+        Add (sign 1) or remove (sign -1) nights from the all-time stats.
+
+        Args:
+            dates: Nights whose current summary values are applied
+            sign: 1 to add the nights, -1 to remove them
+        """
+        metrics = ", ".join(self.STATS_METRICS)
+        date_filter = "WHERE date = ANY($dates)" if dates is not None else ""
+        # Named parameters: DuckDB misplaces positional ones around UNPIVOT
+        params = {"sign": sign}
+        if dates is not None:
+            params["dates"] = dates
+
+        self.conn.execute(
+            f"""
+            UPDATE sleep_stats
             SET
-                asleep_core_minutes = stage_totals_with_sum.core_min,
-                asleep_deep_minutes = stage_totals_with_sum.deep_min,
-                asleep_rem_minutes = stage_totals_with_sum.rem_min,
-                awake_minutes = stage_totals_with_sum.awake_min,
-                asleep_core_pct = CASE
-                    WHEN stage_totals_with_sum.total_asleep_min > 0
-                    THEN (stage_totals_with_sum.core_min::DOUBLE
-                        / stage_totals_with_sum.total_asleep_min * 100)
-                    ELSE 0
-                END,
-                asleep_deep_pct = CASE
-                    WHEN stage_totals_with_sum.total_asleep_min > 0
-                    THEN (stage_totals_with_sum.deep_min::DOUBLE
-                        / stage_totals_with_sum.total_asleep_min * 100)
-                    ELSE 0
-                END,
-                asleep_rem_pct = CASE
-                    WHEN stage_totals_with_sum.total_asleep_min > 0
-                    THEN (stage_totals_with_sum.rem_min::DOUBLE
-                        / stage_totals_with_sum.total_asleep_min * 100)
-                    ELSE 0
-                END,
-                awake_pct = CASE
-                    WHEN time_in_bed_minutes > 0
-                    THEN (stage_totals_with_sum.awake_min::DOUBLE
-                        / time_in_bed_minutes * 100)
-                    ELSE 0
-                END,
+                night_count = sleep_stats.night_count + $sign * nights.night_count,
+                total = sleep_stats.total + $sign * nights.total,
+                total_sq = sleep_stats.total_sq + $sign * nights.total_sq,
+                first_date = LEAST(sleep_stats.first_date, nights.first_date),
+                last_date = GREATEST(sleep_stats.last_date, nights.last_date),
                 updated_at = now()
-            FROM stage_totals_with_sum
-            WHERE sleep_nightly_summary.date = stage_totals_with_sum.date
+            FROM (
+                SELECT
+                    metric,
+                    COUNT(value) AS night_count,
+                    SUM(value) AS total,
+                    SUM(value * value) AS total_sq,
+                    MIN(date) AS first_date,
+                    MAX(date) AS last_date
+                FROM (
+                    UNPIVOT (
+                        SELECT date, {metrics}
+                        FROM sleep_nightly_summary
+                        {date_filter}
+                    )
+                    ON {metrics}
+                    INTO NAME metric VALUE value
+                )
+                GROUP BY metric
+            ) AS nights
+            WHERE sleep_stats.window_days = 0
+            AND sleep_stats.metric = nights.metric
+            """,
+            params,
+        )
+
+    def _refresh_windowed_stats(self):
+        """Recompute the rolling-window rows of sleep_stats."""
+        metrics = ", ".join(self.STATS_METRICS)
+        windows = list(self.STATS_WINDOWS)
+
+        self.conn.execute("DELETE FROM sleep_stats WHERE window_days > 0")
+        self.conn.execute(
+            f"""
+            INSERT INTO sleep_stats (
+                window_days, metric, night_count, total, total_sq,
+                first_date, last_date
+            )
+            WITH latest AS (
+                SELECT MAX(date) AS date FROM sleep_nightly_summary
+            ),
+            recent AS (
+                UNPIVOT (
+                    SELECT date, {metrics}
+                    FROM sleep_nightly_summary
+                    WHERE date > (SELECT date FROM latest) - $longest
+                )
+                ON {metrics}
+                INTO NAME metric VALUE value
+            )
+            SELECT
+                windows.days,
+                metrics.metric,
+                COUNT(recent.value),
+                COALESCE(SUM(recent.value), 0),
+                COALESCE(SUM(recent.value * recent.value), 0),
+                MIN(recent.date),
+                MAX(recent.date)
+            FROM unnest($windows::INTEGER[]) AS windows(days)
+            CROSS JOIN unnest($metrics::VARCHAR[]) AS metrics(metric)
+            CROSS JOIN latest
+            LEFT JOIN recent
+                ON recent.metric = metrics.metric
+                AND recent.date > latest.date - windows.days
+            GROUP BY windows.days, metrics.metric
+            """,
+            {
+                "longest": max(windows),
+                "windows": windows,
+                "metrics": list(self.STATS_METRICS),
+            },
+        )
+
+    def get_sleep_stats(self) -> list[dict]:
+        """
+        Get the maintained aggregates of the nightly summary metrics.
+
+        Returns:
+            One dict per window and metric with window_days (0 for
+            all-time), metric, night_count, total, total_sq, first_date and
+            last_date; the counts and sums cover non-null values only
+        """
+        columns = (
+            "window_days",
+            "metric",
+            "night_count",
+            "total",
+            "total_sq",
+            "first_date",
+            "last_date",
+        )
+        rows = self.conn.execute(
+            f"""
+            SELECT {", ".join(columns)}
+            FROM sleep_stats
+            ORDER BY window_days, metric
+            """
+        ).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_data_version(self) -> int:
+        """
+        Get the version of the stored sleep data.
+
+        The version only grows, and changes whenever an ingest changes sleep
+        records or nightly summaries, so anything derived from them can be
+        cached under it.
+
+        Returns:
+            Current data version
+        """
+        return self.conn.execute(
+            "SELECT version FROM data_version WHERE id = 1"
+        ).fetchone()[0]
+
+    @staticmethod
+    def data_version_file(db_path: str | Path) -> Path:
+        """Path of the file the data version of a database is published to."""
+        db_path = Path(db_path)
+        return db_path.with_name(db_path.name + ".version")
+
+    def publish_data_version(self) -> int:
+        """
+        Write the committed data version to the file beside the database.
+
+        Request handlers stat that file rather than query the version, so
+        a conditional GET needs no database thread, and a bump by another
+        process is seen on its next request. The file is replaced
+        atomically, so readers never see it half written.
+
+        Returns:
+            Published data version
+        """
+        version = self.get_data_version()
+        path = self.data_version_file(self.db_path)
+        staged = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        staged.write_text(str(version))
+        os.replace(staged, path)
+        return version
+
+    def bump_data_version(self) -> int:
+        """
+        Record that sleep data has changed.
+
+        Call after the changes are written, so that nothing computed from
+        the old data is cached under the new version. Inside a transaction
+        the new version is published when it commits, not before.
+
+        Returns:
+            New data version
+        """
+        # Not UPDATE ... RETURNING: on a reattached encrypted file DuckDB
+        # reports a write-write conflict when that row is updated again.
+        # Ingest holds its write lock, so nothing bumps in between.
+        self.conn.execute(
+            """
+            UPDATE data_version
+            SET version = version + 1, updated_at = now()
+            WHERE id = 1
             """
         )
+        self._on_commit(self.publish_data_version)
+        return self.get_data_version()
+
+    def get_night_range(self) -> tuple[date | None, date | None]:
+        """
+        Get the first and last nights with a summary.
+
+        Returns:
+            (first, last) night dates; both None without data
+        """
+        return self.conn.execute(
+            "SELECT MIN(date), MAX(date) FROM sleep_nightly_summary"
+        ).fetchone()
 
     def get_nightly_summary(
-        self, start_date: str | None = None, end_date: str | None = None
+        self, start_date: date | str | None = None, end_date: date | str | None = None
     ) -> pl.DataFrame:
         """
         Retrieve nightly summary data.
@@ -257,40 +985,293 @@ class SleepDatabase:
         Returns:
             Polars DataFrame with nightly summary
         """
-        query = "SELECT * FROM sleep_nightly_summary WHERE 1=1"
+        query = """
+            SELECT
+                s.*,
+                c.sleep_midpoint_hour,
+                c.sleep_regularity
+            FROM sleep_nightly_summary AS s
+            LEFT JOIN sleep_circadian AS c USING (date)
+            WHERE 1=1
+        """
+        params = []
 
         if start_date:
-            query += f" AND date >= '{start_date}'"
+            query += " AND date >= ?"
+            params.append(start_date)
         if end_date:
-            query += f" AND date <= '{end_date}'"
+            query += " AND date <= ?"
+            params.append(end_date)
 
         query += " ORDER BY date DESC"
 
-        return self.conn.execute(query).pl()
+        return self.conn.execute(query, params).pl()
+
+    def get_sleep_metrics(
+        self,
+        start_date: date | str | None = None,
+        end_date: date | str | None = None,
+        metric_name: str | None = None,
+    ) -> pl.DataFrame:
+        """
+        Retrieve nights' benchmark scores.
+
+        Args:
+            start_date: Optional start date filter (ISO format)
+            end_date: Optional end date filter (ISO format)
+            metric_name: Optional benchmark to restrict to
+
+        Returns:
+            Polars DataFrame with date, metric_name, value, unit,
+            deviation_from_optimal and meets_benchmark, ordered by date
+            and metric
+        """
+        query = """
+            SELECT
+                date, metric_name, value, unit,
+                deviation_from_optimal, meets_benchmark
+            FROM sleep_metrics
+            WHERE 1=1
+        """
+        params = []
+
+        if start_date:
+            query += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND date <= ?"
+            params.append(end_date)
+        if metric_name:
+            query += " AND metric_name = ?"
+            params.append(metric_name)
+
+        query += " ORDER BY date, metric_name"
+
+        return self.conn.execute(query, params).pl()
+
+    def get_benchmark_attainment(
+        self, start_date: date | str | None = None, end_date: date | str | None = None
+    ) -> pl.DataFrame:
+        """
+        Summarize benchmark scores per benchmark over a date range.
+
+        Args:
+            start_date: Optional start date filter (ISO format)
+            end_date: Optional end date filter (ISO format)
+
+        Returns:
+            Polars DataFrame with one row per benchmark: metric_name,
+            optimal_min, optimal_max, unit, description, nights scored,
+            nights_met and mean_value (null for benchmarks never scored)
+        """
+        night_filter = ""
+        params = []
+        if start_date:
+            night_filter += " AND m.date >= ?"
+            params.append(start_date)
+        if end_date:
+            night_filter += " AND m.date <= ?"
+            params.append(end_date)
+
+        return self.conn.execute(
+            f"""
+            SELECT
+                b.metric_name,
+                b.optimal_min,
+                b.optimal_max,
+                b.unit,
+                b.description,
+                COUNT(m.value) AS nights,
+                COUNT(*) FILTER (WHERE m.meets_benchmark) AS nights_met,
+                AVG(m.value) AS mean_value
+            FROM sleep_benchmarks AS b
+            LEFT JOIN sleep_metrics AS m
+                ON m.metric_name = b.metric_name {night_filter}
+            GROUP BY ALL
+            ORDER BY b.metric_name
+            """,
+            params,
+        ).pl()
+
+    def get_sleep_trends(
+        self, start_date: date | str | None = None, end_date: date | str | None = None
+    ) -> pl.DataFrame:
+        """
+        Retrieve rolling sleep trends.
+
+        Args:
+            start_date: Optional start date filter (ISO format)
+            end_date: Optional end date filter (ISO format)
+
+        Returns:
+            Polars DataFrame with one row per night, ordered by date
+        """
+        query = "SELECT * EXCLUDE (updated_at) FROM sleep_trends WHERE 1=1"
+        params = []
+
+        if start_date:
+            query += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND date <= ?"
+            params.append(end_date)
+
+        query += " ORDER BY date"
+
+        return self.conn.execute(query, params).pl()
+
+    def get_sleep_intervals(self, start: datetime, end: datetime) -> pl.DataFrame:
+        """
+        Retrieve the hypnogram segments overlapping a local time range.
+
+        Segments are sleep records with overlapping sources already
+        resolved, as stored by update_sleep_stage_events(), in local time:
+        shifted by the UTC offset their night started at.
+
+        Args:
+            start: Start of the range, naive local time
+            end: End of the range, exclusive
+
+        Returns:
+            Polars DataFrame with start_date and end_date (naive local
+            times) and asleep, True for the asleep stages and False for
+            awake
+        """
+        return self.conn.execute(
+            """
+            SELECT *
+            FROM (
+                SELECT
+                    timezone('UTC', e.start_time) + local.shift AS start_date,
+                    timezone('UTC', e.end_time) + local.shift AS end_date,
+                    e.sleep_stage LIKE 'asleep%' AS asleep
+                FROM sleep_stage_events AS e
+                JOIN (
+                    SELECT
+                        date,
+                        COALESCE(
+                            sleep_start_local - timezone('UTC', sleep_start),
+                            INTERVAL 0 MINUTE
+                        ) AS shift
+                    FROM sleep_nightly_summary
+                ) AS local USING (date)
+                -- Nights are dated by their first record's UTC start, no
+                -- record spans a whole day and offsets stay within 14
+                -- hours; the date bound lets zone maps skip the rest of
+                -- the table
+                WHERE e.date BETWEEN $start::DATE - 2 AND $end::DATE
+            )
+            WHERE start_date < $end AND end_date > $start
+            """,
+            {"start": start, "end": end},
+        ).pl()
+
+    def get_stage_rasters(
+        self, start_date: date | str | None = None, end_date: date | str | None = None
+    ) -> pl.DataFrame:
+        """
+        Retrieve the encoded stage rasters of a range of nights.
+
+        Args:
+            start_date: Optional first night (ISO format)
+            end_date: Optional last night (ISO format)
+
+        Returns:
+            Polars DataFrame with date, start_time, epoch_seconds, epochs
+            and stages (decode with stage_raster.decode_stages), by date
+        """
+        return self.conn.execute(
+            """
+            SELECT date, start_time, epoch_seconds, epochs, stages
+            FROM sleep_stage_rasters
+            WHERE ($start IS NULL OR date >= $start::DATE)
+            AND ($end IS NULL OR date <= $end::DATE)
+            ORDER BY date
+            """,
+            {"start": start_date, "end": end_date},
+        ).pl()
+
+    def get_sleep_stage_events(self, night: date) -> pl.DataFrame:
+        """
+        Retrieve the hypnogram segments of one night.
+
+        Args:
+            night: Night date
+
+        Returns:
+            Polars DataFrame with sequence_order, sleep_stage, start_time,
+            end_time and duration_minutes, in sequence order
+        """
+        return self.conn.execute(
+            """
+            SELECT
+                sequence_order, sleep_stage, start_time, end_time,
+                duration_minutes
+            FROM sleep_stage_events
+            WHERE date = ?
+            ORDER BY sequence_order
+            """,
+            [night],
+        ).pl()
 
     def get_sleep_records(
-        self, start_date: str | None = None, end_date: str | None = None
+        self,
+        start_date: date | str | None = None,
+        end_date: date | str | None = None,
+        after: tuple[datetime, int] | None = None,
+        limit: int | None = None,
+        fields: list[str] | None = None,
     ) -> pl.DataFrame:
         """
-        Retrieve sleep records.
+        Retrieve sleep records ordered by (start_date, id).
+
+        Pages are read with keyset pagination: pass the (start_date, id) of
+        the last record of one page as ``after`` to get the next, so every
+        page costs the same however much history precedes it.
 
         Args:
             start_date: Optional start date filter (ISO format)
             end_date: Optional end date filter (ISO format)
+            after: Only return records sorting after this (start_date, id)
+            limit: Maximum number of records to return
+            fields: Columns to return, from SLEEP_RECORD_FIELDS; all if None
 
         Returns:
             Polars DataFrame with sleep records
+
+        Raises:
+            ValueError: If ``fields`` is empty or names an unknown column
         """
-        query = "SELECT * FROM sleep_records WHERE 1=1"
+        if fields is None:
+            columns = "*"
+        else:
+            if not fields:
+                raise ValueError("No sleep record fields requested")
+            unknown = sorted(set(fields) - set(self.SLEEP_RECORD_FIELDS))
+            if unknown:
+                raise ValueError(f"Unknown sleep record fields: {', '.join(unknown)}")
+            columns = ", ".join(dict.fromkeys(fields))
+
+        query = f"SELECT {columns} FROM sleep_records WHERE 1=1"
+        params: list = []
 
         if start_date:
-            query += f" AND date >= '{start_date}'"
+            query += " AND date >= ?"
+            params.append(start_date)
         if end_date:
-            query += f" AND date <= '{end_date}'"
+            query += " AND date <= ?"
+            params.append(end_date)
+        if after is not None:
+            query += " AND (start_date > ? OR (start_date = ? AND id > ?))"
+            params.extend([after[0], after[0], after[1]])
 
-        query += " ORDER BY start_date"
+        query += " ORDER BY start_date, id"
 
-        return self.conn.execute(query).pl()
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        return self.conn.execute(query, params).pl()
 
     def insert_benchmarks(self, benchmarks: list[dict]) -> int:
         """
@@ -367,57 +1348,65 @@ class SleepDatabase:
         Returns:
             User dictionary or None if not found
         """
-        # Check if profile_picture columns exist
-        try:
-            result = self.conn.execute(
-                """
-                SELECT username, hashed_password, first_name, last_name,
-                       profile_picture, profile_picture_mime_type
-                FROM users
-                WHERE username = ?
-                """,
-                [username],
-            ).fetchone()
+        result = self.conn.execute(
+            """
+            SELECT username, hashed_password, first_name, last_name,
+                   profile_picture_sha256
+            FROM users
+            WHERE username = ?
+            """,
+            [username],
+        ).fetchone()
 
-            if result:
-                return {
-                    "username": result[0],
-                    "hashed_password": result[1],
-                    "first_name": result[2],
-                    "last_name": result[3],
-                    "profile_picture": result[4],
-                    "profile_picture_mime_type": result[5],
-                }
-        except Exception:
-            # Fall back to query without profile_picture columns
-            result = self.conn.execute(
-                """
-                SELECT username, hashed_password, first_name, last_name
-                FROM users
-                WHERE username = ?
-                """,
-                [username],
-            ).fetchone()
+        if not result:
+            return None
+
+        return {
+            "username": result[0],
+            "hashed_password": result[1],
+            "first_name": result[2],
+            "last_name": result[3],
+            "profile_picture_sha256": result[4],
+        }
+
+    def get_principal(self, username: str) -> dict | None:
+        """
+        Retrieve the identity fields of a user, without credentials.
+
+        Reads only small columns, so it is cheap enough to run for every
+        authenticated request.
+
+        Args:
+            username: User's email/username
+
+        Returns:
+            Dictionary with username, first_name, last_name and
+            profile_picture_sha256, or None if not found
+        """
+        result = self.conn.execute(
+            """
+            SELECT username, first_name, last_name, profile_picture_sha256
+            FROM users
+            WHERE username = ?
+            """,
+            [username],
+        ).fetchone()
 
-            if result:
-                return {
-                    "username": result[0],
-                    "hashed_password": result[1],
-                    "first_name": result[2],
-                    "last_name": result[3],
-                    "profile_picture": None,
-                    "profile_picture_mime_type": None,
-                }
+        if not result:
+            return None
 
-        return None
+        return {
+            "username": result[0],
+            "first_name": result[1],
+            "last_name": result[2],
+            "profile_picture_sha256": result[3],
+        }
 
     def update_user_profile(
         self,
         username: str,
         first_name: str | None = None,
         last_name: str | None = None,
-        profile_picture: bytes | None = None,
-        profile_picture_mime_type: str | None = None,
     ) -> dict | None:
         """
         Update user profile information.
@@ -426,8 +1415,6 @@ class SleepDatabase:
             username: User's email/username
             first_name: Optional first name
             last_name: Optional last name
-            profile_picture: Optional profile picture bytes
-            profile_picture_mime_type: Optional MIME type for profile picture
 
         Returns:
             Updated user dictionary or None if user not found
@@ -448,12 +1435,6 @@ class SleepDatabase:
             updates.append("last_name = ?")
             params.append(last_name)
 
-        if profile_picture is not None:
-            updates.append("profile_picture = ?")
-            params.append(profile_picture)
-            updates.append("profile_picture_mime_type = ?")
-            params.append(profile_picture_mime_type)
-
         updates.append("updated_at = now()")
         params.append(username)
 
@@ -463,6 +1444,136 @@ class SleepDatabase:
 
         return self.get_user(username)
 
+    def set_profile_picture(
+        self,
+        username: str,
+        sha256: str,
+        data: bytes,
+        mime_type: str,
+        thumbnail: bytes | None = None,
+        thumbnail_mime_type: str | None = None,
+    ) -> bool:
+        """
+        Store a profile picture by content hash and point a user at it.
+
+        Identical images are stored once. The user's previous picture is
+        deleted if no other user references it.
+
+        Args:
+            username: User's email/username
+            sha256: Hex SHA-256 of ``data``
+            data: Image bytes
+            mime_type: MIME type of ``data``
+            thumbnail: Optional downscaled copy of the image
+            thumbnail_mime_type: MIME type of ``thumbnail``
+
+        Returns:
+            True if the user exists, False otherwise
+        """
+        user = self.get_user(username)
+        if not user:
+            return False
+
+        with self.transaction():
+            self.conn.execute(
+                """
+                INSERT INTO profile_pictures (
+                    sha256, mime_type, data, thumbnail, thumbnail_mime_type
+                )
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (sha256) DO NOTHING
+                """,
+                [sha256, mime_type, data, thumbnail, thumbnail_mime_type],
+            )
+            self.conn.execute(
+                """
+                UPDATE users
+                SET profile_picture_sha256 = ?, updated_at = now()
+                WHERE username = ?
+                """,
+                [sha256, username],
+            )
+            self._delete_unreferenced_profile_picture(
+                user["profile_picture_sha256"]
+            )
+
+        return True
+
+    def clear_profile_picture(self, username: str) -> bool:
+        """
+        Remove a user's profile picture.
+
+        Args:
+            username: User's email/username
+
+        Returns:
+            True if the user exists, False otherwise
+        """
+        user = self.get_user(username)
+        if not user:
+            return False
+
+        with self.transaction():
+            self.conn.execute(
+                """
+                UPDATE users
+                SET profile_picture_sha256 = NULL, updated_at = now()
+                WHERE username = ?
+                """,
+                [username],
+            )
+            self._delete_unreferenced_profile_picture(
+                user["profile_picture_sha256"]
+            )
+
+        return True
+
+    def get_profile_picture(
+        self, sha256: str, thumbnail: bool = False
+    ) -> tuple[bytes, str] | None:
+        """
+        Retrieve a stored profile picture by content hash.
+
+        Args:
+            sha256: Hex SHA-256 of the image
+            thumbnail: Return the thumbnail, falling back to the full image
+                       when none was generated
+
+        Returns:
+            Tuple of (image bytes, MIME type) or None if not found
+        """
+        if thumbnail:
+            query = """
+                SELECT COALESCE(thumbnail, data),
+                       COALESCE(thumbnail_mime_type, mime_type)
+                FROM profile_pictures
+                WHERE sha256 = ?
+            """
+        else:
+            query = "SELECT data, mime_type FROM profile_pictures WHERE sha256 = ?"
+
+        result = self.conn.execute(query, [sha256]).fetchone()
+        if not result:
+            return None
+
+        return bytes(result[0]), result[1]
+
+    def _delete_unreferenced_profile_picture(self, sha256: str | None):
+        """Delete a stored picture once no user points at it."""
+        if sha256 is None:
+            return
+
+        self.conn.execute(
+            """
+            DELETE FROM profile_pictures
+            WHERE sha256 = ?
+            AND NOT EXISTS (
+                SELECT 1 FROM users WHERE profile_picture_sha256 = ?
+            )
+            """,
+            [sha256, sha256],
+        )
+
     def get_onboarding_status(self, username: str) -> dict | None:
         """
         Get onboarding status for a user.
@@ -568,6 +1679,94 @@ class SleepDatabase:
         except Exception:
             return False
 
+    def create_ingest_job(
+        self, job_id: str, username: str, filename: str, bytes_total: int
+    ) -> dict:
+        """
+        Record a newly queued ingest job.
+
+        Args:
+            job_id: Unique job identifier
+            username: User who uploaded the export
+            filename: Original upload file name
+            bytes_total: Size of the export document to parse
+
+        Returns:
+            Job dictionary
+        """
+        self.conn.execute(
+            """
+            INSERT INTO ingest_jobs (id, username, filename, status, bytes_total)
+            VALUES (?, ?, ?, 'queued', ?)
+            """,
+            [job_id, username, filename, bytes_total],
+        )
+        return self.get_ingest_job(job_id)
+
+    def update_ingest_job(self, job_id: str, **fields) -> None:
+        """
+        Update status, progress or outcome columns of an ingest job.
+
+        Args:
+            job_id: Job identifier
+            **fields: Column values to set (e.g. status, bytes_parsed, error)
+        """
+        if not fields:
+            return
+
+        updates = [f"{column} = ?" for column in fields]
+        params = [*fields.values(), job_id]
+
+        query = f"UPDATE ingest_jobs SET {', '.join(updates)} WHERE id = ?"
+
+        self.conn.execute(query, params)
+
+    def get_ingest_job(self, job_id: str) -> dict | None:
+        """
+        Retrieve an ingest job.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            Job dictionary or None if not found
+        """
+        cursor = self.conn.execute(
+            """
+            SELECT id, username, filename, status,
+                   bytes_total, bytes_parsed, records_seen, rows_written,
+                   result, error, created_at, started_at, finished_at
+            FROM ingest_jobs
+            WHERE id = ?
+            """,
+            [job_id],
+        )
+        result = cursor.fetchone()
+
+        if not result:
+            return None
+
+        columns = [column[0] for column in cursor.description]
+        return dict(zip(columns, result))
+
+    def fail_interrupted_ingest_jobs(self) -> int:
+        """
+        Mark jobs left queued or running by a previous process as failed.
+
+        Returns:
+            Number of jobs updated
+        """
+        result = self.conn.execute(
+            """
+            UPDATE ingest_jobs
+            SET status = 'failed',
+                error = 'Interrupted by server restart',
+                finished_at = now()
+            WHERE status IN ('queued', 'running')
+            """
+        )
+        return result.fetchall()[0][0] if result else 0
+
     def has_sleep_data(self) -> bool:
         """
         Check if database has any sleep records.
@@ -579,8 +1778,11 @@ class SleepDatabase:
         return result[0] > 0 if result else False
 
     def close(self):
-        """Close database connection."""
-        self.conn.close()
+        """Return the connection to the pool."""
+        if self.conn is not None:
+            self.conn = None
+            if self._pooled:
+                db_pool.release(self.db_path)
 
     def __enter__(self):
         """Context manager entry."""
@@ -589,3 +1791,7 @@ class SleepDatabase:
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit."""
         self.close()
+
+
+# Global connection pool; the app opens it at startup
+db_pool = ConnectionPool(SleepDatabase.connect)
@@ -0,0 +1 @@
+"""Export ingestion pipeline and background job queue."""
@@ -0,0 +1,231 @@
+"""
+Background ingest job queue with progress reporting.
+"""
+
+import json
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from backend.config.settings import settings
+from backend.database.sleep_db import SleepDatabase
+from backend.ingest.pipeline import IngestCancelled, IngestProgress, run_ingest
+from backend.parsers.healthkit_xml import HealthKitXMLParser
+
+
+@dataclass
+class _ActiveJob:
+    """In-memory state of a job that is queued or running."""
+
+    id: str
+    username: str
+    filename: str
+    export_path: Path
+    created_at: datetime
+    incremental: bool = True
+    status: str = "queued"
+    progress: IngestProgress = field(default_factory=IngestProgress)
+    started_at: datetime | None = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    future: Future | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "username": self.username,
+            "filename": self.filename,
+            "status": self.status,
+            **asdict(self.progress),
+            "result": None,
+            "error": None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": None,
+        }
+
+
+class IngestJobQueue:
+    """
+    Run ingest jobs on a bounded thread pool.
+
+    Live progress of queued and running jobs is served from memory, so
+    polling never waits on the database. The ingest_jobs table is written
+    only when a job changes status: progress reports arrive while
+    ``run_ingest`` holds its transaction open on the worker's cursor, so
+    writes made then would stay invisible until commit and be rolled back
+    with a failed ingest.
+    """
+
+    def __init__(self, max_workers: int):
+        """
+        Initialize the queue.
+
+        Args:
+            max_workers: Number of jobs processed concurrently
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest"
+        )
+        self._active: dict[str, _ActiveJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        username: str,
+        filename: str,
+        export_path: Path,
+        incremental: bool = True,
+    ) -> dict:
+        """
+        Queue an uploaded export for ingestion.
+
+        The queue takes ownership of ``export_path`` and deletes it once
+        the job finishes.
+
+        Args:
+            username: User who uploaded the export
+            filename: Original upload file name
+            export_path: Staged export.xml or export.zip
+            incremental: Only write records newer than earlier ingests
+
+        Returns:
+            Job dictionary
+        """
+        job = _ActiveJob(
+            id=uuid.uuid4().hex,
+            username=username,
+            filename=filename,
+            export_path=export_path,
+            created_at=datetime.now(timezone.utc),
+            incremental=incremental,
+        )
+
+        try:
+            job.progress.bytes_total = HealthKitXMLParser(export_path).size
+        except Exception:
+            # Unreadable exports fail in the worker with a proper error
+            pass
+
+        with SleepDatabase() as db:
+            db.create_ingest_job(
+                job.id, username, filename, job.progress.bytes_total
+            )
+
+        with self._lock:
+            self._active[job.id] = job
+            job.future = self._executor.submit(self._run, job)
+
+        return job.to_dict()
+
+    def get(self, job_id: str, username: str) -> dict | None:
+        """
+        Get a job's status and progress.
+
+        Args:
+            job_id: Job identifier
+            username: User asking; jobs of other users are not visible
+
+        Returns:
+            Job dictionary or None if not found
+        """
+        with self._lock:
+            job = self._active.get(job_id)
+            if job is not None:
+                return job.to_dict() if job.username == username else None
+
+        with SleepDatabase() as db:
+            row = db.get_ingest_job(job_id)
+
+        if row is None or row["username"] != username:
+            return None
+        if isinstance(row["result"], str):
+            row["result"] = json.loads(row["result"])
+        return row
+
+    def cancel(self, job_id: str, username: str) -> dict | None:
+        """
+        Cancel a queued or running job.
+
+        Running jobs stop at their next progress report while parsing;
+        a job already writing to the database runs to completion.
+
+        Args:
+            job_id: Job identifier
+            username: User asking; jobs of other users are not visible
+
+        Returns:
+            Job dictionary or None if not found
+        """
+        with self._lock:
+            job = self._active.get(job_id)
+        if job is not None and job.username == username:
+            job.cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                # Never started, so _run will not clean up after it
+                self._finish(job, "cancelled")
+
+        return self.get(job_id, username)
+
+    def fail_interrupted(self) -> int:
+        """
+        Mark jobs orphaned by a previous process as failed.
+
+        Returns:
+            Number of jobs updated
+        """
+        with SleepDatabase() as db:
+            return db.fail_interrupted_ingest_jobs()
+
+    def shutdown(self):
+        """Cancel outstanding jobs and wait for running ones to stop."""
+        with self._lock:
+            jobs = list(self._active.values())
+        for job in jobs:
+            self.cancel(job.id, job.username)
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job: _ActiveJob):
+        """Worker thread body: ingest the export and record the outcome."""
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        self._persist(job, status=job.status, started_at=job.started_at)
+
+        try:
+            result = run_ingest(
+                job.export_path,
+                on_progress=lambda progress: self._on_progress(job, progress),
+                cancel_event=job.cancel_event,
+                incremental=job.incremental,
+            )
+        except IngestCancelled:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            self._finish(job, "failed", error=str(e))
+        else:
+            self._finish(job, "completed", result=json.dumps(result))
+
+    def _on_progress(self, job: _ActiveJob, progress: IngestProgress):
+        """Publish progress to pollers of the job."""
+        job.progress = progress
+
+    def _persist(self, job: _ActiveJob, **fields):
+        """Write a job's progress counters and any other fields."""
+        with SleepDatabase() as db:
+            db.update_ingest_job(job.id, **asdict(job.progress), **fields)
+
+    def _finish(self, job: _ActiveJob, status: str, **fields):
+        """Record a final status, delete the staged export and forget the job."""
+        job.export_path.unlink(missing_ok=True)
+        self._persist(
+            job, status=status, finished_at=datetime.now(timezone.utc), **fields
+        )
+        # From here on get() reads the final row, result included
+        with self._lock:
+            self._active.pop(job.id, None)
+
+
+# Global queue instance
+ingest_queue = IngestJobQueue(settings.ingest_workers)
@@ -0,0 +1,213 @@
+"""
+Ingest pipeline: parse an export, store its sleep data and aggregate it.
+"""
+
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+import polars as pl
+
+from backend.analysis.circadian import update_circadian_metrics
+from backend.analysis.stage_raster import build_stage_rasters
+from backend.config.settings import settings
+from backend.database.sleep_db import SleepDatabase
+from backend.parsers.sleep_extractor import SleepExtractor
+
+# Serializes the database phase of concurrent ingests, which upsert the
+# same nightly summary rows
+_write_lock = threading.Lock()
+
+
+class IngestCancelled(Exception):
+    """Raised when an ingest is cancelled before it writes anything."""
+
+
+@dataclass
+class IngestProgress:
+    """Counters reported while an export is ingested."""
+
+    bytes_total: int = 0
+    bytes_parsed: int = 0
+    records_seen: int = 0
+    rows_written: int = 0
+
+
+def _past_watermarks(df: pl.DataFrame, watermarks: pl.DataFrame) -> pl.DataFrame:
+    """
+    Keep records newer than the stored watermark of their type and source.
+
+    Args:
+        df: DataFrame with sleep records from SleepExtractor
+        watermarks: DataFrame from SleepDatabase.get_ingest_watermarks()
+
+    Returns:
+        Records created or ending after their source's watermark, plus all
+        records of sources seen for the first time
+    """
+    if watermarks.is_empty():
+        return df
+
+    watermarks = watermarks.with_columns(
+        pl.col("max_creation_date").cast(df.schema["creationDate"]),
+        pl.col("max_end_date").cast(df.schema["endDate"]),
+    )
+
+    return (
+        df.join(watermarks, on=["type", "sourceName"], how="left")
+        .filter(
+            pl.col("max_creation_date").is_null()
+            | (pl.col("creationDate") > pl.col("max_creation_date"))
+            | (pl.col("endDate") > pl.col("max_end_date"))
+        )
+        .drop("max_creation_date", "max_end_date")
+    )
+
+
+def aggregate_nights(db: SleepDatabase, dates: list[date]) -> int:
+    """
+    Recompute everything derived from the sleep records of nights.
+
+    Summaries with their stage breakdowns, stage rasters, hypnograms,
+    benchmark scores, trends and circadian metrics are rebuilt from every
+    record stored for the nights, in one transaction.
+
+    Args:
+        db: Active SleepDatabase connection
+        dates: Nights to recompute, in ascending order
+
+    Returns:
+        Number of nights with sleep, whose summaries were written
+    """
+    if not dates:
+        return 0
+
+    with db.transaction():
+        night_records = db.get_sleep_records_for_dates(dates)
+        nightly_df = SleepExtractor.get_nightly_totals(
+            night_records, settings.sleep_source_priority
+        )
+        db.replace_stage_rasters(
+            dates, build_stage_rasters(night_records, settings.sleep_source_priority)
+        )
+        if nightly_df.is_empty():
+            return 0
+
+        summaries = db.insert_nightly_summary(nightly_df)
+        db.update_sleep_stage_events(dates, settings.sleep_source_priority)
+        db.update_sleep_metrics(dates)
+        db.update_sleep_trends(dates[0])
+        update_circadian_metrics(db, dates)
+
+    return summaries
+
+
+def run_ingest(
+    export_path: str | Path,
+    on_progress: Callable[[IngestProgress], None] | None = None,
+    cancel_event: threading.Event | None = None,
+    incremental: bool = True,
+) -> dict:
+    """
+    Ingest a HealthKit export.xml or export.zip file.
+
+    Apple exports are cumulative, so in incremental mode only records past
+    the per-source watermarks of earlier ingests are considered. A full
+    ingest considers every record in the export. Either way records already
+    stored are skipped, and only the nights that received new records have
+    their summaries recomputed. The database phase is one transaction, so a
+    failed ingest stores nothing.
+
+    Blocking; call it from a worker thread, never from the event loop.
+
+    Args:
+        export_path: Path to the export to ingest
+        on_progress: Optional callback invoked as parsing and writing advance
+        cancel_event: Optional event that aborts the ingest while it is
+                      still parsing. Once the database phase has started the
+                      ingest runs to completion.
+        incremental: Skip records at or below the stored watermarks
+
+    Returns:
+        Summary of ingested data including record counts
+
+    Raises:
+        ValueError: If the export contains no sleep data
+        IngestCancelled: If ``cancel_event`` was set before any writes
+    """
+    extractor = SleepExtractor(export_path, workers=settings.parse_workers)
+    progress = IngestProgress(bytes_total=extractor.parser.size)
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise IngestCancelled()
+
+    def on_parse_progress(bytes_parsed: int, records_seen: int):
+        check_cancelled()
+        progress.bytes_parsed = bytes_parsed
+        progress.records_seen = records_seen
+        if on_progress:
+            on_progress(progress)
+
+    sleep_df = extractor.extract_sleep_data(progress=on_parse_progress)
+
+    if sleep_df.is_empty():
+        raise ValueError("No sleep data found in the uploaded file")
+
+    with _write_lock, SleepDatabase() as db:
+        check_cancelled()
+
+        records_inserted = 0
+        summaries_inserted = 0
+        nights = 0
+        touched_dates = []
+
+        # One transaction for the whole database phase: if any step fails
+        # the new records are rolled back with it, so uploading the export
+        # again re-aggregates their nights instead of skipping them as
+        # already stored
+        with db.transaction():
+            new_df = sleep_df
+            if incremental:
+                new_df = _past_watermarks(sleep_df, db.get_ingest_watermarks())
+
+            if not new_df.is_empty():
+                inserted_dates = db.insert_sleep_records(new_df)
+                records_inserted = len(inserted_dates)
+                progress.rows_written += records_inserted
+                if on_progress:
+                    on_progress(progress)
+
+                # Only nights that received new records are re-aggregated,
+                # from everything stored for them (earlier uploads and other
+                # sources included), so the cost follows the new data, not
+                # the history
+                touched_dates = inserted_dates.unique().sort().to_list()
+                summaries_inserted = aggregate_nights(db, touched_dates)
+                nights = summaries_inserted
+                progress.rows_written += summaries_inserted
+                if on_progress:
+                    on_progress(progress)
+
+            if records_inserted:
+                # Invalidates responses cached from the previous data
+                db.bump_data_version()
+
+            db.update_ingest_watermarks(sleep_df)
+
+    return {
+        "message": (
+            "Data ingested successfully" if records_inserted
+            else "No new sleep data since the last import"
+        ),
+        "records": records_inserted,
+        "summaries": summaries_inserted,
+        "nights": nights,
+        "updated_dates": [str(d) for d in touched_dates],
+        "date_range": {
+            "start": str(sleep_df["date"].min()),
+            "end": str(sleep_df["date"].max())
+        }
+    }
@@ -1,85 +1,632 @@
 """
-HealthKit XML parser using xml.etree.ElementTree and Polars.
+HealthKit XML parser using a streaming expat engine and Polars.
 """
 
-import xml.etree.ElementTree as ET
+import mmap
+import multiprocessing
+import re
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO
+from xml.parsers import expat
 
 import polars as pl
 
+# Called with (bytes parsed, matching records seen) as parsing advances
+ProgressCallback = Callable[[int, int], None]
+
+# Attributes copied from each Record element, in output column order
+RECORD_FIELDS = (
+    "type",
+    "sourceName",
+    "sourceVersion",
+    "device",
+    "unit",
+    "creationDate",
+    "startDate",
+    "endDate",
+    "value",
+)
+
+RECORD_SCHEMA = {field: pl.String for field in RECORD_FIELDS}
+
+DATE_FIELDS = ("creationDate", "startDate", "endDate")
+
+# Bytes fed to expat per call and rows accumulated per yielded batch
+READ_CHUNK_SIZE = 1024 * 1024
+DEFAULT_BATCH_SIZE = 100_000
+
+# Bytes scanned per step when looking for the ExportDate and Me elements
+HEADER_CHUNK_SIZE = 16 * 1024
+
+# Shards smaller than this are not worth a worker process
+MIN_SHARD_SIZE = 16 * 1024 * 1024
+
+# Bytes searched ahead when aligning a shard boundary on a Record tag
+SHARD_ALIGN_WINDOW = 64 * 1024
+
+# Name of the export document inside Apple's export.zip
+EXPORT_MEMBER_NAME = "export.xml"
+
+# A complete Record start tag; quoted attribute values may contain '>'
+_RECORD_TAG = re.compile(rb"""<Record\s(?:[^>"']|"[^"]*"|'[^']*')*>""")
+
+
+class _RecordCollector:
+    """
+    expat start-element handler that appends Record attributes to columns.
+
+    Non-matching records are rejected on their ``type`` attribute before
+    any column is touched.
+    """
+
+    def __init__(self, record_type: str | None = None):
+        self.record_type = record_type
+        self.columns: dict[str, list] = {field: [] for field in RECORD_FIELDS}
+        self.rows = 0
+        self.seen = 0
+
+    def start_element(self, name: str, attrs: dict[str, str]):
+        if name != "Record":
+            return
+        if self.record_type is not None and attrs.get("type") != self.record_type:
+            return
+
+        get = attrs.get
+        for field, column in self.columns.items():
+            column.append(get(field))
+        self.rows += 1
+        self.seen += 1
+
+    def feed_tags(self, tags: list[bytes]):
+        """Parse isolated Record start tags found by the byte-level scan."""
+        if not tags:
+            return
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = self.start_element
+        parser.Parse(b"<_>", False)
+        for tag in tags:
+            parser.Parse(tag if tag.endswith(b"/>") else tag[:-1] + b"/>", False)
+        parser.Parse(b"</_>", True)
+
+    def flush(self) -> pl.DataFrame:
+        """Return the buffered rows as a string-typed batch and reset."""
+        batch = pl.DataFrame(self.columns, schema=RECORD_SCHEMA)
+        self.columns = {field: [] for field in RECORD_FIELDS}
+        self.rows = 0
+        return batch
+
+
+class _HeaderFound(Exception):
+    """Raised from expat handlers to stop once the header is read."""
+
+
+@contextmanager
+def _mapped(path: str | Path) -> Iterator[mmap.mmap | bytes]:
+    """
+    Map a file read-only into memory.
+
+    Every process mapping the same export shares the kernel's page cache
+    pages, so a parent and its shard workers never hold separate copies.
+    Empty files cannot be mapped and are returned as ``b""``.
+    """
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+
+def _find_record_tags(
+    buffer: bytes | mmap.mmap, needle: bytes, start: int, limit: int
+) -> list[bytes]:
+    """
+    Find Record start tags containing ``needle`` within ``[start, limit)``.
+
+    Args:
+        buffer: Raw export bytes or a memory map of them
+        needle: Encoded ``type="..."`` attribute to look for
+        start: Offset to search from; must not fall inside a tag
+        limit: Offset of the last tag start; tags from there on may be partial
+
+    Returns:
+        Complete start tags in file order
+    """
+    tags = []
+    pos = buffer.find(needle, start, limit)
+    while pos != -1:
+        tag_start = buffer.rfind(b"<", start, pos)
+        match = _RECORD_TAG.match(buffer, tag_start) if tag_start != -1 else None
+        if match and match.end() > pos:
+            tags.append(match.group())
+            pos = match.end()
+        else:
+            pos += len(needle)
+        pos = buffer.find(needle, pos, limit)
+    return tags
+
+
+def _read_chunks(f: BinaryIO, size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """Read a binary stream in fixed-size chunks."""
+    while chunk := f.read(size):
+        yield chunk
+
+
+def _parse_chunks(
+    chunks: Iterable[bytes],
+    record_type: str | None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: ProgressCallback | None = None,
+) -> Iterator[pl.DataFrame]:
+    """
+    Run the parse engine over a stream of raw export bytes.
+
+    Used where the export cannot be memory-mapped, such as when it is
+    decompressed on the fly from an archive. Mirrors ``_parse_buffer``,
+    carrying any partial tag at the end of a chunk over to the next one.
+
+    Args:
+        chunks: Consecutive pieces of a whole export document
+        record_type: Optional filter for specific record type
+        batch_size: Approximate number of rows per yielded batch
+        progress: Optional callback invoked after every chunk
+
+    Yields:
+        Polars DataFrames with string-typed record attributes
+    """
+    collector = _RecordCollector(record_type)
+    parsed = 0
+
+    if record_type is None:
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = collector.start_element
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+            parsed += len(chunk)
+            if progress:
+                progress(parsed, collector.seen)
+            if collector.rows >= batch_size:
+                yield collector.flush()
+        parser.Parse(b"", True)
+    else:
+        needle = f'type="{record_type}"'.encode()
+        carry = b""
+        for chunk in chunks:
+            buffer = carry + chunk
+            # Tags starting before the last '<' are complete
+            limit = max(buffer.rfind(b"<"), 0)
+            collector.feed_tags(_find_record_tags(buffer, needle, 0, limit))
+            carry = buffer[limit:]
+            parsed += len(chunk)
+            if progress:
+                progress(parsed, collector.seen)
+            if collector.rows >= batch_size:
+                yield collector.flush()
+        collector.feed_tags(_find_record_tags(carry, needle, 0, len(carry)))
+        if progress:
+            progress(parsed, collector.seen)
+
+    if collector.rows:
+        yield collector.flush()
+
+
+def _parse_buffer(
+    buffer: mmap.mmap | bytes,
+    start: int,
+    end: int,
+    record_type: str | None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fragment: bool = False,
+    progress: ProgressCallback | None = None,
+) -> Iterator[pl.DataFrame]:
+    """
+    Run the parse engine over ``buffer[start:end]`` without copying it.
+
+    Without a ``record_type`` the range goes through expat as memoryview
+    slices of the map. With one, the map is first searched in place for the
+    literal ``type="..."`` attribute as Apple writes it, and only the
+    matching Record tags are handed to expat, so the bulk of the export is
+    never tokenized at all.
+
+    Args:
+        buffer: Memory-mapped export
+        start: First byte to parse
+        end: Byte to stop at
+        record_type: Optional filter for specific record type
+        batch_size: Approximate number of rows per yielded batch
+        fragment: Whether the range is a run of sibling elements rather
+                  than a whole document (as for a parallel shard)
+        progress: Optional callback invoked after every chunk, with bytes
+                  counted from ``start``
+
+    Yields:
+        Polars DataFrames with string-typed record attributes
+    """
+    collector = _RecordCollector(record_type)
+
+    if record_type is None:
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = collector.start_element
+        if fragment:
+            parser.Parse(b"<_>", False)
+        with memoryview(buffer) as view:
+            for offset in range(start, end, READ_CHUNK_SIZE):
+                chunk_end = min(offset + READ_CHUNK_SIZE, end)
+                parser.Parse(view[offset:chunk_end], False)
+                if progress:
+                    progress(chunk_end - start, collector.seen)
+                if collector.rows >= batch_size:
+                    yield collector.flush()
+        parser.Parse(b"</_>" if fragment else b"", True)
+    else:
+        needle = f'type="{record_type}"'.encode()
+        pos = start
+        while pos < end:
+            window_end = min(pos + READ_CHUNK_SIZE, end)
+            # Tags starting before the last '<' in the window are complete
+            limit = end if window_end == end else buffer.rfind(b"<", pos, window_end)
+            if limit <= pos:
+                limit = window_end
+            collector.feed_tags(_find_record_tags(buffer, needle, pos, limit))
+            pos = limit
+            if progress:
+                progress(pos - start, collector.seen)
+            if collector.rows >= batch_size:
+                yield collector.flush()
+
+    if collector.rows:
+        yield collector.flush()
+
+
+def _next_top_level_record(buffer: mmap.mmap, offset: int, end: int) -> int:
+    """
+    Find the first top-level Record start tag at or after ``offset``.
+
+    Records nested in a Correlation are skipped: if a ``</Correlation>``
+    closes before the next ``<Correlation`` opens, the candidate is inside
+    one and the search resumes after it.
+
+    Returns:
+        Byte offset of the tag, or ``end`` if there is none before it
+    """
+    while offset < end:
+        candidate = buffer.find(b"<Record ", offset, end)
+        if candidate == -1:
+            return end
+
+        window_end = min(candidate + SHARD_ALIGN_WINDOW, end)
+        close = buffer.find(b"</Correlation>", candidate, window_end)
+        opening = buffer.find(b"<Correlation", candidate, window_end)
+        if close != -1 and (opening == -1 or close < opening):
+            offset = close + len(b"</Correlation>")
+            continue
+
+        return candidate
+    return end
+
+
+def _plan_ranges(buffer: mmap.mmap, shards: int) -> list[tuple[int, int]]:
+    """Split a mapped export into shard ranges; see ``plan_shards``."""
+    root = buffer.find(b"<HealthData", 0, READ_CHUNK_SIZE)
+    closing = buffer.rfind(b"</HealthData>")
+    if root == -1 or closing == -1:
+        return []
+
+    body_start = buffer.find(b">", root) + 1
+    step = (closing - body_start) // shards
+    bounds = [body_start]
+    for i in range(1, shards):
+        aligned = _next_top_level_record(buffer, body_start + i * step, closing)
+        if aligned > bounds[-1]:
+            bounds.append(aligned)
+    bounds.append(closing)
+
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def plan_shards(xml_path: str | Path, shards: int) -> list[tuple[int, int]]:
+    """
+    Split an export into byte ranges aligned on top-level Record tags.
+
+    The ranges cover the children of the HealthData root, so each one is a
+    run of complete sibling elements that can be parsed independently.
+
+    Args:
+        xml_path: Path to the HealthKit export.xml file
+        shards: Desired number of ranges
+
+    Returns:
+        Ordered, non-overlapping ``(start, end)`` byte ranges, or an empty
+        list if the root element could not be located
+    """
+    with _mapped(xml_path) as buffer:
+        return _plan_ranges(buffer, shards) if buffer else []
+
+
+def parse_shard(
+    xml_path: str | Path, start: int, end: int, record_type: str | None = None
+) -> pl.DataFrame:
+    """
+    Parse the records in one byte range from ``plan_shards``.
+
+    Runs in a worker process, so it takes and returns only picklable values.
+    The worker maps the export itself rather than being sent its bytes.
+
+    Returns:
+        String-typed record batch for the range
+    """
+    with _mapped(xml_path) as buffer:
+        batches = list(
+            _parse_buffer(buffer, start, end, record_type, fragment=True)
+        )
+
+    if not batches:
+        return pl.DataFrame(schema=RECORD_SCHEMA)
+    return pl.concat(batches, rechunk=False)
+
+
+def parse_record_dates(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Convert the raw date attribute columns of a record batch to datetimes.
+
+    Datetimes come out in UTC, so the UTC offset startDate was recorded at
+    is kept alongside; local clock times (bedtime, wake time) need it.
+
+    Args:
+        df: DataFrame with string-typed HealthKit date columns
+
+    Returns:
+        DataFrame with timezone-aware datetime columns, plus
+        utc_offset_minutes (the offset of startDate) if it has startDate
+    """
+    columns = [
+        pl.col(col).str.strptime(
+            pl.Datetime,
+            "%Y-%m-%d %H:%M:%S %z",
+            strict=False,
+        )
+        for col in DATE_FIELDS
+        if col in df.columns
+    ]
+    if "startDate" in df.columns:
+        # "2024-01-01 22:30:00 -0500" -> -300
+        offset = pl.col("startDate").str.extract_groups(r"([+-])(\d{2})(\d{2})$")
+        sign = pl.when(offset.struct[0] == "-").then(-1).otherwise(1)
+        columns.append(
+            (
+                sign
+                * (
+                    offset.struct[1].cast(pl.Int16) * 60
+                    + offset.struct[2].cast(pl.Int16)
+                )
+            )
+            .cast(pl.Int16)
+            .alias("utc_offset_minutes")
+        )
+    return df.with_columns(columns)
+
+
+def _buffer_chunks(buffer: mmap.mmap | bytes, size: int) -> Iterator[bytes]:
+    """Slice a buffer into consecutive pieces of ``size`` bytes."""
+    for offset in range(0, len(buffer), size):
+        yield buffer[offset : offset + size]
+
+
+def find_export_member(archive: zipfile.ZipFile) -> str:
+    """
+    Locate export.xml inside an Apple Health export archive.
+
+    Apple nests it in an ``apple_health_export/`` folder next to
+    ``export_cda.xml`` and workout routes, so match on the file name only.
+
+    Raises:
+        ValueError: If the archive has no export.xml
+    """
+    for name in archive.namelist():
+        if name.rsplit("/", 1)[-1] == EXPORT_MEMBER_NAME:
+            return name
+    raise ValueError(f"{EXPORT_MEMBER_NAME} not found in archive")
+
+
+def read_header(chunks: Iterable[bytes]) -> dict[str, dict[str, str]]:
+    """
+    Read the ExportDate and Me elements from the start of an export.
+
+    Parsing stops at the first Record, so only the DTD and the two header
+    elements (a few KB) are ever touched, whatever the size of the export.
+
+    Args:
+        chunks: Consecutive pieces of the export, read lazily
+
+    Returns:
+        Attributes of the ExportDate and Me elements, keyed by tag name
+    """
+    header: dict[str, dict[str, str]] = {}
+
+    def start_element(name: str, attrs: dict[str, str]):
+        if name in ("ExportDate", "Me"):
+            header[name] = attrs
+        if len(header) == 2 or name in ("Record", "Correlation", "Workout"):
+            raise _HeaderFound
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start_element
+    try:
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    except _HeaderFound:
+        pass
+
+    return header
+
 
 class HealthKitXMLParser:
-    """Parser for Apple HealthKit export.xml files."""
+    """
+    Parser for Apple HealthKit export.xml files.
+
+    Accepts either export.xml itself or the export.zip archive the Health
+    app produces. Archived exports are decompressed as a stream straight
+    into the parse engine and never extracted to disk.
+    """
 
     def __init__(self, xml_path: str | Path):
         """
-        Initialize parser with path to export.xml file.
+        Initialize parser with path to export.xml or export.zip file.
 
         Args:
-            xml_path: Path to the HealthKit export.xml file
+            xml_path: Path to the HealthKit export.xml file or export.zip
         """
         self.xml_path = Path(xml_path)
         if not self.xml_path.exists():
             raise FileNotFoundError(f"File not found: {self.xml_path}")
 
-    def parse_records(self, record_type: str | None = None) -> pl.DataFrame:
+        self.archive_member: str | None = None
+        if zipfile.is_zipfile(self.xml_path):
+            with zipfile.ZipFile(self.xml_path) as archive:
+                self.archive_member = find_export_member(archive)
+
+        self._header: dict[str, dict[str, str]] | None = None
+
+    @property
+    def size(self) -> int:
+        """Size in bytes of the export document, uncompressed."""
+        if self.archive_member is not None:
+            with zipfile.ZipFile(self.xml_path) as archive:
+                return archive.getinfo(self.archive_member).file_size
+        return self.xml_path.stat().st_size
+
+    @contextmanager
+    def _open_archived(self) -> Iterator[BinaryIO]:
+        """Open the decompressing stream of export.xml inside the archive."""
+        with zipfile.ZipFile(self.xml_path) as archive:
+            with archive.open(self.archive_member) as stream:
+                yield stream
+
+    def iter_record_batches(
+        self,
+        record_type: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        progress: ProgressCallback | None = None,
+    ) -> Iterator[pl.DataFrame]:
+        """
+        Stream Record elements as column-oriented batches.
+
+        Plain exports are memory-mapped and parsed in place; archived ones
+        are decompressed in chunks. Either way memory use is bounded by
+        ``batch_size`` rather than by the size of the export.
+
+        Args:
+            record_type: Optional filter for specific record type
+            batch_size: Approximate number of rows per yielded batch
+            progress: Optional callback reporting bytes parsed (of ``size``)
+                      and matching records seen. It may raise to abort.
+
+        Yields:
+            Polars DataFrames with string-typed record attributes
+        """
+        if self.archive_member is not None:
+            with self._open_archived() as stream:
+                yield from _parse_chunks(
+                    _read_chunks(stream), record_type, batch_size, progress
+                )
+            return
+
+        with _mapped(self.xml_path) as buffer:
+            yield from _parse_buffer(
+                buffer, 0, len(buffer), record_type, batch_size, progress=progress
+            )
+
+    def parse_records(
+        self,
+        record_type: str | None = None,
+        workers: int = 1,
+        progress: ProgressCallback | None = None,
+    ) -> pl.DataFrame:
         """
         Parse Record elements from the XML file.
 
         Args:
             record_type: Optional filter for specific record type
                         (e.g., 'HKCategoryTypeIdentifierSleepAnalysis')
+            workers: Number of processes to parse with. Exports too small to
+                     give every worker ``MIN_SHARD_SIZE`` bytes use fewer, and
+                     archived exports are always parsed as a single stream.
+            progress: Optional callback, see ``iter_record_batches``. With
+                      several workers it is invoked as each shard completes.
 
         Returns:
             Polars DataFrame with record data
         """
-        records = []
-
-        # Use iterparse for memory efficiency with large files
-        context = ET.iterparse(self.xml_path, events=("start", "end"))
-        _, root = next(context)
-
-        for event, elem in context:
-            if event == "end" and elem.tag == "Record":
-                # Filter by record type if specified
-                if record_type is None or elem.get("type") == record_type:
-                    record = {
-                        "type": elem.get("type"),
-                        "sourceName": elem.get("sourceName"),
-                        "sourceVersion": elem.get("sourceVersion"),
-                        "device": elem.get("device"),
-                        "unit": elem.get("unit"),
-                        "creationDate": elem.get("creationDate"),
-                        "startDate": elem.get("startDate"),
-                        "endDate": elem.get("endDate"),
-                        "value": elem.get("value"),
-                    }
-                    records.append(record)
-
-                # Clear element to free memory
-                elem.clear()
-                root.clear()
-
-        if not records:
+        shards = min(workers, self.xml_path.stat().st_size // MIN_SHARD_SIZE)
+        if self.archive_member is not None:
+            shards = 1
+        ranges = plan_shards(self.xml_path, shards) if shards > 1 else []
+
+        if len(ranges) > 1:
+            batches = self._parse_parallel(ranges, record_type, progress)
+        else:
+            batches = list(self.iter_record_batches(record_type, progress=progress))
+
+        if not batches:
             return pl.DataFrame()
 
-        # Create Polars DataFrame
-        df = pl.DataFrame(records)
-
-        # Parse dates to datetime
-        date_columns = ["creationDate", "startDate", "endDate"]
-        for col in date_columns:
-            if col in df.columns:
-                df = df.with_columns(
-                    pl.col(col).str.strptime(
-                        pl.Datetime,
-                        "%Y-%m-%d %H:%M:%S %z",
-                        strict=False,
-                    )
+        return parse_record_dates(pl.concat(batches, rechunk=True))
+
+    def _parse_parallel(
+        self,
+        ranges: list[tuple[int, int]],
+        record_type: str | None,
+        progress: ProgressCallback | None = None,
+    ) -> list[pl.DataFrame]:
+        """Parse shards in a process pool, returning batches in file order."""
+        # Polars is not fork-safe, so workers are spawned fresh
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(len(ranges), mp_context=context) as pool:
+            futures = {
+                pool.submit(parse_shard, self.xml_path, start, end, record_type): (
+                    end - start
                 )
+                for start, end in ranges
+            }
+            parsed = seen = 0
+            try:
+                for future in as_completed(futures):
+                    parsed += futures[future]
+                    seen += len(future.result())
+                    if progress:
+                        progress(parsed, seen)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            frames = [future.result() for future in futures]
+
+        return [frame for frame in frames if not frame.is_empty()]
 
-        return df
+    def _read_header(self) -> dict[str, dict[str, str]]:
+        """Read and cache the export's header elements."""
+        if self._header is None:
+            if self.archive_member is not None:
+                with self._open_archived() as stream:
+                    self._header = read_header(
+                        _read_chunks(stream, HEADER_CHUNK_SIZE)
+                    )
+            else:
+                with _mapped(self.xml_path) as buffer:
+                    self._header = read_header(
+                        _buffer_chunks(buffer, HEADER_CHUNK_SIZE)
+                    )
+        return self._header
 
     def get_export_date(self) -> datetime:
         """
@@ -88,12 +635,10 @@ class HealthKitXMLParser:
         Returns:
             Export date as datetime object
         """
-        tree = ET.parse(self.xml_path)
-        root = tree.getroot()
-        export_date_elem = root.find("ExportDate")
+        export_date = self._read_header().get("ExportDate")
 
-        if export_date_elem is not None:
-            date_str = export_date_elem.get("value")
+        if export_date is not None:
+            date_str = export_date.get("value")
             return datetime.fromisoformat(date_str)
 
         raise ValueError("Export date not found in XML file")
@@ -105,11 +650,4 @@ class HealthKitXMLParser:
         Returns:
             Dictionary with personal health data
         """
-        tree = ET.parse(self.xml_path)
-        root = tree.getroot()
-        me_elem = root.find("Me")
-
-        if me_elem is not None:
-            return dict(me_elem.attrib)
-
-        return {}
+        return dict(self._read_header().get("Me", {}))
@@ -2,11 +2,13 @@
 Sleep-specific data extraction from HealthKit XML.
 """
 
+from collections.abc import Sequence
 from pathlib import Path
 
 import polars as pl
 
-from backend.parsers.healthkit_xml import HealthKitXMLParser
+from backend.analysis.intervals import merge_intervals
+from backend.parsers.healthkit_xml import HealthKitXMLParser, ProgressCallback
 
 
 class SleepExtractor:
@@ -24,23 +26,32 @@ class SleepExtractor:
         "HKCategoryValueSleepAnalysisAsleepREM": "asleep_rem",
     }
 
-    def __init__(self, xml_path: str | Path):
+    def __init__(self, xml_path: str | Path, workers: int = 1):
         """
         Initialize extractor with path to export.xml file.
 
         Args:
             xml_path: Path to the HealthKit export.xml file
+            workers: Number of processes to parse the export with
         """
         self.parser = HealthKitXMLParser(xml_path)
+        self.workers = workers
 
-    def extract_sleep_data(self) -> pl.DataFrame:
+    def extract_sleep_data(
+        self, progress: ProgressCallback | None = None
+    ) -> pl.DataFrame:
         """
         Extract all sleep analysis records.
 
+        Args:
+            progress: Optional callback reporting parse progress
+
         Returns:
             Polars DataFrame with sleep data including normalized stage names
         """
-        df = self.parser.parse_records(record_type=self.SLEEP_TYPE)
+        df = self.parser.parse_records(
+            record_type=self.SLEEP_TYPE, workers=self.workers, progress=progress
+        )
 
         if df.is_empty():
             return df
@@ -93,36 +104,111 @@ class SleepExtractor:
 
         return summary
 
-    def get_nightly_totals(self, df: pl.DataFrame) -> pl.DataFrame:
+    @staticmethod
+    def get_nightly_totals(
+        df: pl.DataFrame, source_priority: Sequence[str] = ()
+    ) -> pl.DataFrame:
         """
-        Calculate total sleep metrics per night.
+        Calculate total sleep and stage metrics per night.
+
+        Overlapping records from several sources are merged into one
+        timeline first (see intervals.merge_intervals), so shared sleep is
+        counted once and the stage minutes add up to the total. The night's
+        source is the one credited with the most sleep. sleep_start_local
+        and sleep_end_local are the naive local clock times of sleep start
+        and end, at the UTC offset of the records they come from (UTC where
+        that is unknown).
 
         Args:
             df: DataFrame from extract_sleep_data()
+            source_priority: Source name fragments, highest priority first,
+                             deciding which source overlapping sleep is
+                             credited to (see intervals.rank_sources)
 
         Returns:
-            DataFrame with nightly totals
+            DataFrame with nightly totals and stage breakdowns
         """
         if df.is_empty():
             return df
 
-        # Filter for actual sleep stages (exclude in_bed)
-        sleep_df = df.filter(
-            pl.col("sleep_stage").is_in(
-                ["asleep_core", "asleep_deep", "asleep_rem", "asleep_unspecified"]
+        asleep = ["asleep_core", "asleep_deep", "asleep_rem", "asleep_unspecified"]
+
+        def stage_minutes(stage: str) -> pl.Expr:
+            seconds = pl.col("seconds").filter(pl.col("sleep_stage") == stage)
+            return (seconds.sum() // 60).cast(pl.Int64).alias(f"{stage}_minutes")
+
+        stage_seconds = (
+            merge_intervals(df, source_priority)
+            .group_by("date", "sourceName", "sleep_stage")
+            .agg(
+                (pl.col("endDate") - pl.col("startDate"))
+                .dt.total_seconds()
+                .sum()
+                .alias("seconds")
+            )
+        )
+        source_minutes = (
+            stage_seconds.filter(pl.col("sleep_stage").is_in(asleep))
+            .group_by("date", "sourceName")
+            .agg(pl.col("seconds").sum())
+            .group_by("date")
+            .agg(
+                [
+                    (pl.col("seconds").sum() // 60).alias("total_sleep_minutes"),
+                    pl.col("sourceName")
+                    .sort_by("seconds", descending=True)
+                    .first()
+                    .alias("source"),
+                ]
             )
         )
+        stages = stage_seconds.group_by("date").agg(
+            [
+                stage_minutes(stage)
+                for stage in ("asleep_core", "asleep_deep", "asleep_rem", "awake")
+            ]
+        )
+
+        # Percentages of staged sleep (core, deep and REM); awake of time
+        # in bed
+        staged_minutes = (
+            pl.col("asleep_core_minutes")
+            + pl.col("asleep_deep_minutes")
+            + pl.col("asleep_rem_minutes")
+        )
+
+        def share(minutes: str, total: pl.Expr) -> pl.Expr:
+            return (
+                pl.when(total > 0)
+                .then(pl.col(minutes) / total * 100)
+                .otherwise(0.0)
+                .alias(minutes.removesuffix("_minutes") + "_pct")
+            )
+
+        def local(column: str) -> pl.Expr:
+            return pl.col(column).dt.replace_time_zone(None) + pl.duration(
+                minutes=pl.col("utc_offset_minutes").fill_null(0)
+            )
 
         nightly = (
-            sleep_df.group_by("date")
+            df.filter(pl.col("sleep_stage").is_in(asleep))
+            .group_by("date")
             .agg(
                 [
                     pl.col("startDate").min().alias("sleep_start"),
                     pl.col("endDate").max().alias("sleep_end"),
-                    pl.col("duration_minutes").sum().alias("total_sleep_minutes"),
-                    pl.col("sourceName").first().alias("source"),
+                    local("startDate")
+                    .sort_by("startDate")
+                    .first()
+                    .alias("sleep_start_local"),
+                    local("endDate")
+                    .sort_by("endDate")
+                    .last()
+                    .alias("sleep_end_local"),
                 ]
             )
+            .join(source_minutes, on="date")
+            .join(stages, on="date")
             .with_columns(
                 [
                     (pl.col("total_sleep_minutes") / 60).alias("total_sleep_hours"),
@@ -138,7 +224,11 @@ class SleepExtractor:
                     (
                         (pl.col("total_sleep_minutes") / pl.col("time_in_bed_minutes"))
                         * 100
-                    ).alias("sleep_efficiency_pct")
+                    ).alias("sleep_efficiency_pct"),
+                    share("asleep_core_minutes", staged_minutes),
+                    share("asleep_deep_minutes", staged_minutes),
+                    share("asleep_rem_minutes", staged_minutes),
+                    share("awake_minutes", pl.col("time_in_bed_minutes")),
                 ]
             )
             .sort("date")
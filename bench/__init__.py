@@ -0,0 +1 @@
+"""Performance benchmarks for the ingest and query paths."""
@@ -0,0 +1,83 @@
+"""
+Benchmark the per-request cost of resolving the authenticated user.
+
+Compares the full user lookup authenticated requests used to do with
+the lean principal lookup, uncached and cached per token. The user gets
+a profile picture to show that its size no longer matters.
+
+Usage:
+    python -m bench.auth_overhead [--requests 1000] [--picture-kb 4096]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+
+def _time_us(fn, requests: int) -> list[float]:
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=1000)
+    arg_parser.add_argument("--picture-kb", type=int, default=4096)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            # Imported here: loading the users module creates the default
+            # user in the database under the current directory
+            from backend.auth import users
+            from backend.auth.profile_pictures import store_profile_picture
+            from backend.auth.security import create_access_token, verify_token
+            from backend.database.sleep_db import db_pool
+
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            username = "admin@example.com"
+            store_profile_picture(
+                username, os.urandom(args.picture_kb * 1024), "image/png"
+            )
+            token = create_access_token({"sub": username})
+
+            def full_lookup():
+                payload = verify_token(token)
+                users.get_user(payload["sub"])
+
+            def principal_uncached():
+                payload = verify_token(token)
+                users.invalidate_principal(username)
+                users.get_principal(payload["sub"], payload["jti"])
+
+            def principal_cached():
+                payload = verify_token(token)
+                users.get_principal(payload["sub"], payload["jti"])
+
+            for label, fn in (
+                ("full user row", full_lookup),
+                ("principal", principal_uncached),
+                ("cached", principal_cached),
+            ):
+                timings = _time_us(fn, args.requests)
+                print(
+                    f"{label:>13}: mean {statistics.mean(timings):9.1f} us  "
+                    f"p50 {statistics.median(timings):9.1f} us"
+                )
+
+            db_pool.close()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark scoring nights against the sleep benchmarks.
+
+Ingests a synthetic export and loads the benchmarks, then times
+``update_sleep_metrics`` rescoring every night in one statement against
+"loop", which scores night by night and benchmark by benchmark in Python
+and inserts the rows with executemany. Also times the incremental case
+of one re-ingested night.
+
+Usage:
+    python -m bench.benchmark_scoring [--nights 1825] [--repeat 3]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+from load_benchmarks import load_benchmarks_from_toml
+
+CONFIG_PATH = Path(__file__).parent.parent / "backend/config/sleep_science_config.toml"
+
+# Nightly summary column of the benchmarks that map onto one directly
+LOOP_COLUMNS = {
+    "sleep_duration": "total_sleep_hours",
+    "sleep_efficiency": "sleep_efficiency_pct",
+    "rem_sleep": "asleep_rem_pct",
+    "deep_sleep": "asleep_deep_pct",
+    "light_sleep": "asleep_core_pct",
+    "wake_after_sleep_onset": "awake_minutes",
+}
+
+
+def _loop_scores(db: SleepDatabase) -> int:
+    """Score every night one benchmark at a time, as a naive engine would."""
+    benchmarks = db.conn.execute(
+        "SELECT metric_name, optimal_min, optimal_max, unit FROM sleep_benchmarks"
+    ).fetchall()
+    rows = []
+    for night in db.get_nightly_summary().iter_rows(named=True):
+        for metric, optimal_min, optimal_max, unit in benchmarks:
+            column = LOOP_COLUMNS.get(metric)
+            if column is None or night[column] is None:
+                continue
+            value = float(night[column])
+            deviation = 0.0
+            if optimal_min is not None and value < optimal_min:
+                deviation = value - optimal_min
+            elif optimal_max is not None and value > optimal_max:
+                deviation = value - optimal_max
+            rows.append(
+                (night["date"], metric, value, unit, deviation, deviation == 0.0)
+            )
+
+    db.conn.execute("DELETE FROM sleep_metrics")
+    db.conn.executemany(
+        """
+        INSERT INTO sleep_metrics (
+            date, metric_name, value, unit,
+            deviation_from_optimal, meets_benchmark
+        ) VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+def _median_ms(fn, repeat: int) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+            load_benchmarks_from_toml(CONFIG_PATH)
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            with SleepDatabase() as db:
+                last_night = db.get_nightly_summary()["date"].max()
+                results = {
+                    "loop": _median_ms(lambda: _loop_scores(db), args.repeat),
+                    "set-based": _median_ms(db.update_sleep_metrics, args.repeat),
+                    "one night": _median_ms(
+                        lambda: db.update_sleep_metrics([last_night]), args.repeat
+                    ),
+                }
+        finally:
+            db_pool.close()
+            os.chdir(cwd)
+
+    print(f"{'scoring':<10} {'median ms':>10} {'rows':>8}")
+    for label, (ms, rows) in results.items():
+        print(f"{label:<10} {ms:>10.1f} {rows:>8}")
+
+
+if __name__ == "__main__":
+    main()
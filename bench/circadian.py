@@ -0,0 +1,117 @@
+"""
+Benchmark circadian metrics: per-minute Python loops vs the NumPy raster.
+
+Ingests a synthetic export, then computes the Sleep Regularity Index of
+the last --days nights three ways: "python loop", which marks every
+asleep minute of every record in a list and compares days minute by
+minute; "raster", which rasterizes the records with NumPy on every call;
+and "cached raster", which reuses the per-day raster cache. Also times
+the full /circadian summary with a warm cache.
+
+Usage:
+    python -m bench.circadian [--nights 1825] [--days 365] [--repeat 10]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, time as clock_time, timedelta
+from pathlib import Path
+
+from backend.analysis import circadian
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def _loop_sri(db: SleepDatabase, first_day, days: int) -> float:
+    """Compute the SRI by marking and comparing minutes in Python."""
+    origin = datetime.combine(first_day, clock_time())
+    intervals = db.get_sleep_intervals(origin, origin + timedelta(days=days))
+    span = days * circadian.MINUTES_PER_DAY
+    asleep = [False] * span
+    for start, end, is_asleep in intervals.select(
+        "start_date", "end_date", "asleep"
+    ).iter_rows():
+        if not is_asleep:
+            continue
+        first = (start.replace(tzinfo=None) - origin) // timedelta(minutes=1)
+        last = (end.replace(tzinfo=None) - origin) // timedelta(minutes=1)
+        for minute in range(max(first, 0), min(last, span)):
+            asleep[minute] = True
+
+    same = sum(
+        asleep[minute] == asleep[minute - circadian.MINUTES_PER_DAY]
+        for minute in range(circadian.MINUTES_PER_DAY, span)
+    )
+    return 200 * same / (span - circadian.MINUTES_PER_DAY) - 100
+
+
+def _raster_sri(db: SleepDatabase, first_day, days: int, use_cache: bool) -> float:
+    """Compute the SRI from a NumPy raster."""
+    raster = circadian.load_raster(
+        db, first_day, first_day + timedelta(days=days - 1), use_cache=use_cache
+    )
+    return float(
+        200 * (raster.asleep[1:] == raster.asleep[:-1]).mean() - 100
+    )
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--days", type=int, default=365)
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            with SleepDatabase() as db:
+                last_day = db.get_nightly_summary()["date"].max()
+                first_day = last_day - timedelta(days=args.days - 1)
+                timings = {
+                    "python loop": _median_ms(
+                        lambda: _loop_sri(db, first_day, args.days), args.repeat
+                    ),
+                    "raster": _median_ms(
+                        lambda: _raster_sri(db, first_day, args.days, False),
+                        args.repeat,
+                    ),
+                    "cached raster": _median_ms(
+                        lambda: _raster_sri(db, first_day, args.days, True),
+                        args.repeat,
+                    ),
+                    "summary": _median_ms(
+                        lambda: circadian.circadian_summary(db, first_day, last_day),
+                        args.repeat,
+                    ),
+                }
+        finally:
+            db_pool.close()
+            os.chdir(cwd)
+
+    print(f"nights: {args.nights}, days: {args.days}")
+    for label, ms in timings.items():
+        print(f"{label:<14} {ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
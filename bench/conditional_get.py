@@ -0,0 +1,99 @@
+"""
+Benchmark dashboard reads uncached, from the response cache and as 304s.
+
+Ingests a synthetic export, then requests /api/sleep/summary, /stats and
+a page of /records in-process. "uncached" clears the response cache
+before every request, which is what every refresh used to cost; "cached"
+is a repeat request served from the cache; "304" revalidates with the
+ETag the client already has.
+
+Usage:
+    python -m bench.conditional_get [--nights 1825] [--requests 50]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench.synthetic import write_export
+
+ENDPOINTS = {
+    "summary": ("/api/sleep/summary", {}),
+    "stats": ("/api/sleep/stats", {}),
+    "records page": ("/api/sleep/records", {"limit": 1000}),
+}
+
+
+def _median_ms(fn, requests: int) -> float:
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--requests", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            # Imported here: the app creates its database under the
+            # current directory
+            from fastapi.testclient import TestClient
+
+            from backend.api import caching
+            from backend.api.main import app
+            from backend.ingest.pipeline import run_ingest
+
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+
+            with TestClient(app) as client:
+                token = client.post(
+                    "/api/auth/login",
+                    data={"username": "admin@example.com", "password": "admin"},
+                ).json()["access_token"]
+                client.headers["Authorization"] = f"Bearer {token}"
+
+                print(f"{'endpoint':<13} {'uncached':>10} {'cached':>10} {'304':>10}")
+                for label, (path, params) in ENDPOINTS.items():
+                    etag = client.get(path, params=params).headers["ETag"]
+
+                    def uncached():
+                        caching._response_cache.clear()
+                        client.get(path, params=params)
+
+                    def cached():
+                        client.get(path, params=params)
+
+                    def not_modified():
+                        response = client.get(
+                            path, params=params, headers={"If-None-Match": etag}
+                        )
+                        assert response.status_code == 304
+
+                    timings = [
+                        _median_ms(fn, args.requests)
+                        for fn in (uncached, cached, not_modified)
+                    ]
+                    print(
+                        f"{label:<13} "
+                        + " ".join(f"{ms:>7.2f} ms" for ms in timings)
+                    )
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
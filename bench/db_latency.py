@@ -0,0 +1,70 @@
+"""
+Benchmark per-request database latency with and without the pool pinned.
+
+Each simulated request opens a SleepDatabase, looks up a user and reads a
+month of nightly summaries, the way the API routes do. Without the pool
+opened at startup every request attaches the encrypted database and
+checks its schema; with it requests only borrow a cursor.
+
+Usage:
+    python -m bench.db_latency [--requests 200] [--nights 365]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def _request() -> float:
+    """Time one simulated request in milliseconds."""
+    start = time.perf_counter()
+    with SleepDatabase() as db:
+        db.get_user("admin@example.com")
+        db.get_nightly_summary(start_date="2020-06-01", end_date="2020-06-30")
+    return (time.perf_counter() - start) * 1000
+
+
+def _report(label: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{label:>10}: mean {statistics.mean(timings):7.2f} ms  "
+        f"p50 {statistics.median(timings):7.2f} ms  p99 {p99:7.2f} ms"
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--nights", type=int, default=365)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+
+            _report("per-request", [_request() for _ in range(args.requests)])
+
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            try:
+                _report("pooled", [_request() for _ in range(args.requests)])
+            finally:
+                db_pool.close()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
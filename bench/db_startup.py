@@ -0,0 +1,52 @@
+"""
+Benchmark opening the encrypted database, cold and already initialized.
+
+"create" opens a brand-new database file, so the schema is built from
+scratch; "reopen" attaches an existing, up-to-date file, which is what
+the app does at startup and what every SleepDatabase did per request
+before connections were pooled.
+
+Usage:
+    python -m bench.db_startup [--repeat 20]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend.database.sleep_db import SleepDatabase
+
+
+def _timed_connect(db_path: Path) -> float:
+    """Attach ``db_path`` and close it again; return milliseconds."""
+    start = time.perf_counter()
+    conn = SleepDatabase.connect(db_path)
+    elapsed = (time.perf_counter() - start) * 1000
+    conn.close()
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        create = [
+            _timed_connect(tmp / f"new-{i}.duckdb") for i in range(args.repeat)
+        ]
+        reopen = [_timed_connect(tmp / "new-0.duckdb") for _ in range(args.repeat)]
+
+    for label, timings in (("create", create), ("reopen", reopen)):
+        print(
+            f"{label:>6}: mean {statistics.mean(timings):7.2f} ms  "
+            f"p50 {statistics.median(timings):7.2f} ms  "
+            f"min {min(timings):7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
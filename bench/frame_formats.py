@@ -0,0 +1,64 @@
+"""
+Benchmark encoding sleep data responses as JSON, Arrow IPC and Parquet.
+
+Ingests a synthetic export, then times ``frame_response`` for the full
+nightly summary and sleep record tables in every format, reporting the
+median encode time and the body size.
+
+Usage:
+    python -m bench.frame_formats [--nights 1825] [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend.api.responses import FORMATS, frame_response
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            with SleepDatabase() as db:
+                tables = {
+                    "summary": db.get_nightly_summary(),
+                    "records": db.get_sleep_records(),
+                }
+        finally:
+            db_pool.close()
+            os.chdir(cwd)
+
+    print(f"{'table':<8} {'rows':>7}  {'format':<8} {'median ms':>10} {'body KB':>10}")
+    for name, df in tables.items():
+        for response_format in FORMATS:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = frame_response(df, response_format)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(
+                f"{name:<8} {len(df):>7}  {response_format:<8} "
+                f"{statistics.median(timings):>10.1f} {len(response.body) / 1024:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark loading one night's hypnogram: raw records vs stage segments.
+
+Ingests a synthetic export, then requests random nights in-process.
+"records" is what the night view used to do: fetch the night's raw
+records from /api/sleep/records and sort them by start time. "segments"
+fetches the precomputed /api/sleep/hypnogram. The response cache is
+cleared before every request so both paths reach the database.
+
+Usage:
+    python -m bench.hypnogram [--nights 1825] [--requests 50]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from bench.synthetic import write_export
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--requests", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            # Imported here: the app creates its database under the
+            # current directory
+            from fastapi.testclient import TestClient
+
+            from backend.api import caching
+            from backend.api.main import app
+            from backend.ingest.pipeline import run_ingest
+
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+
+            with TestClient(app) as client:
+                token = client.post(
+                    "/api/auth/login",
+                    data={"username": "admin@example.com", "password": "admin"},
+                ).json()["access_token"]
+                client.headers["Authorization"] = f"Bearer {token}"
+
+                first = date.fromisoformat(
+                    client.get("/api/sleep/stats").json()["date_range"]["start"]
+                )
+                rng = random.Random(0)
+                nights = [
+                    str(first + timedelta(days=rng.randrange(args.nights)))
+                    for _ in range(args.requests)
+                ]
+
+                def records(night: str) -> int:
+                    rows = client.get(
+                        "/api/sleep/records",
+                        params={"start_date": night, "end_date": night},
+                    ).json()
+                    rows.sort(key=lambda row: row["start_date"])
+                    return len(rows)
+
+                def segments(night: str) -> int:
+                    return len(
+                        client.get("/api/sleep/hypnogram", params={"date": night}).json()
+                    )
+
+                print(f"{'path':<9} {'median ms':>10} {'rows/night':>11}")
+                for label, fn in (("records", records), ("segments", segments)):
+                    timings = []
+                    rows = []
+                    for night in nights:
+                        caching._response_cache.clear()
+                        start = time.perf_counter()
+                        rows.append(fn(night))
+                        timings.append((time.perf_counter() - start) * 1000)
+                    print(
+                        f"{label:<9} {statistics.median(timings):>10.2f} "
+                        f"{statistics.mean(rows):>11.1f}"
+                    )
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
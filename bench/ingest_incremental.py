@@ -0,0 +1,81 @@
+"""
+Benchmark re-importing a cumulative export that gained one week of data.
+
+Ingests a multi-year export into a scratch database, then re-imports the
+same export extended by a few nights, once in full mode and once in
+incremental mode, each starting from a copy of the same database.
+
+Usage:
+    python -m bench.ingest_incremental [--nights 1825] [--new-nights 7]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def _timed_ingest(workdir: Path, export_path: Path, incremental: bool) -> dict:
+    """Run one ingest against the database under ``workdir``."""
+    os.chdir(workdir)
+    start = time.perf_counter()
+    result = run_ingest(export_path, incremental=incremental)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=5 * 365)
+    arg_parser.add_argument("--new-nights", type=int, default=7)
+    arg_parser.add_argument(
+        "--heart-rate",
+        type=int,
+        default=50,
+        help="Heart-rate records per night (parsed past, never stored)",
+    )
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # The generator is seeded, so the longer export extends the shorter
+        old_export = write_export(
+            tmp / "old.xml", nights=args.nights, heart_rate_per_night=args.heart_rate
+        )
+        new_export = write_export(
+            tmp / "new.xml",
+            nights=args.nights + args.new_nights,
+            heart_rate_per_night=args.heart_rate,
+        )
+        print(f"{new_export}: {new_export.stat().st_size / 1e6:.1f} MB")
+
+        base = tmp / "base"
+        base.mkdir()
+        try:
+            initial = _timed_ingest(base, old_export, incremental=False)
+            print(
+                f"initial import: {initial['records']} records, "
+                f"{initial['nights']} nights in {initial['seconds']:.2f}s\n"
+            )
+
+            for label, incremental in (("full", False), ("incremental", True)):
+                workdir = tmp / label
+                shutil.copytree(base, workdir)
+                result = _timed_ingest(workdir, new_export, incremental)
+                print(
+                    f"{label:>11} re-import: {result['seconds']:6.2f}s  "
+                    f"{result['records']:>6} records  "
+                    f"{result['nights']:>5} nights re-aggregated"
+                )
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
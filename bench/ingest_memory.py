@@ -0,0 +1,145 @@
+"""
+Benchmark server memory while uploading a large export to /api/ingest.
+
+Starts the API with uvicorn in a scratch directory, streams a synthetic
+export to it and samples the server's resident memory while the request
+is in flight. Anonymous memory is reported separately because pages of the
+memory-mapped export are file-backed and reclaimable by the kernel.
+
+Usage:
+    python -m bench.ingest_memory [--size-mb 1024] [--port 8765]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import requests
+
+from bench.synthetic import write_export_of_size
+
+PROJECT_ROOT = Path(__file__).parent.parent
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _read_status(pid: int) -> dict[str, int]:
+    """Read memory counters (in KB) from /proc/<pid>/status."""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "VmHWM", "RssAnon"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+class _Sampler(threading.Thread):
+    """Poll a process' anonymous RSS and remember the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_anon_kb = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            status = _read_status(self.pid)
+            self.peak_anon_kb = max(self.peak_anon_kb, status.get("RssAnon", 0))
+            time.sleep(self.interval)
+
+
+def _multipart_body(path: Path, boundary: str):
+    """Yield a multipart/form-data body for ``path`` without loading it."""
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{path.name}"\r\n'
+        "Content-Type: application/xml\r\n\r\n"
+    ).encode()
+    with open(path, "rb") as f:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def _wait_until_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--size-mb", type=int, default=1024)
+    arg_parser.add_argument("--port", type=int, default=8765)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        xml_path = write_export_of_size(workdir / "export.xml", args.size_mb * 1024**2)
+        size_mb = xml_path.stat().st_size / 1024**2
+        print(f"Synthetic export: {size_mb:,.0f} MB")
+
+        env = {**os.environ, "PYTHONPATH": str(PROJECT_ROOT)}
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "backend.api.main:app",
+                "--port", str(args.port), "--log-level", "warning",
+            ],
+            cwd=workdir,
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+
+        try:
+            _wait_until_ready(base_url)
+            token = requests.post(
+                f"{base_url}/api/auth/login",
+                data={"username": "admin@example.com", "password": "admin"},
+            ).json()["access_token"]
+
+            idle = _read_status(server.pid)
+            sampler = _Sampler(server.pid)
+            sampler.start()
+
+            boundary = uuid.uuid4().hex
+            start = time.perf_counter()
+            response = requests.post(
+                f"{base_url}/api/ingest",
+                data=_multipart_body(xml_path, boundary),
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": f"multipart/form-data; boundary={boundary}",
+                },
+            )
+            elapsed = time.perf_counter() - start
+
+            sampler.stopped.set()
+            sampler.join()
+            peak = _read_status(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+        print(f"Response: {response.status_code} {response.json()}")
+        print(f"Elapsed: {elapsed:.1f}s ({size_mb / elapsed:.1f} MB/s)")
+        print(f"Idle RSS:           {idle['VmRSS'] / 1024:8.1f} MB")
+        print(f"Peak anonymous RSS: {sampler.peak_anon_kb / 1024:8.1f} MB")
+        print(f"Peak total RSS:     {peak['VmHWM'] / 1024:8.1f} MB (incl. mapped file)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark merging overlapping multi-source sleep intervals.
+
+Generates nights recorded by three overlapping sources (a watch with
+staged sleep, a phone and a third-party app), then times "naive sum",
+the per-night duration sum nightly totals used to take, against "merge",
+the priority-aware timeline from backend.analysis.intervals, and reports
+how much extra sleep the naive sum counts.
+
+Usage:
+    python -m bench.interval_merge [--intervals 100000 1000000 5000000]
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, datetime, time as time_of_day, timezone
+
+import numpy as np
+import polars as pl
+
+from backend.analysis.intervals import merge_intervals
+
+SOURCES = ["Apple Watch", "iPhone", "AutoSleep"]
+PRIORITY = ["Watch", "iPhone"]
+WATCH_STAGES = ["asleep_core", "asleep_deep", "asleep_rem", "awake"]
+
+# Watch records split a night into stages; the others log one block
+WATCH_RECORDS_PER_NIGHT = 18
+
+
+def synthetic_intervals(count: int, seed: int = 0) -> pl.DataFrame:
+    """Generate about ``count`` overlapping intervals from three sources."""
+    rng = np.random.default_rng(seed)
+    per_night = WATCH_RECORDS_PER_NIGHT + 2
+    nights = max(1, count // per_night)
+    minute = 60_000_000
+    first_night = date(2015, 1, 1)
+    origin = int(
+        datetime.combine(first_night, time_of_day(23), timezone.utc).timestamp()
+        * 1_000_000
+    )
+    bedtimes = (
+        origin
+        + np.arange(nights) * 1440 * minute
+        + rng.integers(-60, 60, nights) * minute
+    )
+
+    # Watch stages are back-to-back records of 15-40 minutes; the phone
+    # and the app each log one 6-9 hour block, shifted against the watch
+    lengths = rng.integers(15, 40, (nights, per_night)) * minute
+    offsets = np.cumsum(lengths, axis=1) - lengths
+    offsets[:, WATCH_RECORDS_PER_NIGHT:] = (
+        rng.integers(-30, 30, (nights, 2)) * minute
+    )
+    lengths[:, WATCH_RECORDS_PER_NIGHT:] = (
+        rng.integers(360, 540, (nights, 2)) * minute
+    )
+    starts = bedtimes[:, None] + offsets
+    sources = np.zeros((nights, per_night), dtype=np.int64)
+    sources[:, WATCH_RECORDS_PER_NIGHT:] = [1, 2]
+    stages = pl.Series(WATCH_STAGES + ["asleep_unspecified"]).gather(
+        np.where(
+            sources == 0,
+            rng.integers(0, len(WATCH_STAGES), (nights, per_night)),
+            len(WATCH_STAGES),
+        ).ravel()
+    )
+
+    return pl.DataFrame(
+        {
+            "date": pl.Series(
+                np.repeat(np.arange(nights), per_night)
+                + (first_night - date(1970, 1, 1)).days,
+                dtype=pl.Int32,
+            ).cast(pl.Date),
+            "sourceName": pl.Series(SOURCES).gather(sources.ravel()),
+            "sleep_stage": stages,
+            "startDate": pl.Series(starts.ravel()).cast(pl.Datetime("us", "UTC")),
+            "endDate": pl.Series((starts + lengths).ravel()).cast(
+                pl.Datetime("us", "UTC")
+            ),
+        }
+    )
+
+
+def naive_sum(intervals: pl.DataFrame) -> pl.DataFrame:
+    """Sum asleep durations per night, counting overlaps once per source."""
+    return (
+        intervals.filter(pl.col("sleep_stage") != "awake")
+        .group_by("date")
+        .agg((pl.col("endDate") - pl.col("startDate")).dt.total_seconds().sum())
+    )
+
+
+def merged_sum(intervals: pl.DataFrame) -> pl.DataFrame:
+    """Sum asleep time on the deduplicated timeline per night."""
+    return (
+        merge_intervals(intervals, PRIORITY)
+        .filter(pl.col("sleep_stage") != "awake")
+        .group_by("date")
+        .agg((pl.col("endDate") - pl.col("startDate")).dt.total_seconds().sum())
+    )
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--intervals", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000]
+    )
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    print(
+        f"{'intervals':>10} {'naive sum':>12} {'merge':>12} "
+        f"{'merged/s':>12} {'overcount':>10}"
+    )
+    for count in args.intervals:
+        intervals = synthetic_intervals(count)
+        naive_ms = _median_ms(lambda: naive_sum(intervals), args.repeat)
+        merge_ms = _median_ms(lambda: merged_sum(intervals), args.repeat)
+        overcount = (
+            naive_sum(intervals)["endDate"].sum()
+            / merged_sum(intervals)["endDate"].sum()
+            - 1
+        )
+        print(
+            f"{len(intervals):>10} {naive_ms:>9.1f} ms {merge_ms:>9.1f} ms "
+            f"{len(intervals) / merge_ms * 1000:>12,.0f} {overcount:>9.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
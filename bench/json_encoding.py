@@ -0,0 +1,79 @@
+"""
+Benchmark JSON encoding of sleep record frames, old path vs native.
+
+"dicts" is how the sleep routes encoded frames before: ``to_dicts()``,
+``jsonable_encoder`` and ``JSONResponse``. "native" is FrameJSONResponse,
+which lets Polars write the JSON from its columns. Both bodies are
+checked to decode to the same rows.
+
+Usage:
+    python -m bench.json_encoding [--rows 1000 10000 100000]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.api.responses import FrameJSONResponse
+
+STAGES = ["asleep_core", "asleep_deep", "asleep_rem", "awake", "in_bed"]
+
+
+def _records_frame(rows: int) -> pl.DataFrame:
+    """Build a frame shaped like sleep_records with ``rows`` rows."""
+    origin = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    starts = [origin + timedelta(minutes=17 * i) for i in range(rows)]
+    return pl.DataFrame(
+        {
+            "id": range(rows),
+            "record_type": ["HKCategoryTypeIdentifierSleepAnalysis"] * rows,
+            "source_name": ["Apple Watch"] * rows,
+            "source_version": ["10.0"] * rows,
+            "creation_date": starts,
+            "start_date": starts,
+            "end_date": [start + timedelta(minutes=15) for start in starts],
+            "value": ["HKCategoryValueSleepAnalysisAsleepCore"] * rows,
+            "sleep_stage": [STAGES[i % len(STAGES)] for i in range(rows)],
+            "duration_minutes": [15] * rows,
+            "date": [start.date() for start in starts],
+        }
+    )
+
+
+def _median_ms(fn, repeat: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn().body
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), body
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>7}  {'dicts ms':>10} {'native ms':>10} {'speedup':>8}  same")
+    for rows in args.rows:
+        df = _records_frame(rows)
+        dicts_ms, dicts_body = _median_ms(
+            lambda: JSONResponse(jsonable_encoder(df.to_dicts())), args.repeat
+        )
+        native_ms, native_body = _median_ms(lambda: FrameJSONResponse(df), args.repeat)
+        same = json.loads(dicts_body) == json.loads(native_body)
+        print(
+            f"{rows:>7}  {dicts_ms:>10.1f} {native_ms:>10.1f} "
+            f"{dicts_ms / native_ms:>7.0f}x  {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark login latency, and the latency of other requests, under a burst.
+
+Starts the API with uvicorn, fires ``--logins`` concurrent logins from
+``--clients`` threads and meanwhile polls /health. While bcrypt ran on the
+event loop every login stalled all other requests for its full duration;
+with the password pool /health stays responsive and logins beyond the
+queue limit are answered with 503 straight away.
+
+Usage:
+    python -m bench.login_concurrency [--logins 64] [--clients 16]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _wait_until_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def _login(base_url: str) -> tuple[int, float]:
+    """Log in once; return the status code and milliseconds taken."""
+    start = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/auth/login",
+        data={"username": "admin@example.com", "password": "admin"},
+    )
+    return response.status_code, (time.perf_counter() - start) * 1000
+
+
+def _poll_health(base_url: str, stop: threading.Event, timings: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        requests.get(f"{base_url}/health")
+        timings.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.01)
+
+
+def _report(label: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{label:>7}: n {len(timings):5d}  p50 {statistics.median(timings):8.1f} ms  "
+        f"p99 {p99:8.1f} ms  max {timings[-1]:8.1f} ms"
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--logins", type=int, default=64)
+    arg_parser.add_argument("--clients", type=int, default=16)
+    arg_parser.add_argument("--port", type=int, default=8766)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "PYTHONPATH": str(PROJECT_ROOT)}
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "backend.api.main:app",
+                "--port", str(args.port), "--log-level", "warning",
+            ],
+            cwd=tmp,
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+
+        try:
+            _wait_until_ready(base_url)
+            _login(base_url)  # warm up
+
+            health_timings: list[float] = []
+            stop = threading.Event()
+            poller = threading.Thread(
+                target=_poll_health, args=(base_url, stop, health_timings)
+            )
+            poller.start()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as clients:
+                results = list(
+                    clients.map(lambda _: _login(base_url), range(args.logins))
+                )
+            elapsed = time.perf_counter() - start
+
+            stop.set()
+            poller.join()
+            pool_stats = requests.get(f"{base_url}/health").json().get("password_pool")
+        finally:
+            server.terminate()
+            server.wait()
+
+    statuses = Counter(code for code, _ in results)
+    print(f"{args.logins} logins from {args.clients} clients in {elapsed:.1f}s")
+    print(f"Status codes: {dict(sorted(statuses.items()))}")
+    _report("login", [ms for code, ms in results if code == 200])
+    _report("health", health_timings)
+    if pool_stats:
+        print(f"Password pool: {pool_stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark multi-process parse scaling across worker counts.
+
+Usage:
+    python -m bench.parse_scaling [--nights N] [--xml PATH] [--workers 1 2 4]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from backend.parsers.healthkit_xml import HealthKitXMLParser
+from backend.parsers.sleep_extractor import SleepExtractor
+from bench.synthetic import write_export
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=2000)
+    arg_parser.add_argument("--xml", type=Path, help="Use an existing export.xml")
+    arg_parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16]
+    )
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = args.xml or write_export(Path(tmp) / "export.xml", nights=args.nights)
+        size_mb = xml_path.stat().st_size / 1e6
+        parser = HealthKitXMLParser(xml_path)
+        print(f"{xml_path}: {size_mb:.1f} MB\n")
+
+        for label, record_type in (
+            ("all records", None),
+            ("sleep only", SleepExtractor.SLEEP_TYPE),
+        ):
+            print(label)
+            reference = None
+            baseline = None
+            for workers in args.workers:
+                start = time.perf_counter()
+                df = parser.parse_records(record_type, workers=workers)
+                elapsed = time.perf_counter() - start
+
+                if reference is None:
+                    reference, baseline = df, elapsed
+                matches = "ok" if df.equals(reference) else "MISMATCH"
+                print(
+                    f"  workers={workers:<3} {elapsed:8.2f}s  "
+                    f"{len(df) / elapsed:12,.0f} rows/s  "
+                    f"speedup {baseline / elapsed:5.2f}x  {matches}"
+                )
+            print()
+
+
+if __name__ == "__main__":
+    main()
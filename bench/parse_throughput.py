@@ -0,0 +1,83 @@
+"""
+Benchmark HealthKit XML parse throughput in records per second.
+
+Usage:
+    python -m bench.parse_throughput [--nights N] [--xml PATH]
+"""
+
+import argparse
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from backend.parsers.healthkit_xml import HealthKitXMLParser
+from backend.parsers.sleep_extractor import SleepExtractor
+from bench.synthetic import write_export
+
+
+def _count_records(xml_path: Path) -> int:
+    parser = HealthKitXMLParser(xml_path)
+    return sum(len(batch) for batch in parser.iter_record_batches())
+
+
+def _elementtree_baseline(xml_path: Path, record_type: str) -> int:
+    """The previous ET.iterparse implementation, kept for comparison."""
+    records = []
+    context = ET.iterparse(xml_path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == "Record":
+            if elem.get("type") == record_type:
+                records.append(dict(elem.attrib))
+            elem.clear()
+            root.clear()
+    return len(records)
+
+
+def _timed(label: str, total_records: int, size_mb: float, fn):
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<24} {elapsed:8.2f}s  {total_records / elapsed:12,.0f} records/s  "
+        f"{size_mb / elapsed:8.1f} MB/s  ({rows:,} rows)"
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=365)
+    arg_parser.add_argument("--xml", type=Path, help="Use an existing export.xml")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = args.xml or write_export(Path(tmp) / "export.xml", nights=args.nights)
+        size_mb = xml_path.stat().st_size / 1e6
+        total = _count_records(xml_path)
+        print(f"{xml_path}: {size_mb:.1f} MB, {total:,} records\n")
+
+        _timed(
+            "elementtree (baseline)",
+            total,
+            size_mb,
+            lambda: _elementtree_baseline(xml_path, SleepExtractor.SLEEP_TYPE),
+        )
+        _timed(
+            "expat, sleep only",
+            total,
+            size_mb,
+            lambda: len(
+                HealthKitXMLParser(xml_path).parse_records(SleepExtractor.SLEEP_TYPE)
+            ),
+        )
+        _timed(
+            "expat, all records",
+            total,
+            size_mb,
+            lambda: len(HealthKitXMLParser(xml_path).parse_records()),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark /api/sleep/records pages against the full listing by history size.
+
+For each history length the full listing (what /records returned before
+pagination) is compared with a first and a middle page fetched by cursor,
+with and without a field projection. Timings include JSON encoding, as
+in the route.
+
+Usage:
+    python -m bench.records_pagination [--nights 365 1825 3650] [--limit 500]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend.api.routes.sleep import _records_response
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+FIELDS = ["start_date", "end_date", "sleep_stage"]
+
+
+def _timed(fn, repeat: int) -> tuple[float, int]:
+    """Return the median milliseconds of ``fn()`` and its body size."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(response.body)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, nargs="+", default=[365, 1825, 3650])
+    arg_parser.add_argument("--limit", type=int, default=500)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    print(
+        f"{'nights':>6} {'records':>8}  {'request':<16} {'median ms':>10} {'body KB':>10}"
+    )
+    for nights in args.nights:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                export = write_export(
+                    Path(tmp) / "export.xml", nights=nights, heart_rate_per_night=0
+                )
+                run_ingest(export)
+                db_pool.open(Path("data/sleep_analysis.duckdb"))
+                with SleepDatabase() as db:
+                    keys = db.get_sleep_records(fields=["start_date", "id"])
+                    middle = keys.row(len(keys) // 2)
+                    cases = {
+                        "full": lambda: _records_response(db, None, None),
+                        "first page": lambda: _records_response(
+                            db, None, None, limit=args.limit
+                        ),
+                        "middle page": lambda: _records_response(
+                            db, None, None, after=middle, limit=args.limit
+                        ),
+                        "middle, 3 fields": lambda: _records_response(
+                            db, None, None, after=middle, limit=args.limit,
+                            fields=FIELDS,
+                        ),
+                    }
+                    for label, fn in cases.items():
+                        repeat = 1 if label == "full" else args.repeat
+                        ms, size = _timed(fn, repeat)
+                        print(
+                            f"{nights:>6} {len(keys):>8}  {label:<16} "
+                            f"{ms:>10.1f} {size / 1024:>10.1f}"
+                        )
+            finally:
+                db_pool.close()
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark cheap-endpoint latency while heavy queries run concurrently.
+
+Starts the API with uvicorn, ingests a synthetic export and measures
+/api/auth/me, first on an idle server and then while ``--heavy`` client
+threads repeatedly fetch every sleep record through /api/sleep/records.
+When routes queried DuckDB on the event loop each heavy request stalled
+all others; with the async database facade cheap requests only wait for
+a free database thread.
+
+Usage:
+    python -m bench.route_concurrency [--nights 1825] [--heavy 2]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from bench.synthetic import write_export
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _wait_until_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def _measure(session: requests.Session, url: str, count: int) -> list[float]:
+    """Request ``url`` ``count`` times; return milliseconds per request."""
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        session.get(url).raise_for_status()
+        timings.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.005)
+    return timings
+
+
+def _hammer(session: requests.Session, url: str, stop: threading.Event, timings: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(url).raise_for_status()
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+def _report(label: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{label:>18}: n {len(timings):5d}  p50 {statistics.median(timings):8.1f} ms  "
+        f"p99 {p99:8.1f} ms"
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--heavy", type=int, default=2)
+    arg_parser.add_argument("--requests", type=int, default=300)
+    arg_parser.add_argument("--port", type=int, default=8767)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export = write_export(
+            Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+        )
+        env = {**os.environ, "PYTHONPATH": str(PROJECT_ROOT)}
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "backend.api.main:app",
+                "--port", str(args.port), "--log-level", "warning",
+            ],
+            cwd=tmp,
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+
+        try:
+            _wait_until_ready(base_url)
+            token = requests.post(
+                f"{base_url}/api/auth/login",
+                data={"username": "admin@example.com", "password": "admin"},
+            ).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            with open(export, "rb") as f:
+                requests.post(
+                    f"{base_url}/api/ingest",
+                    files={"file": ("export.xml", f, "application/xml")},
+                    headers=headers,
+                ).raise_for_status()
+
+            cheap_url = f"{base_url}/api/auth/me"
+            heavy_url = f"{base_url}/api/sleep/records"
+
+            session = requests.Session()
+            session.headers.update(headers)
+            idle = _measure(session, cheap_url, args.requests)
+
+            stop = threading.Event()
+            heavy_timings: list[float] = []
+            hammers = []
+            for _ in range(args.heavy):
+                heavy_session = requests.Session()
+                heavy_session.headers.update(headers)
+                thread = threading.Thread(
+                    target=_hammer, args=(heavy_session, heavy_url, stop, heavy_timings)
+                )
+                thread.start()
+                hammers.append(thread)
+
+            loaded = _measure(session, cheap_url, args.requests)
+            stop.set()
+            for thread in hammers:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    _report("/me idle", idle)
+    _report("/me under load", loaded)
+    _report("/records (heavy)", heavy_timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark multi-night stage reads: raw records vs stored stage rasters.
+
+Ingests a synthetic export, then reads the stages of the last --days
+nights two ways: "records", which loads and sorts every sleep record of
+those nights and rasterizes them, as any per-night analysis had to; and
+"rasters", which loads the run-length encoded rasters stored at ingest
+and decodes them. Both are also timed through to per-night stage
+transitions, and the stored size per night is reported.
+
+Usage:
+    python -m bench.stage_raster [--nights 1825] [--days 180] [--repeat 10]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend.analysis.stage_raster import (
+    build_stage_rasters,
+    decode_stages,
+    stage_transitions,
+)
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--days", type=int, default=180)
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            with SleepDatabase() as db:
+                dates = db.get_stage_rasters()["date"].tail(args.days)
+                first, last = str(dates.min()), str(dates.max())
+                night_dates = dates.to_list()
+
+                def from_records():
+                    return build_stage_rasters(
+                        db.get_sleep_records_for_dates(night_dates)
+                    )
+
+                def from_rasters():
+                    return db.get_stage_rasters(first, last)
+
+                stored = from_rasters()
+                records = len(db.get_sleep_records_for_dates(night_dates))
+                timings = {
+                    "records": _median_ms(
+                        lambda: [decode_stages(s) for s in from_records()["stages"]],
+                        args.repeat,
+                    ),
+                    "rasters": _median_ms(
+                        lambda: [decode_stages(s) for s in from_rasters()["stages"]],
+                        args.repeat,
+                    ),
+                    "records->trans": _median_ms(
+                        lambda: stage_transitions(from_records()), args.repeat
+                    ),
+                    "rasters->trans": _median_ms(
+                        lambda: stage_transitions(from_rasters()), args.repeat
+                    ),
+                }
+        finally:
+            db_pool.close()
+            os.chdir(cwd)
+
+    print(
+        f"nights: {args.nights}, read: {len(stored)}, "
+        f"records/night: {records / len(stored):.1f}, "
+        f"raster bytes/night: {stored['stages'].bin.size().mean():.0f}"
+    )
+    for label, ms in timings.items():
+        print(f"{label:<15} {ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark /api/sleep/stats computed by scanning summaries vs the stats table.
+
+Ingests a synthetic export, then times "scan", which loads every nightly
+summary and averages it with Polars the way /stats used to, against
+"lookup", which reads the maintained sleep_stats rows and also derives
+variance and standard deviation for every window. Also reports how long
+maintaining the table adds to re-ingesting one night.
+
+Usage:
+    python -m bench.stats_lookup [--nights 1825] [--repeat 20]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import polars as pl
+
+from backend.api.routes.sleep import _summary_stats
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def _scan_stats(db: SleepDatabase) -> dict:
+    """Average every nightly summary, as /stats did before sleep_stats."""
+    summary_df = db.get_nightly_summary()
+    return {
+        "total_nights": len(summary_df),
+        "average_sleep_hours": float(summary_df["total_sleep_hours"].mean()),
+        "average_efficiency": float(summary_df["sleep_efficiency_pct"].mean()),
+        "average_rem_pct": float(summary_df["asleep_rem_pct"].drop_nulls().mean()),
+        "average_deep_pct": float(summary_df["asleep_deep_pct"].drop_nulls().mean()),
+        "average_core_pct": float(summary_df["asleep_core_pct"].drop_nulls().mean()),
+    }
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            with SleepDatabase() as db:
+                scan = _scan_stats(db)
+                lookup = _summary_stats(db)
+                same = all(
+                    abs(lookup[key] - value) < 1e-9 for key, value in scan.items()
+                )
+
+                scan_ms = _median_ms(lambda: _scan_stats(db), args.repeat)
+                lookup_ms = _median_ms(lambda: _summary_stats(db), args.repeat)
+
+                # One night rewritten, as a re-import of the latest night does
+                night = db.get_nightly_summary().sort("date").tail(1)
+                night = night.with_columns(
+                    pl.col("source_name").alias("source")
+                ).select(
+                    "date",
+                    "sleep_start",
+                    "sleep_end",
+                    "total_sleep_minutes",
+                    "total_sleep_hours",
+                    "time_in_bed_minutes",
+                    "sleep_efficiency_pct",
+                    "source",
+                )
+                upsert_ms = _median_ms(
+                    lambda: db.insert_nightly_summary(night), args.repeat
+                )
+        finally:
+            db_pool.close()
+            os.chdir(cwd)
+
+    print(f"nights: {args.nights}  same averages: {same}")
+    print(f"scan    {scan_ms:>8.2f} ms")
+    print(f"lookup  {lookup_ms:>8.2f} ms")
+    print(f"one-night upsert with stats upkeep {upsert_ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Synthetic Apple Health export generator for benchmarks.
+"""
+
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!-- HealthKit Export Version: 14 -->
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>
+<!ATTLIST HealthData
+  locale CDATA #REQUIRED
+>
+<!ELEMENT ExportDate EMPTY>
+<!ATTLIST ExportDate
+  value CDATA #REQUIRED
+>
+<!ELEMENT Me EMPTY>
+<!ELEMENT Record (MetadataEntry*)>
+<!ELEMENT MetadataEntry EMPTY>
+<!ELEMENT Correlation (MetadataEntry|Record)*>
+]>
+<HealthData locale="en_US">
+ <ExportDate value="{export_date}"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01" HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexNotSet" HKCharacteristicTypeIdentifierBloodType="HKBloodTypeNotSet"/>
+"""
+
+FOOTER = "</HealthData>\n"
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S -0500"
+
+WATCH = "Jane&#8217;s Apple Watch"
+DEVICE = (
+    "&lt;&lt;HKDevice: 0x600000000000&gt;, name:Apple Watch, manufacturer:Apple Inc., "
+    "model:Watch, hardware:Watch6,1, software:10.0&gt;"
+)
+
+SLEEP_STAGES = (
+    "HKCategoryValueSleepAnalysisAsleepCore",
+    "HKCategoryValueSleepAnalysisAsleepDeep",
+    "HKCategoryValueSleepAnalysisAsleepREM",
+    "HKCategoryValueSleepAnalysisAwake",
+)
+
+
+def _heart_rate(ts: datetime, rng: random.Random) -> str:
+    stamp = ts.strftime(DATE_FORMAT)
+    return (
+        f' <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="{WATCH}" '
+        f'sourceVersion="10.0" device="{DEVICE}" unit="count/min" '
+        f'creationDate="{stamp}" startDate="{stamp}" endDate="{stamp}" '
+        f'value="{rng.randint(50, 110)}">\n'
+        '  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n'
+        " </Record>\n"
+    )
+
+
+def _sleep_night(night: datetime, rng: random.Random) -> list[str]:
+    lines = []
+    cursor = night
+    for _ in range(rng.randint(15, 30)):
+        stage = rng.choice(SLEEP_STAGES)
+        end = cursor + timedelta(minutes=rng.randint(5, 40))
+        created = end + timedelta(hours=8)
+        lines.append(
+            ' <Record type="HKCategoryTypeIdentifierSleepAnalysis" '
+            f'sourceName="{WATCH}" sourceVersion="10.0" device="{DEVICE}" '
+            f'creationDate="{created.strftime(DATE_FORMAT)}" '
+            f'startDate="{cursor.strftime(DATE_FORMAT)}" '
+            f'endDate="{end.strftime(DATE_FORMAT)}" value="{stage}"/>\n'
+        )
+        cursor = end
+    return lines
+
+
+def write_export(
+    path: str | Path,
+    nights: int = 365,
+    heart_rate_per_night: int = 500,
+    seed: int = 0,
+) -> Path:
+    """
+    Write a synthetic export.xml resembling a real Apple Health export.
+
+    Every night contributes one sleep session interleaved with heart-rate
+    records (each carrying a MetadataEntry child) and a blood pressure
+    Correlation, so parsers see the same nesting as a real export.
+
+    Args:
+        path: Destination file
+        nights: Number of nights of data
+        heart_rate_per_night: Non-sleep records written per night
+        seed: Random seed for reproducible output
+
+    Returns:
+        Path to the written file
+    """
+    rng = random.Random(seed)
+    path = Path(path)
+    start = datetime(2020, 1, 1, 22, 30)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER.format(export_date=start.strftime(DATE_FORMAT)))
+        for day in range(nights):
+            night = start + timedelta(days=day)
+            day_start = night - timedelta(hours=14)
+            step = timedelta(hours=14) / max(heart_rate_per_night, 1)
+            for i in range(heart_rate_per_night):
+                f.write(_heart_rate(day_start + step * i, rng))
+            stamp = day_start.strftime(DATE_FORMAT)
+            f.write(
+                ' <Correlation type="HKCorrelationTypeIdentifierBloodPressure" '
+                f'sourceName="{WATCH}" creationDate="{stamp}" startDate="{stamp}" '
+                f'endDate="{stamp}">\n'
+                '  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" '
+                f'sourceName="{WATCH}" unit="mmHg" creationDate="{stamp}" '
+                f'startDate="{stamp}" endDate="{stamp}" value="120"/>\n'
+                " </Correlation>\n"
+            )
+            f.writelines(_sleep_night(night, rng))
+        f.write(FOOTER)
+
+    return path
+
+
+def write_export_of_size(path: str | Path, target_bytes: int, seed: int = 0) -> Path:
+    """
+    Write a synthetic export.xml of at least ``target_bytes`` bytes.
+
+    Args:
+        path: Destination file
+        target_bytes: Minimum file size
+        seed: Random seed for reproducible output
+
+    Returns:
+        Path to the written file
+    """
+    # One night with the default record mix is roughly 250 KB
+    nights = max(1, target_bytes // 250_000 + 1)
+    return write_export(path, nights=nights, seed=seed)
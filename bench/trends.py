@@ -0,0 +1,81 @@
+"""
+Benchmark sleep trends: client-side rolling vs the maintained trends table.
+
+Ingests a synthetic export, then times "client", which loads every
+nightly summary and computes 7/30/90-day moving averages with Polars the
+way a dashboard had to, against "table", which reads sleep_trends. Also
+times keeping the table current: a full rebuild versus rewriting the
+tail after one new night.
+
+Usage:
+    python -m bench.trends [--nights 1825] [--repeat 10]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import polars as pl
+
+from backend.database.sleep_db import SleepDatabase, db_pool
+from backend.ingest.pipeline import run_ingest
+from bench.synthetic import write_export
+
+
+def _client_trends(db: SleepDatabase) -> pl.DataFrame:
+    """Compute moving averages from every summary row."""
+    summary_df = db.get_nightly_summary().sort("date")
+    return summary_df.rolling("date", period="90d").agg(
+        pl.col("total_sleep_hours").mean().alias("sleep_hours_90d"),
+        pl.col("sleep_efficiency_pct").mean().alias("efficiency_90d"),
+    )
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--nights", type=int, default=1825)
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            export = write_export(
+                Path(tmp) / "export.xml", nights=args.nights, heart_rate_per_night=0
+            )
+            run_ingest(export)
+            db_pool.open(Path("data/sleep_analysis.duckdb"))
+            with SleepDatabase() as db:
+                last_night = db.get_nightly_summary()["date"].max()
+                timings = {
+                    "client": _median_ms(lambda: _client_trends(db), args.repeat),
+                    "table": _median_ms(db.get_sleep_trends, args.repeat),
+                    "full rebuild": _median_ms(db.update_sleep_trends, args.repeat),
+                    "tail update": _median_ms(
+                        lambda: db.update_sleep_trends(last_night), args.repeat
+                    ),
+                }
+        finally:
+            db_pool.close()
+            os.chdir(cwd)
+
+    print(f"nights: {args.nights}")
+    for label, ms in timings.items():
+        print(f"{label:<13} {ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,61 @@ export interface SleepRecord {
 	sleep_stage: string;
 	duration_minutes: number;
 	date: string;
+	utc_offset_minutes?: number | null;
+}
+
+export interface StageSegment {
+	sequence_order: number;
+	sleep_stage: string;
+	start_time: string;
+	end_time: string;
+	duration_minutes: number;
+}
+
+export interface SleepTrend {
+	date: string;
+	nights_7d: number;
+	sleep_hours_7d: number;
+	sleep_hours_30d: number;
+	sleep_hours_90d: number;
+	efficiency_7d: number;
+	efficiency_30d: number;
+	efficiency_90d: number;
+	bedtime_7d: number;
+	bedtime_30d: number;
+	bedtime_stddev_7d_minutes: number | null;
+	bedtime_stddev_30d_minutes: number | null;
+	wake_time_stddev_30d_minutes: number | null;
+	sleep_debt_7d_hours: number;
+	sleep_debt_total_hours: number;
+}
+
+export interface StageTransitions {
+	date: string;
+	stage_transitions: number;
+	awakenings: number;
+	wake_after_sleep_onset_minutes: number;
+}
+
+export interface CircadianNight {
+	date: string;
+	asleep_minutes: number;
+	sleep_midpoint_hour: number | null;
+	sleep_regularity: number | null;
+}
+
+export interface CircadianSummary {
+	start_date: string;
+	end_date: string;
+	nights_with_sleep: number;
+	sleep_regularity_index: number | null;
+	sleep_midpoint_hour: number | null;
+	workday_midpoint_hour: number | null;
+	free_day_midpoint_hour: number | null;
+	social_jetlag_hours: number | null;
+	chronotype_midpoint_hour: number | null;
+	chronotype: 'early' | 'intermediate' | 'late' | null;
+	nights: CircadianNight[];
 }
 
 export interface NightlySummary {
@@ -26,6 +81,8 @@ export interface NightlySummary {
 	date: string;
 	sleep_start: string;
 	sleep_end: string;
+	sleep_start_local?: string | null;
+	sleep_end_local?: string | null;
 	total_sleep_minutes: number;
 	total_sleep_hours: number;
 	time_in_bed_minutes: number;
@@ -39,6 +96,8 @@ export interface NightlySummary {
 	asleep_deep_pct?: number;
 	asleep_rem_pct?: number;
 	awake_pct?: number;
+	sleep_midpoint_hour?: number | null;
+	sleep_regularity?: number | null;
 	created_at: string;
 	updated_at: string;
 }
@@ -151,6 +210,59 @@ export async function getSleepRecords(
 	return apiFetch<SleepRecord[]>(`/api/sleep/records${query}`);
 }
 
+/**
+ * Get one night's hypnogram as ordered, non-overlapping stage segments.
+ */
+export async function getHypnogram(date: string): Promise<StageSegment[]> {
+	const params = new URLSearchParams({ date });
+	return apiFetch<StageSegment[]>(`/api/sleep/hypnogram?${params.toString()}`);
+}
+
+/**
+ * Get rolling 7/30/90-day sleep trends, one row per night.
+ */
+export async function getSleepTrends(
+	startDate?: string,
+	endDate?: string
+): Promise<SleepTrend[]> {
+	const params = new URLSearchParams();
+	if (startDate) params.append('start_date', startDate);
+	if (endDate) params.append('end_date', endDate);
+
+	const query = params.toString() ? `?${params.toString()}` : '';
+	return apiFetch<SleepTrend[]>(`/api/sleep/trends${query}`);
+}
+
+/**
+ * Get stage transitions, awakenings and wake after sleep onset per night.
+ */
+export async function getStageTransitions(
+	startDate?: string,
+	endDate?: string
+): Promise<StageTransitions[]> {
+	const params = new URLSearchParams();
+	if (startDate) params.append('start_date', startDate);
+	if (endDate) params.append('end_date', endDate);
+
+	const query = params.toString() ? `?${params.toString()}` : '';
+	return apiFetch<StageTransitions[]>(`/api/sleep/transitions${query}`);
+}
+
+/**
+ * Get sleep regularity, midpoints, social jetlag and chronotype over a range.
+ */
+export async function getCircadianSummary(
+	startDate?: string,
+	endDate?: string
+): Promise<CircadianSummary> {
+	const params = new URLSearchParams();
+	if (startDate) params.append('start_date', startDate);
+	if (endDate) params.append('end_date', endDate);
+
+	const query = params.toString() ? `?${params.toString()}` : '';
+	return apiFetch<CircadianSummary>(`/api/sleep/circadian${query}`);
+}
+
 /**
  * Get sleep statistics.
  */
@@ -24,15 +24,18 @@ def load_benchmarks_from_toml(toml_path: str | Path):
     metrics = config.get("metrics", {})
 
     for metric_name, metric_data in metrics.items():
+        # Nights are scored against [optimal_min, optimal_max]: "at least"
+        # thresholds are lower bounds and "at most" limits upper bounds
         benchmark = {
             "metric_name": metric_name,
             "optimal_min": metric_data.get("optimal_min_hours")
             or metric_data.get("target_percentage_min")
             or metric_data.get("optimal_start_hour")
-            or metric_data.get("optimal_max_minutes"),
+            or metric_data.get("optimal_threshold"),
             "optimal_max": metric_data.get("optimal_max_hours")
             or metric_data.get("target_percentage_max")
-            or metric_data.get("optimal_end_hour"),
+            or metric_data.get("optimal_end_hour")
+            or metric_data.get("optimal_max_minutes"),
             "good_threshold": metric_data.get("good_threshold_hours")
             or metric_data.get("good_threshold")
             or metric_data.get("optimal_threshold")
@@ -50,8 +53,17 @@ def load_benchmarks_from_toml(toml_path: str | Path):
 
     # Insert into database
     with SleepDatabase() as db:
-        inserted = db.insert_benchmarks(benchmarks)
-        print(f"Inserted {inserted} benchmarks into database")
+        with db.transaction():
+            inserted = db.insert_benchmarks(benchmarks)
+            print(f"Inserted {inserted} benchmarks into database")
+
+            # Rescore stored nights against the new benchmarks; ingest
+            # scores nights imported later
+            scored = db.update_sleep_metrics()
+            print(f"Scored {scored} night metrics against the benchmarks")
+
+            # Invalidates benchmark and score responses cached by the API
+            db.bump_data_version()
 
     return benchmarks
 
@@ -0,0 +1,76 @@
+"""
+Shared fixtures: every test gets its own encrypted database file.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+# Settings are read at import time, so point them away from ./data before
+# anything from backend is imported
+_session_dir = Path(tempfile.mkdtemp(prefix="sleep-tests-"))
+os.environ.setdefault("DB_PATH", str(_session_dir / "session.duckdb"))
+os.environ.setdefault("STAGING_DIR", str(_session_dir / "staging"))
+os.environ.setdefault("DUCKDB_ENCRYPTION_KEY", "dGVzdC1rZXktdGVzdC1rZXktdGVzdC1rZXktMDA=")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.analysis import circadian  # noqa: E402
+from backend.api import caching  # noqa: E402
+from backend.api.main import app  # noqa: E402
+from backend.auth import users  # noqa: E402
+from backend.config.settings import settings  # noqa: E402
+from backend.database.async_db import async_db  # noqa: E402
+from backend.database.sleep_db import SleepDatabase  # noqa: E402
+from bench.synthetic import write_export  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch) -> Path:
+    """Point SleepDatabase, async_db and the app at a fresh database file."""
+    path = tmp_path / "sleep.duckdb"
+    monkeypatch.setattr(settings, "db_path", path)
+    monkeypatch.setattr(async_db, "db_path", path)
+    monkeypatch.setattr(SleepDatabase.__init__, "__defaults__", (path,))
+
+    # In-process caches are keyed by data version, which restarts at 0 in
+    # every new database
+    monkeypatch.setattr(caching, "_latest_version", -1)
+    caching._response_cache.clear()
+    circadian._raster_cache.clear()
+    users._principal_cache.clear()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    """Open SleepDatabase on the test's database."""
+    with SleepDatabase() as database:
+        yield database
+
+
+@pytest.fixture
+def export_file(tmp_path):
+    """Write a synthetic export.xml of some nights, see bench.synthetic."""
+
+    def write(nights: int = 10, seed: int = 0, name: str = "export.xml") -> Path:
+        return write_export(
+            tmp_path / name, nights=nights, heart_rate_per_night=20, seed=seed
+        )
+
+    return write
+
+
+@pytest.fixture
+def client(db_path):
+    """Test client logged in as the default user."""
+    users.create_default_user()
+    with TestClient(app) as test_client:
+        token = test_client.post(
+            "/api/auth/login",
+            data={"username": "admin@example.com", "password": "admin"},
+        ).json()["access_token"]
+        test_client.headers["Authorization"] = f"Bearer {token}"
+        yield test_client
+
@@ -0,0 +1,31 @@
+"""
+Tests for authentication of API requests.
+"""
+
+from backend.database.async_db import async_db
+
+
+def test_cached_principal_skips_the_database_threads(client, monkeypatch):
+    assert client.get("/api/auth/me").status_code == 200
+
+    calls = []
+    original = async_db.call
+
+    async def counting_call(fn, *args, **kwargs):
+        calls.append(fn.__name__)
+        return await original(fn, *args, **kwargs)
+
+    monkeypatch.setattr(async_db, "call", counting_call)
+    response = client.get("/api/auth/me")
+
+    assert response.status_code == 200
+    assert response.json()["username"] == "admin@example.com"
+    assert calls == []
+
+
+def test_unknown_token_is_rejected(client):
+    response = client.get(
+        "/api/auth/me", headers={"Authorization": "Bearer not-a-token"}
+    )
+
+    assert response.status_code == 401
@@ -0,0 +1,106 @@
+"""
+Tests for the minute raster and the circadian metrics stored from it.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from backend.analysis.circadian import (
+    MINUTES_PER_DAY,
+    SleepRaster,
+    _recompute_ranges,
+    nightly_circadian,
+    update_circadian_metrics,
+)
+from backend.ingest.pipeline import run_ingest
+
+
+def stored_circadian(db) -> pl.DataFrame:
+    return db.conn.execute(
+        """
+        SELECT date, asleep_minutes, sleep_midpoint_hour, sleep_regularity
+        FROM sleep_circadian
+        ORDER BY date
+        """
+    ).pl()
+
+
+def day(*asleep: tuple[int, int]) -> np.ndarray:
+    """One raster row, asleep over the given (start, end) clock hours."""
+    row = np.zeros(MINUTES_PER_DAY, dtype=bool)
+    for start, end in asleep:
+        row[start * 60 : end * 60] = True
+    return row
+
+
+def test_sleep_regularity_of_a_hand_built_raster():
+    raster = SleepRaster(
+        first_day=date(2024, 1, 1),
+        asleep=np.stack(
+            [
+                day((0, 7), (23, 24)),
+                day((0, 7), (23, 24)),
+                # An hour later: 0-1, 7-8 and 23-24 differ from the day before
+                day((1, 8)),
+                day(),
+            ]
+        ),
+        observed=np.array([True, True, True, False]),
+    )
+
+    nights = nightly_circadian(raster)
+
+    assert nights["date"].to_list() == [
+        date(2024, 1, 2),
+        date(2024, 1, 3),
+        date(2024, 1, 4),
+    ]
+    # 200 * share of minutes in the same state as a day earlier - 100
+    assert nights["sleep_regularity"].to_list() == [
+        100.0,
+        pytest.approx(200 * (1440 - 180) / 1440 - 100),
+        None,
+    ]
+    # Noon-to-noon windows: 23:00-07:00, then 23:00-24:00 and 01:00-08:00
+    assert nights["asleep_minutes"].to_list() == [480, 480, 0]
+    assert nights["sleep_midpoint_hour"].to_list()[:2] == [
+        pytest.approx(3.0, abs=0.01),
+        pytest.approx(3.875, abs=0.01),
+    ]
+    assert nights["sleep_midpoint_hour"][2] is None
+
+
+def test_recompute_ranges_cover_only_the_neighbours_of_changed_nights():
+    nights = [date(2024, 1, 20), date(2024, 1, 10), date(2024, 1, 11)]
+
+    assert _recompute_ranges(nights) == [
+        (date(2024, 1, 9), date(2024, 1, 13)),
+        (date(2024, 1, 19), date(2024, 1, 22)),
+    ]
+    # Ranges that only touch are merged as well
+    assert _recompute_ranges([date(2024, 1, 1), date(2024, 1, 5)]) == [
+        (date(2023, 12, 31), date(2024, 1, 7)),
+    ]
+
+
+def test_scattered_nights_recompute_only_their_neighbours(db, export_file):
+    run_ingest(export_file(nights=30))
+    full = stored_circadian(db)
+    nights = sorted(full["date"].to_list())
+    changed = [nights[3], nights[20]]
+
+    db.conn.execute("DELETE FROM sleep_circadian")
+    update_circadian_metrics(db, changed)
+
+    recomputed = stored_circadian(db)
+    expected_days = {
+        night + timedelta(days=offset)
+        for night in changed
+        for offset in range(-1, 3)
+    }
+    assert set(recomputed["date"].to_list()) <= expected_days
+    assert recomputed.equals(full.filter(pl.col("date").is_in(sorted(expected_days))))
+    assert len(recomputed) >= len(changed)
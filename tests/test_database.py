@@ -0,0 +1,72 @@
+"""
+Tests for the pooled database connections.
+"""
+
+import threading
+
+import duckdb
+import pytest
+
+from backend.database.sleep_db import SleepDatabase, db_pool
+
+
+def reattach():
+    """Detach the file so its rows are read back from disk, as after a restart."""
+    db_pool.close()
+
+
+def in_thread(fn):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_profile_update_is_seen_after_reattach(db_path):
+    with SleepDatabase() as db:
+        db.create_user("ann@example.com", "hash")
+    reattach()
+
+    # The names were NULL on disk; index lookups used to keep returning
+    # NULL until the next checkpoint
+    with SleepDatabase() as db:
+        db.update_user_profile("ann@example.com", first_name="Ann")
+        assert db.get_user("ann@example.com")["first_name"] == "Ann"
+
+    def read_elsewhere():
+        with SleepDatabase() as db:
+            return db.get_user("ann@example.com")["first_name"]
+
+    assert in_thread(read_elsewhere) == "Ann"
+
+
+def test_ingest_job_outcome_is_seen_after_reattach(db_path):
+    with SleepDatabase() as db:
+        db.create_ingest_job("job-1", "ann@example.com", "export.zip", 100)
+    reattach()
+
+    with SleepDatabase() as db:
+        db.update_ingest_job("job-1", status="succeeded", error="none")
+        job = db.get_ingest_job("job-1")
+
+    assert job["status"] == "succeeded"
+    assert job["error"] == "none"
+
+
+def test_cursors_of_exited_threads_are_closed(db_path):
+    db_pool.open(db_path)
+
+    def borrow():
+        with SleepDatabase() as db:
+            return db.conn
+
+    cursors = [in_thread(borrow) for _ in range(5)]
+
+    with SleepDatabase() as db:
+        attachment = db_pool._attachments[db_path.resolve()]
+        assert list(attachment.cursors.values()) == [db.conn]
+    for cursor in cursors:
+        with pytest.raises(duckdb.ConnectionException):
+            cursor.execute("SELECT 1")
+    db_pool.close()
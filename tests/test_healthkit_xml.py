@@ -0,0 +1,90 @@
+"""
+Tests for sharded and archived parsing of HealthKit exports.
+"""
+
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+import pytest
+
+from backend.parsers import healthkit_xml
+from backend.parsers.healthkit_xml import (
+    HealthKitXMLParser,
+    parse_shard,
+    plan_shards,
+)
+
+SLEEP_TYPE = "HKCategoryTypeIdentifierSleepAnalysis"
+
+
+def sequential(path) -> pl.DataFrame:
+    return pl.concat(HealthKitXMLParser(path).iter_record_batches())
+
+
+@pytest.mark.parametrize("shards", [2, 3, 7, 50])
+def test_shards_cover_the_body_on_top_level_records(export_file, shards):
+    path = export_file(nights=12)
+    data = path.read_bytes()
+
+    ranges = plan_shards(path, shards)
+
+    assert 1 < len(ranges) <= shards
+    assert ranges[0][0] == data.index(b">", data.index(b"<HealthData")) + 1
+    assert ranges[-1][1] == data.rindex(b"</HealthData>")
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    for start, _ in ranges[1:]:
+        assert data.startswith(b"<Record ", start)
+        # Never inside a Correlation, whose Records are not top level
+        assert data.rfind(b"<Correlation", 0, start) <= data.rfind(
+            b"</Correlation>", 0, start
+        )
+
+
+@pytest.mark.parametrize("shards", [2, 5, 16])
+def test_sharded_parse_matches_sequential_parse(export_file, shards):
+    path = export_file(nights=12)
+
+    parsed = pl.concat(
+        [parse_shard(path, start, end) for start, end in plan_shards(path, shards)]
+    )
+
+    assert parsed.equals(sequential(path))
+
+
+def test_parallel_parse_records_matches_single_worker(export_file, monkeypatch):
+    path = export_file(nights=6)
+    single = HealthKitXMLParser(path).parse_records(SLEEP_TYPE)
+
+    # Let a small export be split between worker processes
+    monkeypatch.setattr(healthkit_xml, "MIN_SHARD_SIZE", 1)
+    assert len(plan_shards(path, 3)) == 3
+    parallel = HealthKitXMLParser(path).parse_records(SLEEP_TYPE, workers=3)
+
+    assert len(single) > 0
+    assert parallel.equals(single)
+
+
+def test_archived_export_parses_like_plain_export(export_file, tmp_path):
+    path = export_file(nights=5)
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(path, "apple_health_export/export.xml")
+
+    plain = HealthKitXMLParser(path)
+    zipped = HealthKitXMLParser(archive)
+
+    assert zipped.size == plain.size
+    assert zipped.parse_records(SLEEP_TYPE).equals(plain.parse_records(SLEEP_TYPE))
+
+
+def test_header_is_read_without_parsing_records(export_file):
+    parser = HealthKitXMLParser(export_file(nights=3))
+
+    assert parser.get_export_date() == datetime(
+        2020, 1, 1, 22, 30, tzinfo=timezone(-timedelta(hours=5))
+    )
+    assert parser.get_me_data()["HKCharacteristicTypeIdentifierDateOfBirth"] == (
+        "1990-01-01"
+    )
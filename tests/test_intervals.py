@@ -0,0 +1,208 @@
+"""
+Tests for the shared overlap policy and the stage rasters painted from it.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import polars as pl
+
+from backend.analysis.intervals import merge_intervals
+from backend.analysis.stage_raster import (
+    EPOCH_SECONDS,
+    MAX_RUN_EPOCHS,
+    STAGE_CODES,
+    build_stage_rasters,
+    decode_stages,
+    encode_stages,
+)
+
+NIGHT = date(2024, 3, 1)
+BEDTIME = datetime(2024, 3, 1, 22, 0, tzinfo=timezone.utc)
+
+
+def records(*rows: tuple[str, str, int, int]) -> pl.DataFrame:
+    """Build sleep records from (source, stage, start, end) in minutes."""
+    return pl.DataFrame(
+        {
+            "date": [NIGHT] * len(rows),
+            "sourceName": [source for source, _, _, _ in rows],
+            "sleep_stage": [stage for _, stage, _, _ in rows],
+            "startDate": [BEDTIME + timedelta(minutes=start) for _, _, start, _ in rows],
+            "endDate": [BEDTIME + timedelta(minutes=end) for _, _, _, end in rows],
+        },
+        schema_overrides={
+            "startDate": pl.Datetime("us", "UTC"),
+            "endDate": pl.Datetime("us", "UTC"),
+        },
+    )
+
+
+def pieces(timeline: pl.DataFrame) -> list[tuple[str, str, int, int]]:
+    """Render a timeline as (source, stage, start, end) in minutes."""
+    return [
+        (
+            row["sourceName"],
+            row["sleep_stage"],
+            int((row["startDate"] - BEDTIME).total_seconds() // 60),
+            int((row["endDate"] - BEDTIME).total_seconds() // 60),
+        )
+        for row in timeline.iter_rows(named=True)
+    ]
+
+
+def test_merge_counts_overlapping_sleep_once():
+    timeline = merge_intervals(
+        records(
+            ("Apple Watch", "asleep_core", 0, 60),
+            ("Apple Watch", "asleep_deep", 60, 120),
+            ("iPhone", "asleep_unspecified", 30, 150),
+        ),
+        ["Watch", "iPhone"],
+    )
+
+    # Watch stages win where they overlap; the phone only fills the gap
+    assert pieces(timeline) == [
+        ("Apple Watch", "asleep_core", 0, 60),
+        ("Apple Watch", "asleep_deep", 60, 120),
+        ("iPhone", "asleep_unspecified", 120, 150),
+    ]
+
+
+def test_merge_prefers_measured_stages_over_source_priority():
+    timeline = merge_intervals(
+        records(
+            ("AutoSleep", "asleep_rem", 0, 90),
+            ("Apple Watch", "asleep_unspecified", 0, 90),
+            ("Apple Watch", "in_bed", -30, 120),
+        ),
+        ["Watch"],
+    )
+
+    assert pieces(timeline) == [
+        ("Apple Watch", "in_bed", -30, 0),
+        ("AutoSleep", "asleep_rem", 0, 90),
+        ("Apple Watch", "in_bed", 90, 120),
+    ]
+
+
+def test_merge_uses_source_priority_within_a_tier():
+    rows = (
+        ("iPhone", "asleep_core", 0, 60),
+        ("Apple Watch", "asleep_core", 30, 90),
+    )
+
+    assert pieces(merge_intervals(records(*rows), ["Watch", "iPhone"])) == [
+        ("iPhone", "asleep_core", 0, 30),
+        ("Apple Watch", "asleep_core", 30, 90),
+    ]
+    assert pieces(merge_intervals(records(*rows), ["iPhone", "Watch"])) == [
+        ("iPhone", "asleep_core", 0, 60),
+        ("Apple Watch", "asleep_core", 60, 90),
+    ]
+
+
+def test_merge_joins_adjacent_pieces_and_drops_empty_records():
+    timeline = merge_intervals(
+        records(
+            ("Apple Watch", "asleep_core", 0, 30),
+            ("Apple Watch", "asleep_core", 30, 60),
+            ("Apple Watch", "asleep_rem", 45, 45),
+            ("Apple Watch", "unknown", 60, 90),
+        )
+    )
+
+    assert pieces(timeline) == [("Apple Watch", "asleep_core", 0, 60)]
+
+
+def test_merge_of_random_records_covers_their_union_without_overlaps():
+    rng = np.random.default_rng(7)
+    stages = list(STAGE_CODES)
+    rows = []
+    for _ in range(300):
+        start = int(rng.integers(0, 600))
+        rows.append(
+            (
+                str(rng.choice(["Apple Watch", "iPhone", "AutoSleep"])),
+                str(rng.choice(stages)),
+                start,
+                start + int(rng.integers(1, 60)),
+            )
+        )
+
+    timeline = pieces(merge_intervals(records(*rows), ["Watch", "iPhone"]))
+
+    covered = np.zeros(700, dtype=bool)
+    for _, _, start, end in rows:
+        covered[start:end] = True
+    merged = np.zeros(700, dtype=int)
+    for _, _, start, end in timeline:
+        merged[start:end] += 1
+    assert (merged == covered).all()
+    assert [start for _, _, start, _ in timeline] == sorted(
+        start for _, _, start, _ in timeline
+    )
+
+
+def test_encode_stages_round_trips():
+    rng = np.random.default_rng(0)
+    stages = np.repeat(
+        rng.integers(0, 7, 200).astype(np.uint8), rng.integers(1, 50, 200)
+    )
+
+    assert (decode_stages(encode_stages(stages)) == stages).all()
+    assert decode_stages(encode_stages(np.array([], dtype=np.uint8))).size == 0
+
+
+def test_encode_stages_splits_runs_longer_than_a_uint16():
+    stages = np.concatenate(
+        [
+            np.full(2 * MAX_RUN_EPOCHS + 5, STAGE_CODES["asleep_core"], np.uint8),
+            np.full(3, STAGE_CODES["awake"], np.uint8),
+        ]
+    )
+
+    blob = encode_stages(stages)
+
+    assert len(blob) == 4 * 3
+    assert (decode_stages(blob) == stages).all()
+
+
+def test_stage_raster_paints_the_merged_timeline():
+    night = records(
+        ("Apple Watch", "asleep_core", 0, 60),
+        ("Apple Watch", "awake", 60, 65),
+        ("Apple Watch", "asleep_rem", 65, 120),
+        ("iPhone", "asleep_unspecified", 30, 150),
+    )
+
+    raster = build_stage_rasters(night, ["Watch"]).row(0, named=True)
+    stages = decode_stages(raster["stages"])
+
+    epochs_per_minute = 60 // EPOCH_SECONDS
+    expected = np.zeros(150 * epochs_per_minute, dtype=np.uint8)
+    for _, stage, start, end in pieces(merge_intervals(night, ["Watch"])):
+        expected[start * epochs_per_minute:end * epochs_per_minute] = STAGE_CODES[
+            stage
+        ]
+    assert raster["date"] == NIGHT
+    assert raster["start_time"] == BEDTIME
+    assert raster["epochs"] == len(expected)
+    assert (stages == expected).all()
+
+
+def test_stage_rasters_round_trip_through_the_database(db):
+    night = records(
+        ("Apple Watch", "asleep_core", 0, 200),
+        ("Apple Watch", "asleep_deep", 200, 260),
+    )
+    rasters = build_stage_rasters(night)
+
+    db.replace_stage_rasters([NIGHT], rasters)
+    stored = db.get_stage_rasters(NIGHT, NIGHT)
+
+    assert stored["date"].to_list() == [NIGHT]
+    assert stored["epochs"].to_list() == rasters["epochs"].to_list()
+    assert (
+        decode_stages(stored["stages"][0]) == decode_stages(rasters["stages"][0])
+    ).all()
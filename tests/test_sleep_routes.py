@@ -0,0 +1,223 @@
+"""
+Tests for the sleep read endpoints.
+"""
+
+import pytest
+
+from backend.database.async_db import async_db
+from backend.database.sleep_db import SleepDatabase
+from backend.ingest.pipeline import run_ingest
+
+
+@pytest.fixture
+def ingested(client, export_file):
+    """Client with a few nights of synthetic sleep data stored."""
+    run_ingest(export_file(nights=6))
+    return client
+
+
+def test_records_pages_follow_the_cursor_through_every_record(ingested):
+    everything = ingested.get("/api/sleep/records").json()
+
+    paged = []
+    response = ingested.get("/api/sleep/records", params={"limit": 7})
+    while True:
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 7
+        paged.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = ingested.get(
+            "/api/sleep/records", params={"limit": 7, "cursor": cursor}
+        )
+
+    assert len(everything) > 7
+    assert [record["id"] for record in paged] == [
+        record["id"] for record in everything
+    ]
+
+
+def test_records_pages_keep_ties_in_id_order(ingested):
+    with SleepDatabase() as db:
+        # Give every record of the first night the same start time
+        db.conn.execute(
+            """
+            UPDATE sleep_records
+            SET start_date = (SELECT MIN(start_date) FROM sleep_records)
+            WHERE date = (SELECT MIN(date) FROM sleep_records)
+            """
+        )
+        db.bump_data_version()
+        expected = db.conn.execute(
+            "SELECT id FROM sleep_records ORDER BY start_date, id"
+        ).fetchall()
+
+    ids = []
+    cursor = None
+    while True:
+        params = {"limit": 3, "fields": "id"}
+        if cursor:
+            params["cursor"] = cursor
+        response = ingested.get("/api/sleep/records", params=params)
+        ids.extend(record["id"] for record in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert ids == [record_id for (record_id,) in expected]
+
+
+def test_records_page_with_filters_and_fields(ingested):
+    response = ingested.get(
+        "/api/sleep/records",
+        params={
+            "start_date": "2020-01-03",
+            "end_date": "2020-01-04",
+            "limit": 5,
+            "fields": "date,sleep_stage",
+        },
+    )
+
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page) == 5
+    assert set(page[0]) == {"date", "sleep_stage"}
+    assert all("2020-01-03" <= record["date"] <= "2020-01-04" for record in page)
+
+
+@pytest.mark.parametrize(
+    "params, status",
+    [
+        ({"cursor": "not-a-cursor"}, 400),
+        ({"limit": 0}, 422),
+        ({"fields": "id,password"}, 400),
+        ({"start_date": "abc"}, 422),
+        ({"end_date": "2020-01-05' OR '1'='1"}, 422),
+    ],
+)
+def test_records_rejects_bad_parameters(ingested, params, status):
+    assert ingested.get("/api/sleep/records", params=params).status_code == status
+
+
+def test_summary_rejects_malformed_dates(ingested):
+    response = ingested.get("/api/sleep/summary", params={"start_date": "abc"})
+
+    assert response.status_code == 422
+
+
+def test_hypnogram_of_a_night(ingested):
+    response = ingested.get("/api/sleep/hypnogram", params={"date": "2020-01-03"})
+
+    assert response.status_code == 200
+    segments = response.json()
+    assert segments
+    assert [segment["sequence_order"] for segment in segments] == sorted(
+        segment["sequence_order"] for segment in segments
+    )
+
+
+@pytest.mark.parametrize("params", [{}, {"date": "abc"}, {"date": "2020-02-30"}])
+def test_hypnogram_rejects_missing_or_malformed_dates(ingested, params):
+    assert ingested.get("/api/sleep/hypnogram", params=params).status_code == 422
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/sleep/summary",
+        "/api/sleep/records",
+        "/api/sleep/trends",
+        "/api/sleep/stats",
+    ],
+)
+def test_matching_etag_gets_not_modified(ingested, path):
+    first = ingested.get(path)
+    etag = first.headers["ETag"]
+
+    revalidated = ingested.get(path, headers={"If-None-Match": etag})
+    weak = ingested.get(path, headers={"If-None-Match": f'"other", W/{etag}'})
+
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+    assert weak.status_code == 304
+
+
+def test_etag_varies_with_query_and_format(ingested):
+    arrow = {"Accept": "application/vnd.apache.arrow.stream"}
+    summary = ingested.get("/api/sleep/summary").headers["ETag"]
+    filtered = ingested.get(
+        "/api/sleep/summary", params={"start_date": "2020-01-03"}
+    ).headers["ETag"]
+    as_arrow = ingested.get("/api/sleep/summary", headers=arrow).headers["ETag"]
+
+    # The JSON body's tag does not revalidate the Arrow body
+    revalidated = ingested.get(
+        "/api/sleep/summary", headers={**arrow, "If-None-Match": summary}
+    )
+
+    assert len({summary, filtered, as_arrow}) == 3
+    assert revalidated.status_code == 200
+
+
+def test_etag_changes_when_another_connection_bumps_the_version(ingested):
+    first = ingested.get("/api/sleep/summary")
+
+    # As load_benchmarks.py or another worker process would
+    with SleepDatabase() as db:
+        db.bump_data_version()
+
+    stale = ingested.get(
+        "/api/sleep/summary", headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert stale.status_code == 200
+    assert stale.headers["ETag"] != first.headers["ETag"]
+    assert stale.json() == first.json()
+
+
+def test_ingest_invalidates_cached_responses(ingested, export_file):
+    before = ingested.get("/api/sleep/summary")
+
+    run_ingest(export_file(nights=9, name="later.xml"))
+    after = ingested.get(
+        "/api/sleep/summary", headers={"If-None-Match": before.headers["ETag"]}
+    )
+
+    assert after.status_code == 200
+    assert len(after.json()) > len(before.json())
+
+
+def test_not_modified_and_cached_responses_skip_the_database(ingested, monkeypatch):
+    first = ingested.get("/api/sleep/summary")
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("queried the database")
+
+    monkeypatch.setattr(async_db, "run", no_database)
+    monkeypatch.setattr(async_db, "call", no_database)
+    revalidated = ingested.get(
+        "/api/sleep/summary", headers={"If-None-Match": first.headers["ETag"]}
+    )
+    repeated = ingested.get("/api/sleep/summary")
+
+    assert revalidated.status_code == 304
+    assert repeated.status_code == 200
+    assert repeated.content == first.content
+
+
+def test_rolled_back_bump_is_not_published(ingested, db_path):
+    etag = ingested.get("/api/sleep/summary").headers["ETag"]
+
+    with SleepDatabase() as db, pytest.raises(RuntimeError):
+        with db.transaction():
+            db.bump_data_version()
+            raise RuntimeError("abort")
+
+    assert SleepDatabase.data_version_file(db_path).read_text() == "1"
+    response = ingested.get("/api/sleep/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 304